@@ -0,0 +1,189 @@
+"""Offline benchmark of the checking engine.
+
+Starts local stand-in proxies and a target site (see benchmarks.servers),
+then drives check_proxy(), ProxyFinder and the plugin parsers through them
+and reports checks/s, p50/p99 check latency, peak RSS and thread count.
+
+Usage::
+
+    python -m benchmarks.bench_checker --proxies 500 --engine async --threads 200
+    python -m benchmarks.bench_checker --help
+"""
+
+import argparse
+import resource
+import threading
+import time
+from unittest import mock
+
+from proxyfinder import asyncfinder
+from proxyfinder import plugins
+from proxyfinder import proxyfinder
+from proxyfinder.models import Proxy
+
+from . import servers
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of values"""
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def peak_rss():
+    """Peak resident set size of this process in MiB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class ThreadSampler(threading.Thread):
+    """Samples the number of live threads, itself excluded"""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count() - 1)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def timed(func, latencies):
+    """Wrap a check function recording how long each call takes"""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+def timed_async(func, latencies):
+    """Wrap a check coroutine function recording how long each call takes"""
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return wrapper
+
+
+def report(name, checks, elapsed, latencies, working, threads):
+    print(f"{name:24} {checks:6} checks  {elapsed:7.2f}s  {checks / elapsed:8.1f} checks/s  "
+          f"p50 {percentile(latencies, 50) * 1000:7.1f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:7.1f} ms  "
+          f"working {working:5}  threads {threads:4}  peak RSS {peak_rss():6.1f} MiB")
+
+
+def bench_check_proxy(stand_ins, proxies, timeout, samples):
+    """Sequential check_proxy() calls: the cost of one check"""
+    latencies = []
+    working = 0
+    start = time.perf_counter()
+    for protocol, ip, port, _ in proxies[:samples]:
+        t = time.perf_counter()
+        res = proxyfinder.check_proxy(Proxy(protocol, ip, port), stand_ins.target_url, timeout)
+        latencies.append(time.perf_counter() - t)
+        working += not res.error
+    report("check_proxy sequential", len(latencies), time.perf_counter() - start,
+           latencies, working, threading.active_count())
+
+
+def bench_engine(stand_ins, proxies, args):
+    """A full ProxyFinder run over every stand-in"""
+    latencies = []
+    if args.engine == "async":
+        pf = asyncfinder.AsyncProxyFinder(stand_ins.target_url, max_concurrency=args.threads,
+                                          conn_timeout=args.timeout,
+                                          prefilter_timeout=args.prefilter,
+                                          adaptive=args.adaptive,
+                                          adaptive_timeout=args.adaptive_timeout)
+        patch = mock.patch.object(asyncfinder, "async_check_proxy",
+                                  timed_async(asyncfinder.async_check_proxy, latencies))
+    else:
+        pf = proxyfinder.ProxyFinder(stand_ins.target_url, max_threads=args.threads,
+                                     conn_timeout=args.timeout,
+                                     prefilter_timeout=args.prefilter,
+                                     adaptive=args.adaptive,
+                                     adaptive_timeout=args.adaptive_timeout)
+        patch = mock.patch.object(proxyfinder, "check_proxy",
+                                  timed(proxyfinder.check_proxy, latencies))
+    pf.proxy_found = [Proxy(protocol, ip, port)
+                      for _ in range(args.rounds) for protocol, ip, port, _ in proxies]
+
+    sampler = ThreadSampler()
+    sampler.start()
+    with patch:
+        start = time.perf_counter()
+        pf.start()
+        for thread in list(pf.threads):
+            thread.join()
+        elapsed = time.perf_counter() - start
+    sampler.stop()
+
+    results = pf.get_last_results()
+    working = sum(1 for res in results if not res.error)
+    name = f"ProxyFinder {args.engine}" + (" adaptive" if args.adaptive else "") + (
+        " adaptive-t" if args.adaptive_timeout else "")
+    report(name, len(results), elapsed, latencies, working, sampler.peak)
+    if args.adaptive:
+        print(f"{'':24} final limit {pf.get_concurrency()}")
+
+
+def bench_plugins(stand_ins, rounds=5):
+    """Plugin download and parsing through the local source"""
+    base = stand_ins.target_url.rstrip("/")
+
+    class LocalFreeProxyListNet(plugins.FreeProxyListNet):
+        HOST = base + "/free-proxy-list.html"
+
+    class LocalProxyScrapeCom(plugins.ProxyScrapeComBase):
+        HOST = base + "/proxyscrape.txt"
+        PROTOCOL = "http"
+
+    for plugin in (LocalFreeProxyListNet, LocalProxyScrapeCom):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            count = sum(1 for _ in plugin(5).scrape())
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"{plugin.__bases__[0].__name__:24} {count:6} proxies  {elapsed * 1000:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--proxies", type=int, default=200, help="Stand-in proxies. (default: 200)")
+    parser.add_argument("--rounds", type=int, default=1, help="Checks per stand-in. (default: 1)")
+    parser.add_argument("--engine", choices=("threads", "async"), default="threads")
+    parser.add_argument("--threads", type=int, default=20, help="Threads or checks in flight. (default: 20)")
+    parser.add_argument("--adaptive", action="store_true", help="Adaptive concurrency starting from --threads.")
+    parser.add_argument("--adaptive-timeout", action="store_true", help="Adaptive timeouts.")
+    parser.add_argument("--timeout", type=float, default=1.0, help="Check timeout. (default: 1.0)")
+    parser.add_argument("--prefilter", type=float, default=None, help="Prefilter timeout. (default: off)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Stand-in answer delay. (default: 0.02)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Random +- latency. (default: 0.01)")
+    parser.add_argument("--dead", type=float, default=0.5, help="Rate of dead ports. (default: 0.5)")
+    parser.add_argument("--fail", type=float, default=0.1, help="Rate of refusing proxies. (default: 0.1)")
+    parser.add_argument("--blackhole", type=float, default=0.1, help="Rate of silent proxies. (default: 0.1)")
+    parser.add_argument("--samples", type=int, default=20, help="Sequential check_proxy() calls. (default: 20)")
+    args = parser.parse_args()
+
+    specs = servers.make_population(args.proxies, args.dead, args.fail, args.blackhole)
+    dump = b"".join(b"10.0.%d.%d:%d\r\n" % (i >> 8 & 255, i & 255, 1024 + i) for i in range(20000))
+    with servers.StandIns(specs, args.latency, args.jitter, {"/proxyscrape.txt": dump}) as stand_ins:
+        proxies = stand_ins.proxies()
+        bench_plugins(stand_ins)
+        bench_check_proxy(stand_ins, proxies, args.timeout, args.samples)
+        bench_engine(stand_ins, proxies, args)
+
+
+if __name__ == "__main__":
+    main()
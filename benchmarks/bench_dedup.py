@@ -0,0 +1,69 @@
+"""Benchmark the proxy dedup index against the old ``{ip: proxy}`` dict.
+
+Usage::
+
+    python -m benchmarks.bench_dedup [N]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from proxyfinder import dedup
+
+
+def make_proxies(count, seed=0):
+    """Random proxies, about 10% of them duplicated"""
+    rnd = random.Random(seed)
+    protocols = dedup.PROTOCOLS
+    proxies = []
+    for _ in range(count):
+        if proxies and rnd.random() < 0.1:
+            proxies.append(dict(rnd.choice(proxies)))
+            continue
+        ip = ".".join(str(rnd.randint(1, 254)) for _ in range(4))
+        proxies.append({"protocol": rnd.choice(protocols), "ip": ip,
+                        "port": rnd.randint(1, 65535)})
+    return proxies
+
+
+def old_dedup(proxies):
+    return list({v["ip"]: v for v in proxies}.values())
+
+
+def tuple_dedup(proxies):
+    return list({(v["protocol"], v["ip"], v["port"]): v for v in proxies}.values())
+
+
+def index_dedup(proxies):
+    index = dedup.ProxyIndex()
+    return [p for p in proxies if index.add(p)]
+
+
+def measure(func, proxies):
+    """Run func twice: once for time, once under tracemalloc for peak memory"""
+    start = time.perf_counter()
+    func(proxies)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(proxies)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main(count=1_000_000):
+    proxies = make_proxies(count)
+    print(f"{count} proxies")
+    for name, func in (("dict by ip (old, drops ports)", old_dedup),
+                       ("dict by endpoint tuple", tuple_dedup),
+                       ("ProxyIndex", index_dedup)):
+        elapsed, peak = measure(func, proxies)
+        print(f"{name:30} {elapsed:6.2f}s  {count / elapsed:10.0f} proxies/s  "
+              f"peak {peak / 2 ** 20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,84 @@
+"""Benchmark plugin parsers on saved copies of the source pages.
+
+Usage::
+
+    python -m benchmarks.bench_parsers [ROUNDS]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+from proxyfinder import plugins
+from proxyfinder.models import Proxy
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
+
+
+def load(filename):
+    with open(os.path.join(DATA_PATH, filename), "rb") as f:
+        return f.read()
+
+
+def measure(func, rounds):
+    """Average time of func over rounds, and its peak memory"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        count = sum(1 for _ in func())
+    elapsed = (time.perf_counter() - start) / rounds
+
+    tracemalloc.start()
+    for _ in func():
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def report(name, count, elapsed, peak):
+    print(f"{name:32} {count:6} proxies  {elapsed * 1000:8.2f} ms  "
+          f"peak {peak / 2 ** 10:8.1f} KiB")
+
+
+def text_dump(lines):
+    """ProxyScrape style body of ip:port lines"""
+    return b"".join(b"10.%d.%d.%d:%d\r\n" % (i >> 16 & 255, i >> 8 & 255, i & 255, 1024 + i % 60000)
+                    for i in range(lines))
+
+
+def old_proxyscrape(body, protocol):
+    """ProxyScrapeComBase.get_data() before streaming: decode, split, parse"""
+    for line in body.decode().split("\r\n"):
+        if line:
+            ip, port = line.split(":")
+            yield Proxy(protocol, ip, int(port))
+
+
+def iter_chunks(body, size=plugins.ProxyScrapeComBase.CHUNK_SIZE):
+    """Serve body in chunks as iter_content() does"""
+    view = memoryview(body)
+    for i in range(0, len(body), size):
+        yield bytes(view[i:i + size])
+
+
+def main(rounds=20):
+    page = load("free-proxy-list.html")
+    plugin = plugins.FreeProxyListNet
+    report("FreeProxyListNet BeautifulSoup",
+           *measure(lambda: plugin.parse_soup(page), rounds))
+    report("FreeProxyListNet fast path",
+           *measure(lambda: plugin.parse_fast(page), rounds))
+
+    # the old parser needs the whole body in memory, the streaming one only
+    # gets chunks: count the body against the old one
+    lines = 200000
+    body = text_dump(lines)
+    count, elapsed, peak = measure(lambda: old_proxyscrape(body, "http"), 1)
+    report(f"ProxyScrape split ({len(body) >> 20} MiB)", count, elapsed, peak + len(body))
+    report(f"ProxyScrape streaming ({len(body) >> 20} MiB)", *measure(
+        lambda: plugins.ProxyScrapeComBase.parse_lines(iter_chunks(body), "http"), 1))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
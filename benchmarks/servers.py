@@ -0,0 +1,292 @@
+"""Local stand-ins for proxies, proxy list sources and a target site.
+
+Everything runs on one asyncio loop in a child process, so the benchmarks
+measure the checking engine without network and without the stand-ins
+counting against its memory and threads.
+
+Every stand-in proxy listens on its own port with a fixed behaviour:
+
+* ``ok``: relays to the target after ``latency`` seconds (+- ``jitter``)
+* ``fail``: refuses the request (HTTP 502, SOCKS rejection)
+* ``blackhole``: accepts the connection and never answers
+* ``dead``: nobody listens on the port
+"""
+
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import struct
+
+BEHAVIOURS = ("ok", "fail", "blackhole", "dead")
+
+PROXIES_TEST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                                 "tests", "proxies_test.txt")
+DATA_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "data")
+
+
+def protocol_mix(path=PROXIES_TEST_PATH):
+    """Protocols of the proxies in tests/proxies_test.txt (proto::ip::port lines)
+
+    Returns:
+        list: Protocol of every line
+    """
+    with open(path) as f:
+        return [line.split("::", 1)[0] for line in f if line.strip()]
+
+
+def make_population(count, dead=0.5, fail=0.1, blackhole=0.1, seed=0):
+    """Build stand-in specs with the protocol mix of tests/proxies_test.txt
+
+    Args:
+        count (int): Number of stand-in proxies
+        dead (float, optional): Rate of dead ports. Defaults to 0.5.
+        fail (float, optional): Rate of refusing proxies. Defaults to 0.1.
+        blackhole (float, optional): Rate of silent proxies. Defaults to 0.1.
+        seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+        list: (protocol, behaviour) tuples
+    """
+    rnd = random.Random(seed)
+    protocols = protocol_mix()
+    specs = []
+    for _ in range(count):
+        roll = rnd.random()
+        if roll < dead:
+            behaviour = "dead"
+        elif roll < dead + fail:
+            behaviour = "fail"
+        elif roll < dead + fail + blackhole:
+            behaviour = "blackhole"
+        else:
+            behaviour = "ok"
+        specs.append((rnd.choice(protocols), behaviour))
+    return specs
+
+
+def closed_port():
+    """Bind a local port nobody listens on: connections are refused, and
+    the port is not given to another server while the socket is open
+
+    Returns:
+        socket.socket: Bound socket, keep it open as long as the port is used
+    """
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, OSError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _relay(reader, writer, host, port, first=b""):
+    target_reader, target_writer = await asyncio.open_connection(host, port)
+    if first:
+        target_writer.write(first)
+    await asyncio.gather(_pipe(reader, target_writer), _pipe(target_reader, writer))
+
+
+class StandInProxy:
+    """Proxy stand-in speaking HTTP (CONNECT and absolute-form), SOCKS4 or SOCKS5
+    """
+
+    def __init__(self, protocol, behaviour, latency=0.0, jitter=0.0, seed=0):
+        self.protocol = protocol
+        self.behaviour = behaviour
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+
+    async def handle(self, reader, writer):
+        try:
+            if self.behaviour == "blackhole":
+                # hold the connection open, never answer
+                await reader.read()
+                return
+            delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.protocol == "socks4":
+                await self.handle_socks4(reader, writer)
+            elif self.protocol == "socks5":
+                await self.handle_socks5(reader, writer)
+            else:
+                await self.handle_http(reader, writer)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_http(self, reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        method, target, _ = head.split(b"\r\n", 1)[0].split(b" ", 2)
+        if self.behaviour == "fail":
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n"
+                         b"Connection: close\r\n\r\n")
+            return
+        if method == b"CONNECT":
+            host, port = target.decode().rsplit(":", 1)
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+            await _relay(reader, writer, host, int(port))
+        else:
+            netloc = target.split(b"/")[2].decode()
+            host, _, port = netloc.partition(":")
+            await _relay(reader, writer, host, int(port or 80), head)
+
+    async def handle_socks4(self, reader, writer):
+        request = await reader.readexactly(8)
+        await reader.readuntil(b"\x00")
+        port, = struct.unpack(">H", request[2:4])
+        host = socket.inet_ntoa(request[4:8])
+        if self.behaviour == "fail":
+            writer.write(b"\x00\x5b" + b"\x00" * 6)
+            return
+        writer.write(b"\x00\x5a" + b"\x00" * 6)
+        await _relay(reader, writer, host, port)
+
+    async def handle_socks5(self, reader, writer):
+        _, methods = await reader.readexactly(2)
+        await reader.readexactly(methods)
+        writer.write(b"\x05\x00")
+        _, _, _, atyp = await reader.readexactly(4)
+        if atyp == 1:
+            host = socket.inet_ntop(socket.AF_INET, await reader.readexactly(4))
+        elif atyp == 4:
+            host = socket.inet_ntop(socket.AF_INET6, await reader.readexactly(16))
+        else:
+            length = (await reader.readexactly(1))[0]
+            host = (await reader.readexactly(length)).decode()
+        port, = struct.unpack(">H", await reader.readexactly(2))
+        if self.behaviour == "fail":
+            writer.write(b"\x05\x05\x00\x01" + b"\x00" * 6)
+            return
+        writer.write(b"\x05\x00\x00\x01" + b"\x00" * 6)
+        await _relay(reader, writer, host, port)
+
+
+class TargetSite:
+    """Target website and proxy list source: answers 200 to any request and
+    serves the files in benchmarks/data
+    """
+
+    def __init__(self, files=None):
+        self.files = files or {}
+
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            target = head.split(b" ", 2)[1]
+            path = b"/" + target.split(b"/", 3)[-1] if target.startswith(b"http") else target
+            body = self.files.get(path.decode(), b"ok")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n"
+                         b"Connection: close\r\n\r\n" % len(body) + body)
+            await writer.drain()
+        except (ConnectionError, OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def _load_files():
+    files = {}
+    for name in os.listdir(DATA_PATH):
+        with open(os.path.join(DATA_PATH, name), "rb") as f:
+            files["/" + name] = f.read()
+    return files
+
+
+async def _serve(specs, latency, jitter, files, conn):
+    target = TargetSite(files)
+    target_server = await asyncio.start_server(target.handle, "127.0.0.1", 0, backlog=4096)
+    ports = []
+    dead = []
+    for i, (protocol, behaviour) in enumerate(specs):
+        if behaviour == "dead":
+            dead.append(closed_port())
+            ports.append(dead[-1].getsockname()[1])
+            continue
+        proxy = StandInProxy(protocol, behaviour, latency, jitter, seed=i)
+        server = await asyncio.start_server(proxy.handle, "127.0.0.1", 0, backlog=1024)
+        ports.append(server.sockets[0].getsockname()[1])
+    conn.send({"target_port": target_server.sockets[0].getsockname()[1], "ports": ports})
+
+    # run until the parent asks to stop or goes away
+    loop = asyncio.get_event_loop()
+    try:
+        await loop.run_in_executor(None, conn.recv)
+    finally:
+        for sock in dead:
+            sock.close()
+
+
+def _serve_process(specs, latency, jitter, files, conn):
+    try:
+        asyncio.run(_serve(specs, latency, jitter, files, conn))
+    except (EOFError, KeyboardInterrupt):
+        pass
+
+
+class StandIns:
+    """Context manager running the stand-ins in a child process
+
+    Args:
+        specs (list): (protocol, behaviour) tuples, see make_population()
+        latency (float, optional): Seconds before a proxy answers. Defaults to 0.
+        jitter (float, optional): Random +- latency variation. Defaults to 0.
+        files (dict, optional): Extra paths served by the target site.
+    """
+
+    def __init__(self, specs, latency=0.0, jitter=0.0, files=None):
+        self.specs = specs
+        self.latency = latency
+        self.jitter = jitter
+        self.files = _load_files()
+        self.files.update(files or {})
+        self.process = None
+        self.conn = None
+        self.target_port = None
+        self.ports = []
+
+    @property
+    def target_url(self):
+        """str: URL of the local target site"""
+        return f"http://127.0.0.1:{self.target_port}/"
+
+    def proxies(self):
+        """Proxy info of every stand-in
+
+        Returns:
+            list: List of (protocol, ip, port, behaviour)
+        """
+        return [(protocol, "127.0.0.1", port, behaviour)
+                for (protocol, behaviour), port in zip(self.specs, self.ports)]
+
+    def __enter__(self):
+        self.conn, child_conn = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_serve_process, daemon=True,
+            args=(self.specs, self.latency, self.jitter, self.files, child_conn))
+        self.process.start()
+        info = self.conn.recv()
+        self.target_port = info["target_port"]
+        self.ports = info["ports"]
+        return self
+
+    def __exit__(self, *exc):
+        self.conn.send("stop")
+        self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
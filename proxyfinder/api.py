@@ -0,0 +1,324 @@
+"""Local HTTP/JSON API over the working proxies.
+
+WorkingSet holds the working proxies of a scan or of a daemon pool, indexed
+so that every pick costs the same whatever its size: a dictionary by URL,
+and per protocol an array of URLs with the position of each, for random
+picks and swap removals, and a list of (latency, seq, URL) keys kept sorted
+with bisect on every change, so the fastest one is always the first and a
+re-verified proxy only moves its own key.
+
+ApiServer serves it (HTTP/1.1, keep-alive):
+
+    GET  /proxies          working proxies, fastest first
+                           ?protocol=socks5 &count=10 &format=text
+    GET  /proxies/random   a random working proxy            ?protocol=
+    GET  /proxies/fastest  the fastest working proxy         ?protocol=
+    POST /proxies/bad      {"proxy": "socks5://1.2.3.4:1080"}
+                           takes it out of the working set, and makes a
+                           daemon check it again right away
+    GET  /status           {"working": n, "protocols": {protocol: n}}
+
+Proxies are sent as {"url", "protocol", "ip", "port", "latency"}. Picks
+reply 404 when no proxy matches.
+"""
+
+import bisect
+import itertools
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .models import proxy_url
+
+API_FIELDS = ("protocol", "ip", "port", "latency")
+
+
+def _latency(proxy):
+    latency = proxy.get("latency")
+    return float("inf") if latency is None else latency
+
+
+class WorkingSet:
+    """Thread safe set of working proxies with constant time lookups
+    """
+
+    def __init__(self):
+        self._proxies = {}
+        # by protocol, None for all of them
+        self._urls = {None: []}
+        self._positions = {None: {}}
+        self._order = {None: []}
+        self._keys = {}
+        self._seq = itertools.count()
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._proxies)
+
+    def __contains__(self, proxy):
+        url = proxy if isinstance(proxy, str) else proxy_url(proxy)
+        return url in self._proxies
+
+    def add(self, proxy):
+        """Add a working proxy, or refresh it
+
+        Args:
+            proxy (Proxy): Working proxy
+
+        Returns:
+            bool: True if the proxy was not in the set
+        """
+        url = proxy_url(proxy)
+        key = (_latency(proxy), next(self._seq), url)
+        with self._lock:
+            new = url not in self._proxies
+            self._proxies[url] = proxy
+            old_key = self._keys.get(url)
+            self._keys[url] = key
+            for group in (None, proxy["protocol"]):
+                order = self._order.setdefault(group, [])
+                if old_key is not None:
+                    del order[bisect.bisect_left(order, old_key)]
+                bisect.insort(order, key)
+                if new:
+                    urls = self._urls.setdefault(group, [])
+                    self._positions.setdefault(group, {})[url] = len(urls)
+                    urls.append(url)
+        return new
+
+    def discard(self, proxy):
+        """Remove a proxy
+
+        Args:
+            proxy (Proxy|str): Proxy, or its URL
+
+        Returns:
+            Proxy: Proxy removed, None if it was not in the set
+        """
+        url = proxy if isinstance(proxy, str) else proxy_url(proxy)
+        with self._lock:
+            proxy = self._proxies.pop(url, None)
+            if proxy is None:
+                return None
+            key = self._keys.pop(url)
+            for group in (None, proxy["protocol"]):
+                order = self._order[group]
+                del order[bisect.bisect_left(order, key)]
+                urls = self._urls[group]
+                positions = self._positions[group]
+                # move the last one in the hole
+                index = positions.pop(url)
+                last = urls.pop()
+                if last != url:
+                    urls[index] = last
+                    positions[last] = index
+        return proxy
+
+    def update(self, proxy, working):
+        """Add or remove a proxy, the signature of ProxyPool.subscribe()
+
+        Args:
+            proxy (Proxy): Checked proxy
+            working (bool): Whether it works
+        """
+        if working:
+            self.add(proxy)
+        else:
+            self.discard(proxy)
+
+    def get(self, url):
+        """Retrive a proxy by URL
+
+        Args:
+            url (str): Proxy URL, as protocol://ip:port
+
+        Returns:
+            Proxy: Proxy, None if it is not in the set
+        """
+        return self._proxies.get(url)
+
+    def random(self, protocol=None):
+        """Retrive a random proxy
+
+        Args:
+            protocol (str, optional): Only of this protocol. Defaults to None (any).
+
+        Returns:
+            Proxy: Proxy, None if there is none
+        """
+        with self._lock:
+            urls = self._urls.get(protocol)
+            if not urls:
+                return None
+            return self._proxies[urls[self._random.randrange(len(urls))]]
+
+    def ranked(self, protocol=None, count=0):
+        """Retrive the proxies fastest first
+
+        Args:
+            protocol (str, optional): Only of this protocol. Defaults to None (any).
+            count (int, optional): Only the count fastest, 0 for all. Defaults to 0.
+
+        Returns:
+            tuple: Proxies, fastest first
+        """
+        with self._lock:
+            order = self._order.get(protocol, ())
+            if count > 0:
+                order = order[:count]
+            return tuple(self._proxies[url] for _, _, url in order)
+
+    def fastest(self, protocol=None):
+        """Retrive the fastest proxy
+
+        Args:
+            protocol (str, optional): Only of this protocol. Defaults to None (any).
+
+        Returns:
+            Proxy: Proxy, None if there is none
+        """
+        with self._lock:
+            order = self._order.get(protocol)
+            return self._proxies[order[0][2]] if order else None
+
+    def counts(self):
+        """Retrive number of proxies by protocol
+
+        Returns:
+            dict: Proxies by protocol
+        """
+        with self._lock:
+            return {protocol: len(urls) for protocol, urls in self._urls.items()
+                    if protocol is not None and urls}
+
+
+def as_json(proxy):
+    """Return the API representation of a proxy
+
+    Args:
+        proxy (Proxy): Proxy
+
+    Returns:
+        dict: url, protocol, ip, port and latency
+    """
+    data = {"url": proxy_url(proxy)}
+    for key in API_FIELDS:
+        data[key] = proxy.get(key)
+    return data
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """HTTP front of a WorkingSet, which is self.server.working_set
+    """
+
+    protocol_version = "HTTP/1.1"
+    # one write per response (flushed by handle_one_request()), a separate
+    # body segment waits for the delayed ACK of the headers on keep-alive
+    wbufsize = -1
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def _send(self, code, body, content_type):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _reply(self, code, data):
+        self._send(code, json.dumps(data).encode("utf-8"), "application/json")
+
+    def _pick(self, proxy):
+        if proxy is None:
+            self._reply(404, {"error": "No working proxy"})
+        else:
+            self._reply(200, as_json(proxy))
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        working_set = self.server.working_set
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        protocol = query.get("protocol") or None
+        if parts.path == "/proxies/random":
+            self._pick(working_set.random(protocol))
+        elif parts.path == "/proxies/fastest":
+            self._pick(working_set.fastest(protocol))
+        elif parts.path == "/proxies":
+            try:
+                count = int(query.get("count", 0))
+            except ValueError:
+                self._reply(400, {"error": "Bad request"})
+                return
+            proxies = working_set.ranked(protocol, count)
+            if query.get("format") == "text":
+                text = "\n".join(proxy_url(proxy) for proxy in proxies)
+                self._send(200, text.encode("utf-8"), "text/plain; charset=utf-8")
+            else:
+                self._reply(200, [as_json(proxy) for proxy in proxies])
+        elif parts.path == "/status":
+            self._reply(200, {"working": len(working_set), "protocols": working_set.counts()})
+        else:
+            self._reply(404, {"error": "Not found"})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length) or b"{}")
+            if self.path != "/proxies/bad":
+                self._reply(404, {"error": "Not found"})
+                return
+            url = str(data["proxy"])
+        except (KeyError, TypeError, ValueError):
+            self._reply(400, {"error": "Bad request"})
+            return
+        proxy = self.server.working_set.discard(url)
+        if proxy is not None and self.server.on_bad is not None:
+            self.server.on_bad(proxy)
+        self._reply(200, {"ok": True, "removed": proxy is not None})
+
+
+class ApiServer:
+    """Serve a WorkingSet over HTTP, see the module documentation
+
+    Args:
+        working_set (WorkingSet): Proxies to serve
+        host (str, optional): Address to listen on. Defaults to 127.0.0.1.
+        port (int, optional): Port to listen on, 0 for any free one. Defaults to 8899.
+        on_bad (callable, optional): Called with every proxy reported bad,
+            after it left the working set, e.g. ProxyPool.recheck. Defaults to None.
+    """
+
+    def __init__(self, working_set, host="127.0.0.1", port=8899, on_bad=None):
+        self.working_set = working_set
+        self.host = host
+        self.port = port
+        self.on_bad = on_bad
+        self._server = None
+
+    @property
+    def address(self):
+        """str: Base URL of the API, known once started"""
+        if self._server is None:
+            return None
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Start serving in a separate thread
+        """
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.working_set = self.working_set
+        self._server.on_bad = self.on_bad
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """Stop serving
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
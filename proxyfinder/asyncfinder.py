@@ -0,0 +1,567 @@
+"""Asyncio checking engine.
+
+AsyncProxyFinder has the same API as ProxyFinder but runs every check as a
+coroutine on a single event loop thread, so thousands of checks can be in
+flight at the same time without a thread stack per connection.
+"""
+
+import asyncio
+import http.client
+import ipaddress
+import queue
+import socket
+import ssl
+import struct
+import threading
+import time
+from urllib.parse import urlsplit, urljoin
+
+from . import tracing
+from .concurrency import LOCAL_ERROR, is_local_error
+from .timeouts import DEADLINE_ERROR
+from .proxyfinder import ProxyFinder
+from .tracing import Trace
+
+MAX_REDIRECTS = 30
+# seconds a target address resolved for the SOCKS handshakes is reused
+DNS_TTL = 300.0
+
+
+class ProxyHandshakeError(Exception):
+    """The proxy refused to open a tunnel to the target
+    """
+
+
+class _ConnectTimeout(Exception):
+    pass
+
+
+def _ssl_context():
+    """SSL context that skips certificate verification, like verify=False
+    """
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+SSL_CONTEXT = _ssl_context()
+
+
+async def _recv_exactly(loop, sock, size):
+    """Read exactly size bytes from a non-blocking socket
+
+    Args:
+        loop (asyncio.AbstractEventLoop): Running loop
+        sock (socket.socket): Connected socket
+        size (int): Number of bytes to read
+
+    Returns:
+        bytes: Data read
+    """
+    data = b""
+    while len(data) < size:
+        chunk = await loop.sock_recv(sock, size - len(data))
+        if not chunk:
+            raise ProxyHandshakeError("Connection closed during handshake")
+        data += chunk
+    return data
+
+
+async def _recv_headers(loop, sock):
+    """Read an HTTP response head from a non-blocking socket
+
+    Returns:
+        bytes: Response head, blank line included
+    """
+    data = b""
+    while b"\r\n\r\n" not in data:
+        chunk = await loop.sock_recv(sock, 1024)
+        if not chunk:
+            raise ProxyHandshakeError("Connection closed during handshake")
+        data += chunk
+        if len(data) > 65536:
+            raise ProxyHandshakeError("Response head too long")
+    return data
+
+
+def _numeric_address(host, port):
+    """Socket family and address of a numeric IP, without a lookup
+
+    Returns:
+        tuple: (family, address), None if host is not a numeric IP
+    """
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return None
+    if ip.version == 4:
+        return socket.AF_INET, (str(ip), port)
+    return socket.AF_INET6, (str(ip), port, 0, 0)
+
+
+async def _proxy_address(loop, proxy):
+    """Socket family and address of the proxy, resolved only if it is not
+    a numeric IP already
+    """
+    numeric = _numeric_address(proxy["ip"], proxy["port"])
+    if numeric is not None:
+        return numeric
+    infos = await loop.getaddrinfo(proxy["ip"], proxy["port"], type=socket.SOCK_STREAM)
+    return infos[0][0], infos[0][4]
+
+
+class _DnsCache:
+    """Target addresses resolved for the SOCKS handshakes, shared by the
+    checks of a loop: concurrent checks wait for the same lookup, and the
+    address is kept ttl seconds
+    """
+
+    def __init__(self, ttl=DNS_TTL):
+        self.ttl = ttl
+        self._entries = {}
+
+    async def resolve(self, loop, host, port, family=socket.AF_UNSPEC):
+        """Resolve host
+
+        Returns:
+            str: IP address
+        """
+        numeric = _numeric_address(host, port)
+        if numeric is not None and family in (socket.AF_UNSPEC, numeric[0]):
+            return numeric[1][0]
+        key = (host, port, family)
+        entry = self._entries.get(key)
+        if entry is None or entry[1] is not loop or entry[2] < time.monotonic():
+            task = loop.create_task(loop.getaddrinfo(host, port, family=family,
+                                                     type=socket.SOCK_STREAM))
+            entry = self._entries[key] = (task, loop, time.monotonic() + self.ttl)
+        task = entry[0]
+        try:
+            # a check timing out must not cancel the lookup of the others
+            infos = await asyncio.shield(task)
+        except OSError:
+            if self._entries.get(key) is entry:
+                # try again with the next check
+                del self._entries[key]
+            raise
+        return infos[0][4][0]
+
+
+_dns_cache = _DnsCache()
+
+
+async def _resolve_ipv4(loop, host, port):
+    """Resolve host to an IPv4 address (SOCKS4 cannot carry hostnames)
+    """
+    return await _dns_cache.resolve(loop, host, port, socket.AF_INET)
+
+
+async def _socks4_handshake(loop, sock, host, port):
+    """Open a SOCKS4 tunnel to host:port
+    """
+    tracing.mark("dns")
+    ip = await _resolve_ipv4(loop, host, port)
+    tracing.mark("handshake")
+    request = struct.pack(">BBH", 4, 1, port) + socket.inet_aton(ip) + b"\x00"
+    await loop.sock_sendall(sock, request)
+    reply = await _recv_exactly(loop, sock, 8)
+    if reply[1] != 0x5A:
+        raise ProxyHandshakeError(f"SOCKS4 request rejected ({reply[1]:#x})")
+
+
+async def _socks5_handshake(loop, sock, host, port):
+    """Open a SOCKS5 tunnel to host:port without authentication
+    """
+    await loop.sock_sendall(sock, b"\x05\x01\x00")
+    reply = await _recv_exactly(loop, sock, 2)
+    if reply != b"\x05\x00":
+        raise ProxyHandshakeError("SOCKS5 authentication method rejected")
+
+    # like socks5:// in requests, the target is resolved locally
+    tracing.mark("dns")
+    address = ipaddress.ip_address(await _dns_cache.resolve(loop, host, port))
+    tracing.mark("handshake")
+    atyp = 1 if address.version == 4 else 4
+    request = struct.pack(">BBBB", 5, 1, 0, atyp) + address.packed + struct.pack(">H", port)
+    await loop.sock_sendall(sock, request)
+
+    reply = await _recv_exactly(loop, sock, 4)
+    if reply[1] != 0:
+        raise ProxyHandshakeError(f"SOCKS5 request rejected ({reply[1]:#x})")
+    # consume the bound address
+    if reply[3] == 1:
+        await _recv_exactly(loop, sock, 4 + 2)
+    elif reply[3] == 4:
+        await _recv_exactly(loop, sock, 16 + 2)
+    else:
+        length = await _recv_exactly(loop, sock, 1)
+        await _recv_exactly(loop, sock, length[0] + 2)
+
+
+async def _http_connect_handshake(loop, sock, host, port):
+    """Open an HTTP CONNECT tunnel to host:port
+    """
+    request = (f"CONNECT {host}:{port} HTTP/1.1\r\n"
+               f"Host: {host}:{port}\r\n\r\n").encode("ascii")
+    await loop.sock_sendall(sock, request)
+    head = await _recv_headers(loop, sock)
+    status = head.split(b"\r\n", 1)[0].split()
+    if len(status) < 2 or status[1] != b"200":
+        raise ProxyHandshakeError("CONNECT rejected")
+
+
+async def _connect(proxy, host, port, tunnel):
+    """Connect to the proxy and, if tunnel is True, open a tunnel to host:port
+
+    Returns:
+        socket.socket: Connected non-blocking socket
+    """
+    loop = asyncio.get_event_loop()
+    tracing.mark("connect")
+    family, address = await _proxy_address(loop, proxy)
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await loop.sock_connect(sock, address)
+        if tunnel:
+            tracing.mark("handshake")
+        if proxy["protocol"] == "socks4":
+            await _socks4_handshake(loop, sock, host, port)
+        elif proxy["protocol"] == "socks5":
+            await _socks5_handshake(loop, sock, host, port)
+        elif tunnel:
+            await _http_connect_handshake(loop, sock, host, port)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+async def async_prefilter_proxy(proxy, url, timeout=1.0):
+    """Cheap first stage check, asyncio version of prefilter_proxy()
+
+    Args:
+        proxy (Proxy|dict): Proxy info. Keys: ip, port, protocol.
+        url (str): A website url, SOCKS4 needs the target address
+        timeout (float, optional): Max time for connect and handshake. Defaults to 1.0.
+
+    Returns:
+        str: Connection error description, empty if the proxy answered
+    """
+    loop = asyncio.get_event_loop()
+    sock = None
+    try:
+        family, address = await _proxy_address(loop, proxy)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setblocking(False)
+        try:
+            await asyncio.wait_for(loop.sock_connect(sock, address), timeout)
+        except asyncio.TimeoutError:
+            return "Request timed out while trying to connect"
+
+        if proxy["protocol"] == "socks5":
+            await loop.sock_sendall(sock, b"\x05\x01\x00")
+            reply = await asyncio.wait_for(_recv_exactly(loop, sock, 2), timeout)
+            if reply != b"\x05\x00":
+                return "Connection error"
+        elif proxy["protocol"] == "socks4":
+            parts = urlsplit(url)
+            port = parts.port or (443 if parts.scheme == "https" else 80)
+            await asyncio.wait_for(_socks4_handshake(loop, sock, parts.hostname, port),
+                                   timeout)
+    except asyncio.TimeoutError:
+        return "Server did not send any data"
+    except (ProxyHandshakeError, OSError) as e:
+        return LOCAL_ERROR if is_local_error(e) else "Connection error"
+    finally:
+        if sock is not None:
+            sock.close()
+    return ""
+
+
+async def _fetch_status(proxy, url, timeout, read_timeout, timings):
+    """Request url through the proxy and return status code and Location header
+
+    HTTP and HTTPS proxies are both spoken to in clear text, as
+    check_proxy() does (see models.transport_url): https targets are reached
+    through a CONNECT tunnel, http targets with an absolute-form request.
+    SOCKS proxies always tunnel.
+
+    The time (time.perf_counter) the connection to the proxy is open and the
+    first response byte arrives are saved in timings.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ValueError("Invalid URL")
+    secure = parts.scheme == "https"
+    host = parts.hostname
+    port = parts.port or (443 if secure else 80)
+    tunnel = secure or proxy["protocol"] in ("socks4", "socks5")
+
+    try:
+        sock = await asyncio.wait_for(_connect(proxy, host, port, tunnel), timeout)
+    except asyncio.TimeoutError:
+        raise _ConnectTimeout() from None
+    timings.setdefault("connect", time.perf_counter())
+
+    if secure:
+        tracing.mark("tls")
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(
+        sock=sock, ssl=SSL_CONTEXT if secure else None,
+        server_hostname=host if secure else None), read_timeout)
+    try:
+        target = url if not tunnel else (parts.path or "/") + (
+            "?" + parts.query if parts.query else "")
+        request = (f"GET {target} HTTP/1.1\r\n"
+                   f"Host: {parts.netloc}\r\n"
+                   "User-Agent: proxyfinder\r\n"
+                   "Accept: */*\r\n"
+                   "Connection: close\r\n\r\n").encode("ascii")
+        tracing.mark("ttfb")
+        writer.write(request)
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), read_timeout)
+        timings["ttfb"] = time.perf_counter()
+        status = status_line.split()
+        if len(status) < 2 or not status[1].isdigit():
+            raise ConnectionError("Invalid status line")
+        location = None
+        length = None
+        while True:
+            line = await asyncio.wait_for(reader.readline(), read_timeout)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            name = name.strip().lower()
+            if name == "location":
+                location = value.strip()
+            elif name == "content-length" and value.strip().isdigit():
+                length = int(value)
+
+        tracing.mark("body")
+        # download the body like requests does, the status is known already
+        # so a slow body is not an error
+        try:
+            while length is None or length > 0:
+                chunk = await asyncio.wait_for(reader.read(65536), read_timeout)
+                if not chunk:
+                    break
+                if length is not None:
+                    length -= len(chunk)
+        except asyncio.TimeoutError:
+            pass
+        return int(status[1]), location
+    finally:
+        writer.close()
+
+
+async def _follow_redirects(proxy, url, timeout, read_timeout, timings):
+    """Request url following redirects
+
+    Returns:
+        int: Final status code, None if there are too many redirects
+    """
+    for _ in range(MAX_REDIRECTS + 1):
+        status, location = await _fetch_status(proxy, url, timeout, read_timeout, timings)
+        if status not in (301, 302, 303, 307, 308) or not location:
+            return status
+        url = urljoin(url, location)
+    return None
+
+
+async def async_check_proxy(proxy, url, timeout=3.05, read_timeout=None, deadline=None,
+                            trace=None):
+    """Try connect proxy to url and check if it work, asyncio version of
+    check_proxy()
+
+    Args:
+        proxy (Proxy|dict): Proxy info. Keys: ip, port, protocol.
+        url (str): A website url
+        timeout (float, optional): Max time to connect. Defaults to 3.05.
+        read_timeout (float, optional): Max time waiting for data. Defaults to timeout.
+        deadline (float, optional): Max time for the whole check, redirects
+                                    included. Defaults to None (no limit).
+        trace (Trace, optional): Record the phases of the check in it, and
+                                 in proxy["trace"]. Defaults to None.
+
+    Returns:
+        Proxy|dict: Modified proxy info adding connection error description
+                    and, if it works, the timings
+    """
+    read_timeout = timeout if read_timeout is None else read_timeout
+    error = ""
+    status = None
+    timings = {}
+    start = time.perf_counter()
+    try:
+        with tracing.active(trace):
+            status = await asyncio.wait_for(
+                _follow_redirects(proxy, url, timeout, read_timeout, timings), deadline)
+        if status is None:
+            error = "Too many redirects"
+    except _ConnectTimeout:
+        error = "Request timed out while trying to connect"
+    except asyncio.TimeoutError:
+        error = "Server did not send any data"
+    except ValueError:
+        error = "Invalid URL"
+    except (ProxyHandshakeError, OSError, EOFError) as e:
+        error = LOCAL_ERROR if is_local_error(e) else "Connection error"
+    except asyncio.CancelledError:
+        raise
+    except Exception:  # pylint: disable=broad-except
+        error = "Generic error"
+
+    if (error in ("Request timed out while trying to connect", "Server did not send any data")
+            and deadline is not None and time.perf_counter() - start >= deadline):
+        error = DEADLINE_ERROR
+    elif not error and status != 200:
+        str_resp = http.client.responses.get(status, "Unknown")
+        error = f"Error {status}: {str_resp}"
+
+    proxy["error"] = error
+    if not error:
+        proxy["connect_time"] = timings["connect"] - start
+        proxy["ttfb"] = timings["ttfb"] - start
+        proxy["total_time"] = proxy["latency"] = time.perf_counter() - start
+    if trace is not None:
+        proxy["trace"] = trace.entries
+    return proxy
+
+
+class AsyncProxyFinder(ProxyFinder):
+    """ProxyFinder running all checks on one asyncio event loop thread
+    """
+
+    def __init__(self, url, max_proxies=-1, max_concurrency=500, conn_timeout=3.05,
+                 prefilter_timeout=None, stream=False, health_store=None,
+                 skip_failed=True, source_cache=None, adaptive=False, max_working=0,
+                 read_timeout=None, total_timeout=None, adaptive_timeout=False,
+                 trace=False):
+        super().__init__(url, max_proxies, max_concurrency, conn_timeout,
+                         prefilter_timeout, stream, health_store, skip_failed,
+                         source_cache, adaptive, max_working, read_timeout,
+                         total_timeout, adaptive_timeout, trace)
+        self.max_concurrency = max_concurrency
+        self._loop = None
+        self._tasks = set()
+        self._kill = False
+
+    async def _check(self, proxy):
+        """Check one proxy
+        """
+        self.tracker.started()
+        start = time.perf_counter()
+        trace = Trace() if self.profile is not None else None
+        try:
+            error = ""
+            if self.prefilter_timeout:
+                if trace is not None:
+                    trace.mark("prefilter")
+                error = await async_prefilter_proxy(proxy, self.url, self.prefilter_timeout)
+            if error:
+                proxy["error"] = error
+                if trace is not None:
+                    trace.end()
+                    proxy["trace"] = trace.entries
+                res = proxy
+            else:
+                res = await async_check_proxy(proxy, self.url, *self.timeouts.current(),
+                                              trace=trace)
+                self.timeouts.record(res)
+            duration = time.perf_counter() - start
+            self.tracker.finished(res["error"], duration)
+            self.metrics.observe(res, duration)
+            if self.profile is not None:
+                self.profile.add(res)
+            if self.limiter is not None:
+                self.limiter.record(res["error"])
+            if self.quota is not None and not self.quota.claim(res):
+                # enough working proxies already
+                return
+            self.result_queue.put(res)
+            if self.quota is not None:
+                self.quota.check()
+        finally:
+            self.proxy_queue.task_done()
+
+    async def _main(self):
+        """Feed the proxy queue to the loop, at most get_concurrency() at a time
+        """
+        while not self._kill:
+            while len(self._tasks) >= self.get_concurrency():
+                await asyncio.wait(self._tasks, return_when=asyncio.FIRST_COMPLETED)
+            try:
+                proxy = self.proxy_queue.get_nowait()
+            except queue.Empty:
+                if self.feeder is not None and (self.feeding.is_set()
+                                                or not self.proxy_queue.empty()):
+                    # plugins are still being scraped
+                    await asyncio.sleep(0.05)
+                    continue
+                break
+            task = asyncio.ensure_future(self._check(proxy))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _run_loop(self):
+        """Event loop thread start point
+        """
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._main())
+        finally:
+            self._loop.close()
+
+    def _cancel_tasks(self):
+        current = asyncio.current_task()
+        for task in list(self._tasks):
+            if task is not current:
+                task.cancel()
+
+    def get_active_threads(self):
+        """Retrive number of checks in flight
+
+        Returns:
+            int: Number of checks in flight
+        """
+        return len(self._tasks)
+
+    def cancel_pending(self):
+        """Drop the proxies still to check and cancel the checks in flight,
+        keeping the results found so far
+        """
+        self._kill = True
+        if self.feeder is not None:
+            self.feeder.stop()
+        self.feeding.clear()
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._cancel_tasks)
+            except RuntimeError:
+                pass
+        self._drop_pending()
+        self.complete()
+
+    def stop(self):
+        """Cancel all checks in flight and reset queues
+        """
+        self.result_queue.queue.clear()
+        self.cancel_pending()
+        self.threads.clear()
+
+    def start(self):
+        """Start the event loop thread
+        """
+        self.enqueue_proxies()
+
+        self._kill = False
+        t = threading.Thread(target=self._run_loop, daemon=True)
+        t.start()
+        self.threads.append(t)
+        self._watch()
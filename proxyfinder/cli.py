@@ -1,26 +1,49 @@
 """Console script for proxyfinder."""
 import argparse
+import ipaddress
+import os
+import queue
 import sys
+import tempfile
+import time
 
 import pyperclip
-from progressbar import ProgressBar
+import requests
+from progressbar import (ProgressBar, UnknownLength, AnimatedMarker, Bar, Counter,
+    Percentage, SimpleProgress, Variable)
 
 from . import proxyfinder
+from . import api
+from . import asyncfinder
+from . import daemon
+from . import processfinder
+from . import distributed
+from . import metrics
+from . import health
+from . import sourcecache
+from .models import proxy_url
+from .progress import format_eta
 
+# min seconds between two rewrites of the output file in daemon mode
+OUTPUT_INTERVAL = 5.0
 
-def p_format(proxy_info, show_error=False):
-    """Return formatted text from a proxy info dictionary.
+
+def p_format(proxy_info, show_error=False, show_latency=False):
+    """Return formatted text from a proxy info.
 
     Args:
-        proxy_info (dict): Proxy dictionary info
+        proxy_info (Proxy|dict): Proxy info
         show_error (bool): A flag to show error. Default: False
+        show_latency (bool): A flag to show latency of working proxies. Default: False
 
     Returns:
         str: Formatted text
     """
     if show_error and proxy_info["error"]:
-        return "{protocol}://{ip}:{port} -> {error}".format(**proxy_info)
-    return "{protocol}://{ip}:{port}".format(**proxy_info)
+        return f"{proxy_url(proxy_info)} -> {proxy_info['error']}"
+    if show_latency and proxy_info.get("latency") is not None:
+        return f"{proxy_url(proxy_info)} ({proxy_info['latency'] * 1000:.0f} ms)"
+    return proxy_url(proxy_info)
 
 
 def copy_to_clipboard(proxy_list):
@@ -46,63 +69,324 @@ def list_only(proxy_list, output=None):
         output.write(joined)
 
 
+def write_atomic(output, text):
+    """Replace the content of an output file at once, readers never see
+    half of it.
+
+    Args:
+        output (TextIO): File opened for writing
+        text (str): New content
+    """
+    if not os.path.isfile(output.name):
+        output.write(text)
+        output.flush()
+        return
+    fd, path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(output.name)))
+    with os.fdopen(fd, "w") as f:
+        f.write(text)
+    os.replace(path, output.name)
+
+
+def is_loopback(host):
+    """Tell whether host is only reachable from this machine.
+
+    Args:
+        host (str): Address or host name
+
+    Returns:
+        bool: True for localhost and the loopback addresses
+    """
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def start_api(address, working_set, on_bad=None):
+    """Serve working_set on address, see api.ApiServer.
+
+    Args:
+        address (str): [HOST:]PORT, HOST defaults to 127.0.0.1
+        working_set (WorkingSet): Proxies to serve
+        on_bad (callable, optional): Called with the proxies reported bad. Defaults to None.
+
+    Returns:
+        ApiServer: Running server
+    """
+    host, _, port = address.rpartition(":")
+    server = api.ApiServer(working_set, host or "127.0.0.1", int(port), on_bad)
+    server.start()
+    print(f"Serving the working proxies on {server.address}/proxies")
+    return server
+
+
+def run_daemon(pf, output=None):
+    """Run a ProxyDaemon until interrupted, showing the proxies joining (+)
+    and leaving (-) the working set and keeping output up to date, fastest
+    first.
+
+    Args:
+        pf (ProxyDaemon): Daemon to run
+        output (TextIO, optional): File-like object to write. Defaults to None.
+    """
+    changes = queue.Queue()
+    pf.pool.subscribe(lambda proxy, working: changes.put((proxy, working)))
+    pf.start()
+    print(f"Checking {pf.url} until interrupted (Ctrl+C)")
+    written = 0.0
+    dirty = False
+    shown = set()
+    try:
+        while True:
+            try:
+                proxy, working = changes.get(timeout=1)
+                url = proxy_url(proxy)
+                # working again only refreshes the latency
+                if working != (url in shown):
+                    sign = "+" if working else "-"
+                    print(f"{sign} {p_format(proxy, show_error=True, show_latency=True)}")
+                    (shown.add if working else shown.discard)(url)
+                dirty = True
+            except queue.Empty:
+                pass
+            if output and dirty and time.monotonic() - written >= OUTPUT_INTERVAL:
+                working_set = pf.get_fastest(len(pf.pool))
+                write_atomic(output, "\n".join(p_format(proxy) for proxy in working_set))
+                written = time.monotonic()
+                dirty = False
+    except KeyboardInterrupt:
+        pf.stop()
+
+
 def main():
     """Console script for proxyfinder."""
     parser = argparse.ArgumentParser()
     parser.add_argument("-u", "--url", type=str, help="A valid URL to check proxy addresses.")
     parser.add_argument("-p", "--max-proxies", type=int, default=0, help="Max number of proxy addresses to check. Set 0 to check all. (default: 0)")
+    parser.add_argument("-w", "--want", dest="max_working", type=int, default=0, metavar="N", help="Stop as soon as N working proxy addresses are found. Set 0 to check all. (default: 0)")
     parser.add_argument("-t", "--max-threads", type=int, default=20, help="Max number of connections at the same time. (default: 20)")
     parser.add_argument("-n", "--conn-timeout", type=float, default=3.05, help="Max time (in seconds) to wait to establish a connection. (default: 3.05)")
+    parser.add_argument("-d", "--adaptive", action="store_true", help="Grow and shrink the number of connections with the observed completion rate and errors, starting from --max-threads, up to what the open files limit allows.")
+    parser.add_argument("--read-timeout", type=float, help="Max time (in seconds) to wait for data once connected. (default: --conn-timeout)")
+    parser.add_argument("--total-timeout", type=float, help="Max time (in seconds) for a whole check, redirects included. (default: no limit)")
+    parser.add_argument("--adaptive-timeout", action="store_true", help="Once enough proxies work, tighten the timeouts to a multiple of their 95th percentile timings.")
+    parser.add_argument("-f", "--prefilter-timeout", type=float, default=0, help="Before the full check, discard proxies not accepting a TCP connection (and SOCKS handshake) within this many seconds. Set 0 to disable. (default: 0)")
+    parser.add_argument("-s", "--stream", action="store_true", help="Start checking proxy addresses while they are still being scraped.")
+    parser.add_argument("-P", "--processes", type=int, default=0, help="Check in this many worker processes, --max-threads (and --async) then apply to each of them. Set 0 to check in this process. (default: 0)")
+    parser.add_argument("--coordinator", metavar="[HOST:]PORT", help="Scrape and triage here, but lease the checks to workers started with --worker on this or other machines. HOST defaults to 127.0.0.1, any other address requires --secret.")
+    parser.add_argument("--worker", metavar="URL", help="Check the proxies leased by the coordinator at URL (e.g. http://10.0.0.1:8765) until it has no more work. --max-threads, --async and --adaptive apply to this worker.")
+    parser.add_argument("--secret", help="Shared secret between the coordinator and its workers.")
+    parser.add_argument("--metrics", metavar="[HOST:]PORT", help="Serve the check metrics in the Prometheus text format on http://HOST:PORT/metrics (HOST defaults to 127.0.0.1), and as JSON on /metrics.json.")
+    parser.add_argument("--metrics-json", type=argparse.FileType("a"), metavar="PATH", help="Append a JSON snapshot of the check metrics to this file every --metrics-interval seconds, and at the end.")
+    parser.add_argument("--metrics-interval", type=float, default=10, help="Seconds between two --metrics-json snapshots. (default: 10)")
+    parser.add_argument("--profile", action="store_true", help="Trace the phases of every check (connect, handshake, TLS, first byte, body...) and print where the time went at the end.")
+    parser.add_argument("-D", "--daemon", action="store_true", help="Keep running: check the proxies found again and again, working ones less often, scrape the sources every --scrape-interval seconds and keep --output-file up to date with the working ones.")
+    parser.add_argument("--scrape-interval", type=float, default=daemon.SCRAPE_INTERVAL, help=f"With --daemon, seconds between two scrapes of the sources. (default: {daemon.SCRAPE_INTERVAL:.0f})")
+    parser.add_argument("--max-rate", type=float, default=daemon.MAX_RATE, help=f"With --daemon, max checks started per second. Set 0 for no limit but --max-threads. (default: {daemon.MAX_RATE:.0f})")
+    parser.add_argument("--serve", metavar="[HOST:]PORT", help="Serve the working proxies found so far over HTTP/JSON on http://HOST:PORT (HOST defaults to 127.0.0.1): GET /proxies, /proxies/random, /proxies/fastest (?protocol=), POST /proxies/bad. Without --daemon, keeps serving after the check until interrupted.")
+    parser.add_argument("-A", "--async", dest="use_async", action="store_true", help="Check proxies on a single asyncio event loop. --max-threads then sets the number of checks in flight.")
+    parser.add_argument("-H", "--health-cache", nargs="?", const=health.DEFAULT_PATH, metavar="PATH", help=f"Remember check results between runs: fresh results are not checked again and recently failed proxies are skipped. (default path: {health.DEFAULT_PATH})")
+    parser.add_argument("-r", "--retry-failed", action="store_true", help="With --health-cache, check recently failed proxies last instead of skipping them.")
+    parser.add_argument("-S", "--source-cache", nargs="?", const=sourcecache.DEFAULT_PATH, metavar="PATH", help=f"Cache the proxy lists downloaded from the sources and revalidate them with conditional requests. (default path: {sourcecache.DEFAULT_PATH})")
+    parser.add_argument("--source-max-age", type=float, default=sourcecache.MAX_AGE, help=f"Seconds a cached proxy list is used without asking the source again. (default: {sourcecache.MAX_AGE})")
+    parser.add_argument("-F", "--fastest", type=int, default=0, metavar="N", help="When the check is over, show (copy, write) only the N fastest working proxy addresses, fastest first. Set 0 to keep the check order. (default: 0)")
     parser.add_argument("-a", "--show-all", action="store_true", help="Show all online/offline proxy addresses.")
     parser.add_argument("-c", "--copy", action="store_true", help="Copy proxy addresses to the clipboard.")
     parser.add_argument("-l", "--proxy-list", action="store_true", help="Show proxy addresses only. You can use this with --output-file to save proxy addresses.")
     parser.add_argument("-o", "--output-file", type=argparse.FileType("w"), help="Write proxy addresses to a file.")
     args = parser.parse_args()
 
+    if args.worker:
+        try:
+            checked = distributed.run_worker(args.worker, max_threads=args.max_threads,
+                use_async=args.use_async, adaptive=args.adaptive, secret=args.secret)
+        except requests.HTTPError as e:
+            print(f"The coordinator refused the worker: {e.response.status_code} "
+                  f"{e.response.reason}")
+            sys.exit(1)
+        except requests.ConnectionError:
+            print(f"Cannot reach the coordinator at {args.worker}")
+            sys.exit(1)
+        print(f"{checked} proxy addresses checked.")
+        sys.exit()
+
     # if is not a list request than URL is necessary
     if not args.proxy_list and args.url is None:
         parser.print_help()
         print("\nYou must provide a valid URL.")
         sys.exit()
 
+    source_cache = None
+    if args.source_cache:
+        source_cache = sourcecache.SourceCache(args.source_cache, args.source_max_age)
+
     if args.proxy_list:
-        proxy_list = proxyfinder.get_proxy_list()
+        proxy_list = proxyfinder.get_proxy_list(cache=source_cache)
         list_only(proxy_list, args.output_file)
         if args.copy:
             copy_to_clipboard(proxy_list)
         sys.exit()
 
     # Prepare to check proxy addresses
-    pf = proxyfinder.ProxyFinder(url=args.url, max_proxies=args.max_proxies,
-        max_threads=args.max_threads, conn_timeout=args.conn_timeout)
+    health_store = None
+    if args.health_cache:
+        health_store = health.HealthStore(args.health_cache)
+
+    if args.daemon:
+        # a daemon checks in this process, one pool, and does not end
+        for name, value in (("--stream", args.stream), ("--want", args.max_working),
+                            ("--max-proxies", args.max_proxies),
+                            ("--processes", args.processes), ("--async", args.use_async),
+                            ("--coordinator", args.coordinator), ("--fastest", args.fastest),
+                            ("--copy", args.copy)):
+            if value:
+                parser.error(f"{name} does not apply to --daemon")
+        pf = daemon.ProxyDaemon(url=args.url, max_threads=args.max_threads,
+            conn_timeout=args.conn_timeout, prefilter_timeout=args.prefilter_timeout,
+            health_store=health_store, source_cache=source_cache, adaptive=args.adaptive,
+            read_timeout=args.read_timeout, total_timeout=args.total_timeout,
+            adaptive_timeout=args.adaptive_timeout, trace=args.profile,
+            max_rate=args.max_rate, scrape_interval=args.scrape_interval)
+    elif args.coordinator:
+        host, _, port = args.coordinator.rpartition(":")
+        host = host or "127.0.0.1"
+        if not args.secret and not is_loopback(host):
+            parser.error("--coordinator on a non-loopback address requires --secret")
+        pf = distributed.Coordinator(url=args.url, max_proxies=args.max_proxies,
+            max_threads=args.max_threads, conn_timeout=args.conn_timeout,
+            prefilter_timeout=args.prefilter_timeout, stream=args.stream,
+            health_store=health_store, skip_failed=not args.retry_failed,
+            source_cache=source_cache, max_working=args.max_working,
+            read_timeout=args.read_timeout, total_timeout=args.total_timeout,
+            host=host, port=int(port), secret=args.secret,
+            trace=args.profile)
+    elif args.processes > 0:
+        pf = processfinder.ProcessProxyFinder(url=args.url, max_proxies=args.max_proxies,
+            max_threads=args.max_threads, conn_timeout=args.conn_timeout,
+            prefilter_timeout=args.prefilter_timeout, stream=args.stream,
+            health_store=health_store, skip_failed=not args.retry_failed,
+            source_cache=source_cache, adaptive=args.adaptive,
+            max_working=args.max_working, read_timeout=args.read_timeout,
+            total_timeout=args.total_timeout, adaptive_timeout=args.adaptive_timeout,
+            processes=args.processes, use_async=args.use_async, trace=args.profile)
+    elif args.use_async:
+        pf = asyncfinder.AsyncProxyFinder(url=args.url, max_proxies=args.max_proxies,
+            max_concurrency=args.max_threads, conn_timeout=args.conn_timeout,
+            prefilter_timeout=args.prefilter_timeout, stream=args.stream,
+            health_store=health_store, skip_failed=not args.retry_failed,
+            source_cache=source_cache, adaptive=args.adaptive,
+            max_working=args.max_working, read_timeout=args.read_timeout,
+            total_timeout=args.total_timeout, adaptive_timeout=args.adaptive_timeout,
+            trace=args.profile)
+    else:
+        pf = proxyfinder.ProxyFinder(url=args.url, max_proxies=args.max_proxies,
+            max_threads=args.max_threads, conn_timeout=args.conn_timeout,
+            prefilter_timeout=args.prefilter_timeout, stream=args.stream,
+            health_store=health_store, skip_failed=not args.retry_failed,
+            source_cache=source_cache, adaptive=args.adaptive,
+            max_working=args.max_working, read_timeout=args.read_timeout,
+            total_timeout=args.total_timeout, adaptive_timeout=args.adaptive_timeout,
+            trace=args.profile)
+    metrics_server = reporter = None
+    if args.metrics:
+        host, _, port = args.metrics.rpartition(":")
+        metrics_server = metrics.MetricsServer(pf.metrics.registry, host or "127.0.0.1", int(port))
+        metrics_server.start()
+        print(f"Serving metrics on {metrics_server.address}")
+    if args.metrics_json:
+        reporter = metrics.JsonReporter(pf.metrics.registry, args.metrics_json,
+                                        args.metrics_interval)
+        reporter.start()
+    working_set = api.WorkingSet()
+    api_server = None
+
+    if args.daemon:
+        if args.serve:
+            pf.pool.subscribe(working_set.update)
+            api_server = start_api(args.serve, working_set, pf.pool.recheck)
+        run_daemon(pf, args.output_file)
+        if api_server is not None:
+            api_server.stop()
+        if health_store is not None:
+            health_store.close()
+        if reporter is not None:
+            reporter.stop()
+        if metrics_server is not None:
+            metrics_server.stop()
+        if args.profile:
+            print(pf.get_profile().report())
+        return 0
+
+    if args.serve:
+        api_server = start_api(args.serve, working_set)
+
     pf.start()
+    if args.coordinator:
+        print(f"Waiting for workers on {pf.address}")
 
     working = []
 
-    with ProgressBar(max_value=len(pf.get_proxies()), redirect_stdout=True) as bar:
-        while not pf.is_finished() or not pf.result_queue.empty():
-            try:
-                last_results = pf.get_last_results()
+    # the total is unknown while proxies are still being scraped
+    if args.stream:
+        max_value = UnknownLength
+        widgets = [AnimatedMarker(), " ", Counter()]
+    else:
+        max_value = len(pf.proxy_found)
+        widgets = [Percentage(), " ", Bar(), " ",
+                   SimpleProgress()]
+    widgets += [" ", Variable("rate", format="{formatted_value}", width=1),
+                " ", Variable("eta", format="ETA {formatted_value}", width=1)]
+    with ProgressBar(max_value=max_value, widgets=widgets, redirect_stdout=True) as bar:
+        try:
+            # wait for results, without polling
+            for last_results in pf.iter_batches(timeout=1):
                 for res in last_results:
                     if not res["error"]:
                         working.append(res)
-                    if not args.show_all and res["error"]:
+                        working_set.add(res)
+                    if args.fastest or (not args.show_all and res["error"]):
                         continue
-                    print(p_format(res, show_error=True))
+                    print(p_format(res, show_error=True, show_latency=True))
 
                 # update progress bar
-                progress = len(pf.proxy_found) - pf.get_proxies_left()
-                bar.update(progress - 1)
-            except KeyboardInterrupt:
-                pf.stop()
-                break
+                progress = pf.get_progress()
+                rate = "-" if progress.rate is None else f"{progress.rate:.1f}/s"
+                bar.update(max(0, progress.done - 1), rate=rate, eta=format_eta(progress.eta))
+        except KeyboardInterrupt:
+            pf.stop()
         bar.update(len(pf.proxy_found))
 
+    if health_store is not None:
+        health_store.close()
+    if reporter is not None:
+        reporter.stop()
+    if metrics_server is not None:
+        metrics_server.stop()
+
+    if args.profile:
+        print(pf.get_profile().report())
+
     # last tasks
+    if args.fastest:
+        working = proxyfinder.fastest(working, args.fastest)
+        for res in working:
+            print(p_format(res, show_latency=True))
     if args.copy:
         copy_to_clipboard(working)
     if args.output_file:
         args.output_file.write("\n".join(p_format(proxy) for proxy in working))
+        args.output_file.flush()
+
+    if api_server is not None:
+        print("Check complete, serving until interrupted (Ctrl+C)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+        api_server.stop()
 
     return 0
 
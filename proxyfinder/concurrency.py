@@ -0,0 +1,168 @@
+"""Adaptive concurrency for the checker pool.
+
+AdaptiveLimit is an AIMD controller for the number of checks in flight.
+Every interval it looks at the checks finished since the last decision:
+
+* local errors (out of file descriptors, buffers or ports) or a failure
+  ratio well above the usual one halve the limit: these are failures of
+  this machine or its link, not of the proxies;
+* otherwise, if the completion rate did not drop, the limit grows by a
+  fixed step;
+* otherwise it is held.
+
+The limit never exceeds a hard ceiling derived from the file descriptor
+limit of the process.
+"""
+
+import errno
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+from .timeouts import DEADLINE_ERROR
+
+LOCAL_ERROR = "Local error"
+
+# errno values meaning this machine ran out of something
+LOCAL_ERRNOS = frozenset(getattr(errno, name) for name in
+                         ("EMFILE", "ENFILE", "ENOBUFS", "ENOMEM", "EADDRNOTAVAIL")
+                         if hasattr(errno, name))
+
+# errors counted in the failure ratio
+CONNECT_ERRORS = frozenset(("Connection error", "Request timed out while trying to connect",
+                            "Server did not send any data", DEADLINE_ERROR))
+
+DEFAULT_CEILING = 512
+FD_RESERVE = 64
+FDS_PER_CHECK = 2
+
+
+def fd_ceiling(reserve=FD_RESERVE, fds_per_check=FDS_PER_CHECK, default=DEFAULT_CEILING):
+    """Max checks in flight allowed by the file descriptor limit
+
+    Args:
+        reserve (int, optional): Descriptors kept for everything else. Defaults to 64.
+        fds_per_check (int, optional): Descriptors used by one check. Defaults to 2.
+        default (int, optional): Ceiling if the limit is unknown. Defaults to 512.
+
+    Returns:
+        int: Ceiling
+    """
+    if resource is None:
+        return default
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return default
+    return max(1, (soft - reserve) // fds_per_check)
+
+
+def is_local_error(exc):
+    """Check if an exception, or one it wraps, is a local resource error
+
+    Args:
+        exc (BaseException): Exception raised by a check
+
+    Returns:
+        bool: True if the error comes from this machine
+    """
+    seen = set()
+    pending = [exc]
+    while pending:
+        exc = pending.pop()
+        if id(exc) in seen:
+            continue
+        seen.add(id(exc))
+        if isinstance(exc, OSError) and exc.errno in LOCAL_ERRNOS:
+            return True
+        # requests, urllib3 and PySocks wrap the socket error
+        wrapped = (exc.__cause__, exc.__context__, getattr(exc, "reason", None),
+                   getattr(exc, "socket_err", None)) + tuple(getattr(exc, "args", ()))
+        pending.extend(item for item in wrapped if isinstance(item, BaseException))
+    return False
+
+
+class AdaptiveLimit:
+    """AIMD limit of checks in flight
+
+    Args:
+        initial (int, optional): Starting limit. Defaults to 20.
+        minimum (int, optional): Lowest limit. Defaults to 2.
+        maximum (int, optional): Highest limit. Defaults to fd_ceiling().
+        increase (int, optional): Step added when growing. Defaults to 5.
+        decrease (float, optional): Factor applied when shrinking. Defaults to 0.5.
+        interval (float, optional): Seconds between decisions. Defaults to 1.0.
+        min_samples (int, optional): Finished checks needed for a decision. Defaults to 10.
+        failure_slack (float, optional): Failure ratio above the usual one
+            that counts as congestion. Defaults to 0.2.
+    """
+
+    def __init__(self, initial=20, minimum=2, maximum=None, increase=5, decrease=0.5,
+                 interval=1.0, min_samples=10, failure_slack=0.2):
+        self.maximum = fd_ceiling() if maximum is None else maximum
+        self.minimum = min(minimum, self.maximum)
+        self.increase = increase
+        self.decrease = decrease
+        self.interval = interval
+        self.min_samples = min_samples
+        self.failure_slack = failure_slack
+        self._limit = max(self.minimum, min(initial, self.maximum))
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._completed = 0
+        self._failures = 0
+        self._local_errors = 0
+        self._last_rate = None
+        self._baseline = None
+
+    @property
+    def limit(self):
+        """int: Current limit of checks in flight"""
+        return self._limit
+
+    def record(self, error, now=None):
+        """Count a finished check, and take a decision when the interval is over
+
+        Args:
+            error (str): Check error, empty if the proxy works
+            now (float, optional): time.monotonic() value. Defaults to now.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._completed += 1
+            if error == LOCAL_ERROR:
+                self._local_errors += 1
+            elif error in CONNECT_ERRORS:
+                self._failures += 1
+            if now - self._window_start >= self.interval:
+                self._update(now)
+
+    def _update(self, now):
+        if self._local_errors:
+            self._shrink()
+        elif self._completed >= self.min_samples:
+            rate = self._completed / (now - self._window_start)
+            ratio = self._failures / self._completed
+            if self._baseline is None or ratio < self._baseline:
+                self._baseline = ratio
+            else:
+                # follow a slowly rising failure ratio, e.g. worse proxies
+                self._baseline += 0.05 * (ratio - self._baseline)
+            if ratio > self._baseline + self.failure_slack:
+                self._shrink()
+            elif self._last_rate is None or rate >= self._last_rate * 0.9:
+                self._limit = min(self.maximum, self._limit + self.increase)
+            self._last_rate = rate
+        else:
+            # too few checks to judge, keep counting
+            return
+        self._window_start = now
+        self._completed = self._failures = self._local_errors = 0
+
+    def _shrink(self):
+        self._limit = max(self.minimum, int(self._limit * self.decrease))
+        # the rate at the old limit is no reference for the new one
+        self._last_rate = None
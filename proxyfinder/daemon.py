@@ -0,0 +1,428 @@
+"""Daemon mode: a pool of proxies kept verified around the clock.
+
+ProxyDaemon is a ProxyFinder that does not end. Its ProxyPool knows every
+candidate and when it is due for its next check, in a heap of next-check
+times; a Scheduler thread moves the due proxies into the check queue of the
+usual worker threads, at most max_rate a second, and the results go back
+into the pool, which reschedules them:
+
+* a new candidate is checked as soon as the rate allows; if it fails it is
+  dropped, and not taken again from the sources for forget_after seconds
+* a working proxy that works again waits twice as long before the next
+  check, up to max_interval
+* a proxy that changes state (came up, went down) is checked again after
+  min_interval; after max_failures failures in a row it is dropped
+* a check failing on this side (LOCAL_ERROR: no free file descriptors, no
+  route...) says nothing about the proxy, it is only tried again after
+  local_retry seconds
+
+The intervals get some random jitter, so proxies found by the same scrape
+do not stay due at the same time. The sources are scraped again every
+scrape_interval seconds, in the background.
+"""
+
+import heapq
+import itertools
+import random
+import threading
+import time
+
+from . import dedup
+from .concurrency import LOCAL_ERROR
+from .proxyfinder import PoolScaler, ProxyFinder, fastest, iter_proxy_list
+
+MIN_INTERVAL = 60.0
+MAX_INTERVAL = 3600.0
+MAX_FAILURES = 3
+FORGET_AFTER = 6 * 3600.0
+LOCAL_RETRY = 10.0
+SCRAPE_INTERVAL = 900.0
+MAX_RATE = 20.0
+
+
+class PoolEntry:
+    """Schedule of one proxy of a ProxyPool
+    """
+
+    __slots__ = ("proxy", "interval", "due", "failures", "checks", "working")
+
+    def __init__(self, proxy, due):
+        self.proxy = proxy
+        self.interval = 0.0
+        self.due = due
+        self.failures = 0
+        self.checks = 0
+        self.working = False
+
+
+class ProxyPool:
+    """Thread safe set of proxies, each with the time of its next check
+
+    Args:
+        min_interval (float, optional): Seconds before checking again a proxy
+            that changed state. Defaults to 60.
+        max_interval (float, optional): Max seconds between two checks of a
+            working proxy. Defaults to 3600.
+        max_failures (int, optional): Failures in a row before a proxy that
+            worked is dropped. Defaults to 3.
+        forget_after (float, optional): Seconds a dropped proxy is not taken
+            back from the sources. Defaults to 6 hours.
+        jitter (float, optional): Random share added to or taken from every
+            interval. Defaults to 0.1.
+        local_retry (float, optional): Seconds before checking again a proxy
+            whose check failed with a local error. Defaults to 10.
+    """
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 max_failures=MAX_FAILURES, forget_after=FORGET_AFTER, jitter=0.1,
+                 local_retry=LOCAL_RETRY):
+        self.min_interval = min_interval
+        self.local_retry = local_retry
+        self.max_interval = max_interval
+        self.max_failures = max_failures
+        self.forget_after = forget_after
+        self.jitter = jitter
+        self.entries = {}
+        self._heap = []
+        self._dropped = {}
+        self._working = 0
+        self._listeners = []
+        self._seq = itertools.count()
+        self._random = random.Random()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, proxy):
+        return dedup.proxy_key(proxy) in self.entries
+
+    def subscribe(self, callback):
+        """Call callback(proxy, working) whenever a proxy joins (working is
+        True) or leaves (False) the working set, and with True again every
+        time a working proxy works again, with its new latency
+
+        Args:
+            callback (callable): Called from the thread delivering the result
+        """
+        self._listeners.append(callback)
+
+    def _schedule(self, entry, due):
+        entry.due = due
+        heapq.heappush(self._heap, (due, next(self._seq), dedup.proxy_key(entry.proxy)))
+
+    def add(self, proxy, now=None):
+        """Add a candidate, due for a check now
+
+        Args:
+            proxy (Proxy): Proxy to check
+            now (float, optional): time.monotonic() value. Defaults to now.
+
+        Returns:
+            bool: False if the proxy is in the pool already or was dropped recently
+        """
+        now = time.monotonic() if now is None else now
+        key = dedup.proxy_key(proxy)
+        with self._lock:
+            if key in self.entries:
+                return False
+            dropped = self._dropped.get(key)
+            if dropped is not None:
+                if now - dropped < self.forget_after:
+                    return False
+                del self._dropped[key]
+            entry = PoolEntry(proxy, now)
+            self.entries[key] = entry
+            self._schedule(entry, now)
+        return True
+
+    def pop_due(self, now=None):
+        """Take the proxy whose check is the most overdue
+
+        Args:
+            now (float, optional): time.monotonic() value. Defaults to now.
+
+        Returns:
+            tuple: (proxy, None), or (None, seconds to the next due check)
+                   if none is due yet. Seconds is None if nothing is scheduled.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            while self._heap:
+                due, _, key = self._heap[0]
+                entry = self.entries.get(key)
+                if entry is None or entry.due != due:
+                    # dropped, or scheduled again since
+                    heapq.heappop(self._heap)
+                    continue
+                if due > now:
+                    return None, due - now
+                heapq.heappop(self._heap)
+                # in flight until update()
+                entry.due = None
+                return entry.proxy, None
+        return None, None
+
+    def update(self, proxy, now=None):
+        """Reschedule a checked proxy, or drop it
+
+        Args:
+            proxy (Proxy): Checked proxy
+            now (float, optional): time.monotonic() value. Defaults to now.
+        """
+        now = time.monotonic() if now is None else now
+        key = dedup.proxy_key(proxy)
+        working = not proxy["error"]
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            if proxy["error"] == LOCAL_ERROR:
+                # not the proxy's fault, nothing learnt: try again soon
+                spread = self.jitter * self.local_retry
+                self._schedule(entry, now + self.local_retry
+                               + self._random.uniform(-spread, spread))
+                return
+            changed = working != entry.working
+            entry.checks += 1
+            entry.working = working
+            if working:
+                entry.failures = 0
+                # steady proxies are checked less and less often
+                entry.interval = (self.min_interval if changed
+                                  else min(2 * entry.interval, self.max_interval))
+            else:
+                entry.failures += 1
+                entry.interval = self.min_interval
+            if not working and (entry.failures >= self.max_failures or entry.checks == 1):
+                del self.entries[key]
+                self._dropped[key] = now
+            else:
+                spread = self.jitter * entry.interval
+                self._schedule(entry, now + entry.interval
+                               + self._random.uniform(-spread, spread))
+            if changed:
+                self._working += 1 if working else -1
+        if changed or working:
+            self._notify(proxy, working)
+
+    def recheck(self, proxy, now=None):
+        """Take a proxy out of the working set and check it again as soon as
+        possible, e.g. when a consumer reports it does not work
+
+        Args:
+            proxy (Proxy|dict): Proxy info. Keys: ip, port, protocol.
+            now (float, optional): time.monotonic() value. Defaults to now.
+
+        Returns:
+            bool: False if the proxy is not in the pool
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self.entries.get(dedup.proxy_key(proxy))
+            if entry is None:
+                return False
+            was_working = entry.working
+            if was_working:
+                entry.working = False
+                self._working -= 1
+            if entry.due is not None:
+                # not in flight, move it to the head of the queue
+                self._schedule(entry, now)
+        if was_working:
+            self._notify(entry.proxy, False)
+        return True
+
+    def _notify(self, proxy, working):
+        for callback in self._listeners:
+            callback(proxy, working)
+
+    def forget(self, now=None):
+        """Let the sources bring back the proxies dropped more than
+        forget_after seconds ago
+
+        Args:
+            now (float, optional): time.monotonic() value. Defaults to now.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._dropped = {key: dropped for key, dropped in self._dropped.items()
+                             if now - dropped < self.forget_after}
+
+    def get_working(self):
+        """Retrive the proxies that worked at their last check
+
+        Returns:
+            list: Working proxies
+        """
+        with self._lock:
+            return [entry.proxy for entry in self.entries.values() if entry.working]
+
+    def get_working_count(self):
+        """Retrive number of proxies that worked at their last check
+
+        Returns:
+            int: Working proxies
+        """
+        return self._working
+
+
+class Scheduler(threading.Thread):
+    """Move the due proxies of a daemon pool into its check queue, at most
+    max_rate a second and only while the workers keep up; scrape the
+    sources every scrape_interval seconds
+    """
+
+    def __init__(self, finder, max_rate=MAX_RATE, scrape_interval=SCRAPE_INTERVAL):
+        super().__init__()
+
+        self.finder = finder
+        self.max_rate = max_rate
+        self.scrape_interval = scrape_interval
+        self._kill = False
+        self.daemon = True
+
+    def stop(self):
+        """Stop scheduling
+        """
+        self._kill = True
+
+    def run(self):
+        """Thread start point
+        """
+        pool = self.finder.pool
+        next_scrape = time.monotonic()
+        release = 0.0
+        while not self._kill:
+            now = time.monotonic()
+            if self.scrape_interval and now >= next_scrape:
+                self.finder.scrape()
+                next_scrape = now + self.scrape_interval
+            wait = release - now
+            if wait <= 0:
+                if self.finder.proxy_queue.qsize() >= self.finder.get_concurrency():
+                    # the workers are behind, due proxies wait in the pool
+                    wait = 0.05
+                else:
+                    proxy, wait = pool.pop_due(now)
+                    if proxy is not None:
+                        self.finder.proxy_queue.put(proxy)
+                        if self.max_rate:
+                            release = now + 1 / self.max_rate
+                        continue
+            if wait is None:
+                wait = 0.5
+            if self.scrape_interval:
+                wait = min(wait, next_scrape - now)
+            time.sleep(min(max(wait, 0.01), 0.5))
+
+
+class ProxyDaemon(ProxyFinder):
+    """ProxyFinder keeping a pool of proxies verified until stopped
+
+    Args:
+        max_rate (float, optional): Max checks started per second, 0 for no
+            limit but max_threads. Defaults to 20.
+        scrape_interval (float, optional): Seconds between two scrapes of the
+            sources, 0 to scrape only at start. Defaults to 900.
+        pool (ProxyPool, optional): Pool and its schedule settings. Defaults
+            to a ProxyPool with the default settings.
+        proxy_source (callable, optional): Called without arguments at every
+            scrape, returns the candidates. Defaults to the plugins.
+
+    Every other argument is the one of ProxyFinder. The results feed the
+    pool: watch it with pool.subscribe() instead of reading them.
+    """
+
+    def __init__(self, url, max_threads=20, conn_timeout=3.05, prefilter_timeout=None,
+                 health_store=None, source_cache=None, adaptive=False, read_timeout=None,
+                 total_timeout=None, adaptive_timeout=False, trace=False,
+                 max_rate=MAX_RATE, scrape_interval=SCRAPE_INTERVAL, pool=None,
+                 proxy_source=None):
+        super().__init__(url, max_threads=max_threads, conn_timeout=conn_timeout,
+                         prefilter_timeout=prefilter_timeout, health_store=health_store,
+                         source_cache=source_cache, adaptive=adaptive,
+                         read_timeout=read_timeout, total_timeout=total_timeout,
+                         adaptive_timeout=adaptive_timeout, trace=trace)
+        self.max_rate = max_rate
+        self.scrape_interval = scrape_interval
+        self.pool = pool if pool is not None else ProxyPool()
+        self.proxy_source = proxy_source
+        self.dispatcher = None
+        self._scraper = None
+
+    def scrape(self):
+        """Add the proxies found in the sources to the pool, in the
+        background. Does nothing if the last scrape is still running.
+        """
+        if self._scraper is not None and self._scraper.is_alive():
+            return
+        self._scraper = threading.Thread(target=self._scrape, daemon=True)
+        self._scraper.start()
+
+    def _scrape(self):
+        self.pool.forget()
+        if self.proxy_source is not None:
+            proxies = self.proxy_source()
+        else:
+            proxies = iter_proxy_list(cache=self.source_cache,
+                                      on_source=self._source_callback())
+        for proxy in proxies:
+            self.pool.add(proxy)
+
+    def _record(self, results):
+        super()._record(results)
+        # the results live in the pool, all_results would grow forever
+        self.all_results.clear()
+
+    def get_fastest(self, count):
+        """Retrive the fastest proxies of the working set
+
+        Args:
+            count (int): Number of proxies to return
+
+        Returns:
+            list: Up to count working proxies, fastest first
+        """
+        return fastest(self.pool.get_working(), count)
+
+    def get_proxies_left(self):
+        """Retrive number of proxies in the pool, checked again when due
+
+        Returns:
+            int: Proxies in the pool
+        """
+        return len(self.pool)
+
+    def is_finished(self):
+        """A daemon is never finished, until stopped
+
+        Returns:
+            bool: True once stopped
+        """
+        return self.completed.is_set()
+
+    def stop(self):
+        """Stop scheduling, scraping and checking
+        """
+        super().stop()
+        self.feeding.clear()
+        if self.dispatcher is not None:
+            self.dispatcher.stop()
+
+    def start(self):
+        """Scrape the sources and start checking
+        """
+        self.feeding.set()
+        self.feeder = Scheduler(self, self.max_rate, self.scrape_interval)
+        if not self.scrape_interval:
+            self.scrape()
+        self.feeder.start()
+        for _ in range(self.get_concurrency()):
+            self.add_worker()
+        if self.limiter is not None:
+            scaler = PoolScaler(self)
+            scaler.start()
+            self.threads.append(scaler)
+        self.dispatcher = self.start_dispatcher(self.pool.update)
+        self._watch()
@@ -0,0 +1,132 @@
+"""Compact deduplication index for proxy endpoints.
+
+Every endpoint (protocol, ip, port) is packed into a single integer:
+
+    [ ip address | ipv6 flag (1 bit) | port (16 bits) | protocol (3 bits) ]
+
+so the index holds one int per proxy instead of a tuple of strings, and the
+same host on different ports or protocols is kept apart.
+"""
+
+import socket
+
+PROTOCOLS = ("http", "https", "socks4", "socks5")
+_PROTOCOL_IDS = {name: i for i, name in enumerate(PROTOCOLS)}
+
+
+def pack_key(protocol, ip, port):
+    """Pack a proxy endpoint into a single integer
+
+    Args:
+        protocol (str): One of PROTOCOLS
+        ip (str): IPv4 or IPv6 address
+        port (int): TCP port
+
+    Raises:
+        ValueError: If the endpoint can not be packed
+
+    Returns:
+        int: Packed key
+    """
+    try:
+        address = int.from_bytes(socket.inet_pton(socket.AF_INET, ip), "big") << 1
+    except OSError:
+        try:
+            address = int.from_bytes(socket.inet_pton(socket.AF_INET6, ip), "big") << 1 | 1
+        except OSError:
+            raise ValueError(f"Invalid IP address: {ip!r}") from None
+    if not 0 <= port <= 0xFFFF:
+        raise ValueError(f"Invalid port: {port!r}")
+    try:
+        protocol_id = _PROTOCOL_IDS[protocol]
+    except KeyError:
+        raise ValueError(f"Unknown protocol: {protocol!r}") from None
+    return (address << 19) | (port << 3) | protocol_id
+
+
+def unpack_key(key):
+    """Inverse of pack_key()
+
+    Args:
+        key (int): Packed key
+
+    Returns:
+        tuple: protocol, ip, port
+    """
+    protocol = PROTOCOLS[key & 0x7]
+    port = (key >> 3) & 0xFFFF
+    address = key >> 19
+    if address & 1:
+        ip = socket.inet_ntop(socket.AF_INET6, (address >> 1).to_bytes(16, "big"))
+    else:
+        ip = socket.inet_ntop(socket.AF_INET, (address >> 1).to_bytes(4, "big"))
+    return protocol, ip, port
+
+
+def proxy_key(proxy):
+    """Hashable key of a proxy endpoint, the one stored by ProxyIndex
+
+    Args:
+        proxy (Proxy|dict): Proxy info. Keys: ip, port, protocol.
+
+    Returns:
+        int|tuple: Packed endpoint, or the endpoint tuple if ip is not an IP address
+    """
+    return ProxyIndex._key(proxy)  # pylint: disable=protected-access
+
+
+class ProxyIndex:
+    """Set of seen proxy endpoints stored as packed integers
+    """
+
+    def __init__(self):
+        self._seen = set()
+
+    def __len__(self):
+        return len(self._seen)
+
+    def __contains__(self, proxy):
+        return self._key(proxy) in self._seen
+
+    @staticmethod
+    def _key(proxy, _inet_pton=socket.inet_pton, _af_inet=socket.AF_INET,
+             _from_bytes=int.from_bytes, _ids=_PROTOCOL_IDS):
+        # IPv4 fast path, same result as pack_key()
+        port = proxy["port"]
+        protocol_id = _ids.get(proxy["protocol"])
+        if protocol_id is not None and 0 <= port <= 0xFFFF:
+            try:
+                address = _from_bytes(_inet_pton(_af_inet, proxy["ip"]), "big")
+                return address << 20 | port << 3 | protocol_id
+            except OSError:
+                pass
+        try:
+            return pack_key(proxy["protocol"], proxy["ip"], proxy["port"])
+        except ValueError:
+            # not an IP address (e.g. a hostname), keep it as it is
+            return (proxy["protocol"], proxy["ip"], proxy["port"])
+
+    def add(self, proxy):
+        """Add a proxy if not seen yet
+
+        Args:
+            proxy (Proxy|dict): Proxy info. Keys: ip, port, protocol.
+
+        Returns:
+            bool: True if the proxy was not seen before
+        """
+        return self.add_key(self._key(proxy))
+
+    def add_key(self, key):
+        """Add a proxy by its proxy_key() if not seen yet
+
+        Args:
+            key (int|tuple): Key of the proxy
+
+        Returns:
+            bool: True if the proxy was not seen before
+        """
+        if key in self._seen:
+            return False
+        self._seen.add(key)
+        return True
@@ -0,0 +1,517 @@
+"""Distributed checking over HTTP.
+
+A Coordinator is a ProxyFinder whose checks are done by remote workers
+(run_worker(), CLI --worker). It scrapes, deduplicates and triages as
+usual, then leases batches of proxies to the workers over a small
+HTTP/JSON protocol:
+
+    GET  /config  job settings: target url, timeouts and tracing
+    POST /lease   {"worker", "size"}
+                  -> {"lease", "ttl", "proxies": [[token, protocol, ip, port], ...]}
+                  or {"lease": null, "done": bool} if there is nothing to lease
+    POST /report  {"worker", "leases": [lease, ...], "results": [[token, fields], ...]}
+
+A report renews the leases it lists. A lease not renewed within its ttl
+expires and its unreported proxies are leased again, to any worker; the
+first result for a proxy wins. Results of every worker are merged in the
+coordinator result queue as they arrive.
+"""
+
+import collections
+import hmac
+import json
+import queue
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from .asyncfinder import AsyncProxyFinder
+from .models import Proxy
+from .proxyfinder import ProxyFinder
+
+RESULT_FIELDS = ("error", "latency", "connect_time", "ttfb", "total_time", "trace")
+
+LEASE_SIZE = 64
+LEASE_TTL = 30.0
+SECRET_HEADER = "X-Proxyfinder-Secret"
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_report(leases, results):
+    """Validate a worker report before anything is changed
+
+    Args:
+        leases (list): Lease ids
+        results (list): [token, fields] pairs
+
+    Raises:
+        ValueError: If the report is malformed
+
+    Returns:
+        list: (token, fields) pairs, fields restricted to RESULT_FIELDS
+    """
+    if not isinstance(leases, list) or not all(isinstance(lease_id, int) for lease_id in leases):
+        raise ValueError("Invalid leases")
+    if not isinstance(results, list):
+        raise ValueError("Invalid results")
+    checked = []
+    for item in results:
+        if not isinstance(item, (list, tuple)) or len(item) != 2:
+            raise ValueError("Invalid result")
+        token, fields = item
+        if not isinstance(token, int) or not isinstance(fields, dict):
+            raise ValueError("Invalid result")
+        error = fields.get("error")
+        if not isinstance(error, str):
+            raise ValueError("Invalid result error")
+        for key in ("latency", "connect_time", "ttfb", "total_time"):
+            value = fields.get(key)
+            if value is not None and not _is_number(value):
+                raise ValueError(f"Invalid result {key}")
+        if not error and not _is_number(fields.get("latency")):
+            # a working proxy is ranked by its latency
+            raise ValueError("Invalid result latency")
+        trace = fields.get("trace")
+        if trace is not None and not (isinstance(trace, list) and all(
+                isinstance(entry, list) and len(entry) == 3 and isinstance(entry[0], str)
+                and _is_number(entry[1]) and _is_number(entry[2]) for entry in trace)):
+            raise ValueError("Invalid result trace")
+        checked.append((token, {key: fields[key] for key in RESULT_FIELDS if key in fields}))
+    return checked
+
+
+class Lease:
+    """Proxies leased to a worker
+    """
+
+    __slots__ = ("worker", "tokens", "expires")
+
+    def __init__(self, worker, tokens, expires):
+        self.worker = worker
+        self.tokens = tokens
+        self.expires = expires
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """HTTP front of a Coordinator, which is self.server.coordinator
+    """
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def _reply(self, code, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        secret = self.server.coordinator.secret
+        if secret is None:
+            return True
+        given = self.headers.get(SECRET_HEADER, "")
+        if hmac.compare_digest(given.encode("utf-8"), secret.encode("utf-8")):
+            return True
+        self._reply(403, {"error": "Forbidden"})
+        return False
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if not self._authorized():
+            return
+        if self.path == "/config":
+            self._reply(200, self.server.coordinator.config())
+        else:
+            self._reply(404, {"error": "Not found"})
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        if not self._authorized():
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            data = json.loads(self.rfile.read(length) or b"{}")
+            worker = str(data["worker"])
+            if self.path == "/lease":
+                reply = self.server.coordinator.lease(worker, int(data.get("size", LEASE_SIZE)))
+            elif self.path == "/report":
+                reply = self.server.coordinator.report(worker, data.get("leases", []),
+                                                       data.get("results", []))
+            else:
+                self._reply(404, {"error": "Not found"})
+                return
+        except (KeyError, TypeError, ValueError):
+            self._reply(400, {"error": "Bad request"})
+            return
+        self._reply(200, reply)
+
+
+class Coordinator(ProxyFinder):
+    """ProxyFinder leasing the checks to remote workers
+
+    Args:
+        host (str, optional): Address to listen on. Defaults to 127.0.0.1.
+        port (int, optional): Port to listen on, 0 for any free one. Defaults to 0.
+        lease_size (int, optional): Max proxies per lease. Defaults to 64.
+        lease_ttl (float, optional): Seconds a lease lives without a report. Defaults to 30.
+        secret (str, optional): Shared secret workers must send. Defaults to None.
+
+    Every other argument is the one of ProxyFinder. max_threads is only the
+    guess of checks in flight used by the time estimate until the workers
+    report back.
+    """
+
+    def __init__(self, url, max_proxies=-1, max_threads=20, conn_timeout=3.05,
+                 prefilter_timeout=None, stream=False, health_store=None,
+                 skip_failed=True, source_cache=None, max_working=0,
+                 read_timeout=None, total_timeout=None, host="127.0.0.1", port=0,
+                 lease_size=LEASE_SIZE, lease_ttl=LEASE_TTL, secret=None, trace=False):
+        super().__init__(url, max_proxies, max_threads, conn_timeout,
+                         prefilter_timeout, stream, health_store, skip_failed,
+                         source_cache, max_working=max_working,
+                         read_timeout=read_timeout, total_timeout=total_timeout,
+                         trace=trace)
+        self.host = host
+        self.port = port
+        self.lease_size = lease_size
+        self.lease_ttl = lease_ttl
+        self.secret = secret
+        self._server = None
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._expired = collections.deque()
+        self._leases = {}
+        self._token_lease = {}
+        self._next_token = 0
+        self._next_lease = 0
+
+    @property
+    def address(self):
+        """str: URL workers connect to, known once started"""
+        if self._server is None:
+            return None
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def config(self):
+        """Job settings sent to the workers
+
+        Returns:
+            dict: Target url, timeouts and whether to trace the checks
+        """
+        connect, read, total = self.timeouts.current()
+        return {"url": self.url, "conn_timeout": connect, "read_timeout": read,
+                "total_timeout": total, "prefilter_timeout": self.prefilter_timeout,
+                "trace": self.profile is not None}
+
+    def _expire(self, now):
+        for lease_id, lease in list(self._leases.items()):
+            if lease.expires < now:
+                del self._leases[lease_id]
+                self._expired.extend(lease.tokens)
+
+    def _work_done(self):
+        return (not self._in_flight and self.proxy_queue.empty()
+                and not self.feeding.is_set())
+
+    def _complete_if_done(self):
+        # the server thread never ends, the run is complete when the work is
+        with self._lock:
+            done = self._work_done()
+        if done:
+            self.complete()
+
+    def lease(self, worker, size):
+        """Lease up to size proxies to a worker, expired leases first
+
+        Args:
+            worker (str): Worker id
+            size (int): Max proxies
+
+        Returns:
+            dict: Lease reply, see the module documentation
+        """
+        size = max(1, min(size, self.lease_size))
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            tokens = []
+            while self._expired and len(tokens) < size:
+                token = self._expired.popleft()
+                if token in self._in_flight:
+                    tokens.append(token)
+            while len(tokens) < size:
+                try:
+                    proxy = self.proxy_queue.get_nowait()
+                except queue.Empty:
+                    break
+                self.proxy_queue.task_done()
+                token = self._next_token
+                self._next_token += 1
+                self._in_flight[token] = proxy
+                self.tracker.started()
+                tokens.append(token)
+            if not tokens:
+                done = self._work_done()
+                if done:
+                    self.complete()
+                return {"lease": None, "done": done}
+
+            lease_id = self._next_lease
+            self._next_lease += 1
+            self._leases[lease_id] = Lease(worker, set(tokens), now + self.lease_ttl)
+            for token in tokens:
+                self._token_lease[token] = lease_id
+            proxies = [[token, self._in_flight[token]["protocol"], self._in_flight[token]["ip"],
+                        self._in_flight[token]["port"]] for token in tokens]
+        return {"lease": lease_id, "ttl": self.lease_ttl, "proxies": proxies}
+
+    def report(self, worker, leases, results):
+        """Receive results from a worker and renew its leases
+
+        Args:
+            worker (str): Worker id
+            leases (list): Leases the worker still holds
+            results (list): [token, fields] pairs
+
+        Raises:
+            ValueError: If the report is malformed, nothing is taken from it then
+
+        Returns:
+            dict: Acknowledgement
+        """
+        results = _check_report(leases, results)
+        delivered = []
+        with self._lock:
+            expires = time.monotonic() + self.lease_ttl
+            for lease_id in leases:
+                lease = self._leases.get(lease_id)
+                if lease is not None and lease.worker == worker:
+                    lease.expires = expires
+            for token, fields in results:
+                proxy = self._in_flight.pop(token, None)
+                if proxy is None:
+                    # already reported by the worker of a newer lease
+                    continue
+                lease_id = self._token_lease.pop(token)
+                lease = self._leases.get(lease_id)
+                if lease is not None:
+                    lease.tokens.discard(token)
+                    if not lease.tokens:
+                        del self._leases[lease_id]
+                delivered.append((proxy, fields))
+        for proxy, fields in delivered:
+            self._deliver(proxy, fields)
+        self._complete_if_done()
+        return {"ok": True, "accepted": len(delivered)}
+
+    def get_concurrency(self):
+        """Retrive number of proxies leased and not reported yet
+
+        Returns:
+            int: Checks in flight, max_threads before the first lease
+        """
+        return len(self._in_flight) or self.max_threads
+
+    def get_active_threads(self):
+        """Retrive number of proxies leased and not reported yet
+
+        Returns:
+            int: Checks in flight
+        """
+        return len(self._in_flight)
+
+    def is_finished(self):
+        """Check if every proxy was reported by a worker
+
+        Returns:
+            bool: True if all processes are finished
+        """
+        if self.quota is not None and self.quota.done.is_set():
+            return True
+        with self._lock:
+            return self._server is not None and self._work_done()
+
+    def cancel_pending(self):
+        """Drop the proxies still to check and the leases, keeping the
+        results found so far. Workers are told there is no more work.
+        """
+        if self.feeder is not None:
+            self.feeder.stop()
+        self.feeding.clear()
+        with self._lock:
+            self.proxy_queue.queue.clear()
+            self._in_flight.clear()
+            self._expired.clear()
+            self._leases.clear()
+            self._token_lease.clear()
+        self.complete()
+
+    def stop(self):
+        """Stop serving the workers and reset queues
+        """
+        self.result_queue.queue.clear()
+        self.cancel_pending()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+        self.threads.clear()
+
+    def start(self):
+        """Start serving the workers
+        """
+        self.enqueue_proxies()
+
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.coordinator = self
+        t = threading.Thread(target=self._server.serve_forever, daemon=True)
+        t.start()
+        self.threads.append(t)
+        self._complete_if_done()
+
+
+class CoordinatorClient:
+    """Worker side of the protocol
+
+    Args:
+        address (str): Coordinator URL, e.g. http://127.0.0.1:8765
+        secret (str, optional): Shared secret. Defaults to None.
+        retries (int, optional): Attempts of every call. Defaults to 3.
+    """
+
+    def __init__(self, address, secret=None, retries=3):
+        self.address = address.rstrip("/")
+        self.retries = retries
+        self.session = requests.Session()
+        if secret is not None:
+            self.session.headers[SECRET_HEADER] = secret
+
+    def call(self, method, path, data=None):
+        """Call the coordinator, retrying on connection errors
+
+        Raises:
+            requests.RequestException: If every attempt failed
+
+        Returns:
+            dict: Reply
+        """
+        for attempt in range(self.retries):
+            try:
+                res = self.session.request(method, self.address + path, json=data, timeout=10)
+                res.raise_for_status()
+                return res.json()
+            except requests.ConnectionError:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(1)
+        return None
+
+    def close(self):
+        """Close the HTTP session
+        """
+        self.session.close()
+
+
+def run_worker(address, max_threads=20, use_async=False, adaptive=False, lease_size=LEASE_SIZE,
+               secret=None, worker_id=None, report_interval=1.0):
+    """Check proxies leased by a coordinator until it has no more work
+
+    Args:
+        address (str): Coordinator URL, e.g. http://127.0.0.1:8765
+        max_threads (int, optional): Threads, or checks in flight with use_async. Defaults to 20.
+        use_async (bool, optional): Check with AsyncProxyFinder. Defaults to False.
+        adaptive (bool, optional): Adaptive concurrency. Defaults to False.
+        lease_size (int, optional): Proxies asked per lease. Defaults to 64.
+        secret (str, optional): Shared secret. Defaults to None.
+        worker_id (str, optional): Worker id. Defaults to a random one.
+        report_interval (float, optional): Max seconds between reports. Defaults to 1.0.
+
+    Raises:
+        requests.HTTPError: If the coordinator refuses the worker, e.g. for a wrong secret
+        requests.ConnectionError: If the coordinator cannot be reached at start
+
+    Returns:
+        int: Number of proxies checked
+    """
+    worker_id = worker_id or uuid.uuid4().hex
+    client = CoordinatorClient(address, secret)
+    config = client.call("GET", "/config")
+    kwargs = {key: config[key] for key in ("conn_timeout", "read_timeout", "total_timeout",
+                                           "prefilter_timeout")}
+    kwargs["trace"] = config.get("trace", False)
+    if use_async:
+        pf = AsyncProxyFinder(config["url"], max_concurrency=max_threads, adaptive=adaptive,
+                              **kwargs)
+    else:
+        pf = ProxyFinder(config["url"], max_threads=max_threads, adaptive=adaptive, **kwargs)
+
+    lock = threading.Lock()
+    tokens = {}
+    held = collections.Counter()
+    refused = []
+
+    def leased_proxies():
+        while True:
+            # lease more only when the local queue runs low
+            while pf.proxy_queue.qsize() >= max_threads:
+                time.sleep(0.05)
+            try:
+                reply = client.call("POST", "/lease", {"worker": worker_id, "size": lease_size})
+            except requests.HTTPError as e:
+                refused.append(e)
+                return
+            except requests.RequestException:
+                return
+            if reply["lease"] is None:
+                if reply["done"]:
+                    return
+                # the last proxies are leased to others, theirs may expire
+                time.sleep(1)
+                continue
+            for token, protocol, ip, port in reply["proxies"]:
+                proxy = Proxy(protocol, ip, port)
+                with lock:
+                    tokens[id(proxy)] = (token, reply["lease"])
+                    held[reply["lease"]] += 1
+                yield proxy
+
+    pf.start_feeder(leased_proxies())
+    pf.start()
+    checked = 0
+    try:
+        # an empty batch every report_interval renews the leases held
+        for batch in pf.iter_batches(timeout=report_interval):
+            results = []
+            with lock:
+                for res in batch:
+                    token, lease_id = tokens.pop(id(res))
+                    held[lease_id] -= 1
+                    if held[lease_id] <= 0:
+                        del held[lease_id]
+                    results.append([token, {key: res[key] for key in RESULT_FIELDS
+                                            if key in res}])
+                leases = list(held)
+            client.call("POST", "/report", {"worker": worker_id, "leases": leases,
+                                            "results": results})
+            checked += len(results)
+            # the coordinator keeps the results, here they would grow forever
+            pf.proxy_found.clear()
+            pf.all_results.clear()
+    except requests.HTTPError:
+        pf.stop()
+        raise
+    except requests.RequestException:
+        # the coordinator is gone, its leases expire
+        pf.stop()
+    finally:
+        client.close()
+    if refused:
+        raise refused[0]
+    return checked
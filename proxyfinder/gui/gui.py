@@ -2,12 +2,11 @@
 """
 
 import sys
-import time
 
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QLineEdit, QGridLayout,
     QWidget, QPushButton, QProgressBar, QAction, QStatusBar, QLabel, QMenu,
-    QHBoxLayout, QSpinBox, QDoubleSpinBox, QMessageBox, QComboBox, QTreeWidget,
-    QTreeWidgetItem, QAbstractItemView, QCheckBox, QActionGroup)
+    QHBoxLayout, QSpinBox, QDoubleSpinBox, QMessageBox, QComboBox, QTreeView,
+    QAbstractItemView, QCheckBox, QActionGroup)
 from PyQt5.QtCore import (Qt, QThread, pyqtSignal, QRegExp, QSettings, QSize,
     QTranslator, QCoreApplication, QLocale, QLibraryInfo)
 from PyQt5.QtGui import QRegExpValidator, QIcon
@@ -16,7 +15,9 @@ from .. import __version__
 from .. import __author__
 from .. import __email__
 from .. import proxyfinder
+from ..progress import format_eta
 from . import utils
+from .resultmodel import ResultTableModel, ResultFilterModel
 
 
 settings = QSettings(utils.CONFIG_PATH, QSettings.IniFormat)
@@ -26,8 +27,10 @@ class Worker(QThread):
     """Main task
     """
     updateValueSignal = pyqtSignal(int)
+    updateRangeSignal = pyqtSignal(int)
     updateOutputSignal = pyqtSignal(list)
     updateTimeLeftSignal = pyqtSignal(str)
+    sourceDoneSignal = pyqtSignal(str, int, str)
     onFinishSignal = pyqtSignal()
 
     def __init__(self, url, max_proxies, max_threads, timeout):
@@ -43,18 +46,24 @@ class Worker(QThread):
     def run(self):
         """Thread's start point
         """
+        # scrape the plugins in the background, checking their proxies as
+        # soon as they arrive
+        self.pf.start_feeder(on_source=self.sourceDoneSignal.emit)
         self.pf.start()
-        while not self.pf.is_finished() or not self.pf.result_queue.empty():
+        # wakes up on new results, or every second to refresh the time left
+        for last_results in self.pf.iter_batches(timeout=1):
             if self._kill:
                 break
-            progress = len(self.pf.proxy_found) - self.pf.get_proxies_left()
+            progress = self.pf.get_progress()
 
-            self.updateOutputSignal.emit(self.pf.get_last_results())
-            self.updateTimeLeftSignal.emit(self.pf.get_estimated_time())
+            if last_results:
+                self.updateOutputSignal.emit(last_results)
+            self.updateRangeSignal.emit(len(self.pf.proxy_found))
+            self.updateTimeLeftSignal.emit(format_eta(progress.eta))
             # -1 to reach up to 99% while process is not finished
-            self.updateValueSignal.emit(progress - 1)
-            time.sleep(0.2)
+            self.updateValueSignal.emit(progress.done - 1)
         if not self._kill:
+            self.updateRangeSignal.emit(len(self.pf.proxy_found))
             self.updateValueSignal.emit(len(self.pf.proxy_found))
         self.onFinishSignal.emit()
         self.pf.stop()
@@ -143,22 +152,22 @@ class ProxyFinderGUI(QMainWindow):
         self.setStatusBar(self.status_bar)
 
     def treeContextMenu(self, position):
-        """Context menu for the tree widget output
+        """Context menu for the result view
         """
         # Actions
         select_all = QAction(self.tr("Select all"))
         select_all.triggered.connect(self.onSelectAll)
-        if self.tree_widget_out.topLevelItemCount() == 0:
+        if self.result_filter.rowCount() == 0:
             select_all.setDisabled(True)
 
         copy_all = QAction(self.tr("Copy all"))
         copy_all.triggered.connect(self.copyAllToClipboard)
-        if self.tree_widget_out.topLevelItemCount() == 0:
+        if self.result_filter.rowCount() == 0:
             copy_all.setDisabled(True)
 
         copy_selected = QAction(self.tr("Copy selected"))
         copy_selected.triggered.connect(self.copySelectionToClipboard)
-        if not self.tree_widget_out.selectedItems():
+        if not self.result_view.selectionModel().hasSelection():
             copy_selected.setDisabled(True)
 
         # Create menu
@@ -170,7 +179,7 @@ class ProxyFinderGUI(QMainWindow):
         context_menu.addAction(copy_all)
 
         # show menu at position
-        context_menu.exec_(self.tree_widget_out.viewport().mapToGlobal(position))
+        context_menu.exec_(self.result_view.viewport().mapToGlobal(position))
 
     def setupWidgets(self):
         """Set up widgets.
@@ -187,19 +196,29 @@ class ProxyFinderGUI(QMainWindow):
         self.url_input_cb.setEditText("")
         self.url_input_cb.setStatusTip(self.tr("Website to verify proxies"))
 
-        # Tree Widget output
-        self.tree_widget_out = QTreeWidget()
-        self.tree_widget_out.setHeaderLabels(["#", "IP", self.tr("Port"),
-            self.tr("Protocol"), self.tr("Error"), self.tr("State")])
-        self.tree_widget_out.setAlternatingRowColors(True)
-        self.tree_widget_out.setSelectionMode(QAbstractItemView.ExtendedSelection)
-        self.tree_widget_out.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.tree_widget_out.customContextMenuRequested.connect(self.treeContextMenu)
-
-        # Tree Widget icons
+        # Result icons
         self.fail_icon = QIcon(utils.image("fail.png"))
         self.succ_icon = QIcon(utils.image("success.png"))
 
+        # Result view output: the model keeps the results, the view only
+        # draws the visible rows
+        self.result_model = ResultTableModel(["#", "IP", self.tr("Port"),
+            self.tr("Protocol"), self.tr("Error"), self.tr("Latency"), self.tr("State")],
+            self.succ_icon, self.fail_icon, self)
+        self.result_filter = ResultFilterModel(self)
+        self.result_filter.setSourceModel(self.result_model)
+        self.result_view = QTreeView()
+        self.result_view.setModel(self.result_filter)
+        self.result_view.setRootIsDecorated(False)
+        self.result_view.setUniformRowHeights(True)
+        self.result_view.setSortingEnabled(True)
+        self.result_view.sortByColumn(0, Qt.AscendingOrder)
+        self.result_view.setAlternatingRowColors(True)
+        self.result_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.result_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.result_view.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.result_view.customContextMenuRequested.connect(self.treeContextMenu)
+
         # Max proxies, threads and connections timeout
         proxies_max_label = QLabel(self.tr("Max proxies"))
         self.proxies_max_sb = QSpinBox()
@@ -264,7 +283,7 @@ class ProxyFinderGUI(QMainWindow):
         grid.addWidget(self.start_button, 0, 2)
         grid.addLayout(max_h_box, 1, 1, Qt.AlignCenter)
         grid.addWidget(self.stop_button, 1, 2)
-        grid.addWidget(self.tree_widget_out, 2, 0, 4, 2)
+        grid.addWidget(self.result_view, 2, 0, 4, 2)
         grid.addWidget(copy_all_button, 2, 2)
         grid.addWidget(copy_sel_button, 3, 2)
         grid.addWidget(self.only_working_cb, 4, 2)
@@ -302,13 +321,16 @@ class ProxyFinderGUI(QMainWindow):
                              max_threads=self.threads_max_sb.value(),
                              timeout=self.timeout_max_sb.value())
         self.worker.updateValueSignal.connect(self.updateProgressBar)
+        self.worker.updateRangeSignal.connect(self.updateProgressRange)
+        self.worker.sourceDoneSignal.connect(self.onSourceDone)
         self.worker.updateOutputSignal.connect(self.updateOutputTree)
         self.worker.updateTimeLeftSignal.connect(self.updateTimeLeft)
         self.worker.onFinishSignal.connect(self.onFinishedProcess)
 
         # Initialize values
-        self.tree_widget_out.clear()
-        self.progress_bar.setRange(0, len(self.worker.pf.get_proxies()))
+        self.result_model.clear()
+        # busy until the first proxies are scraped
+        self.progress_bar.setRange(0, 0)
         self.progress_bar.setValue(0)
         self.stop_button.setDisabled(False)
         self.start_button.setDisabled(True)
@@ -335,26 +357,35 @@ class ProxyFinderGUI(QMainWindow):
         """
         self.progress_bar.setValue(value)
 
+    def updateProgressRange(self, proxies):
+        """Grow the progress bar range with the proxies scraped so far
+
+        Args:
+            proxies (int): Proxies scraped
+        """
+        if proxies > self.progress_bar.maximum():
+            self.progress_bar.setMaximum(proxies)
+
+    def onSourceDone(self, name, found, error):
+        """Show in the status bar that a proxy source is over
+
+        Args:
+            name (str): Plugin name
+            found (int): New proxies it gave
+            error (str): Reason it failed, empty if it did not
+        """
+        if error:
+            self.status_bar.showMessage(self.tr("{0} failed: {1}").format(name, error))
+        else:
+            self.status_bar.showMessage(self.tr("{0}: {1} new proxies").format(name, found))
+
     def updateOutputTree(self, last_results):
-        """Update TreeWidget output
+        """Update the result view output
 
         Args:
-            last_results (list): List of dictionary results.
-                                 Keys: ip, port, protocol, error
+            last_results (list): List of checked Proxy.
         """
-        row = self.tree_widget_out.topLevelItemCount()
-        for i, res in enumerate(last_results, 1):
-            item = QTreeWidgetItem()
-            item.setText(0, str(row + i))
-            item.setText(1, res["ip"])
-            item.setText(2, str(res["port"]))
-            item.setText(3, res["protocol"])
-            item.setText(4, res["error"])
-            # item.setText(5, "Fallito" if res["error"] else "Ok")
-            item.setIcon(5, self.fail_icon if res["error"] else self.succ_icon)
-            self.tree_widget_out.addTopLevelItem(item)
-            if self.only_working_cb.isChecked() and res["error"]:
-                item.setHidden(True)
+        self.result_model.append(last_results)
 
     def updateTimeLeft(self, time_left):
         """Update time left
@@ -371,28 +402,26 @@ class ProxyFinderGUI(QMainWindow):
         # Restor button status
         self.start_button.setDisabled(False)
         self.stop_button.setDisabled(True)
+        if self.progress_bar.maximum() == 0:
+            # nothing was scraped, leave the busy state
+            self.progress_bar.setRange(0, 1)
 
         # Copy all found proxies to clipboard
+        self.result_model.flush()
         self.copyAllToClipboard()
 
     def onOnlyWorking(self, checked):
-        """Show only working proxies in tree widget output
+        """Show only working proxies in the result view output
 
         Args:
             checked (bool): checkbox state
         """
-        rows = self.tree_widget_out.topLevelItemCount()
-        for row in range(rows):
-            item = self.tree_widget_out.topLevelItem(row)
-            if checked and item.text(4):
-                item.setHidden(True)
-            else:
-                item.setHidden(False)
+        self.result_filter.setOnlyWorking(bool(checked))
 
     def onSelectAll(self):
-        """Select all visible rows in tree widget output
+        """Select all visible rows in the result view output
         """
-        self.tree_widget_out.selectAll()
+        self.result_view.selectAll()
 
     def onChangeLanguage(self, locale):
         """Change localeuage
@@ -406,37 +435,20 @@ class ProxyFinderGUI(QMainWindow):
                     "for this change to take effect."))
 
     def copySelectionToClipboard(self):
-        """Copy selected rows in tree widget to the clipboard
+        """Copy selected rows in the result view to the clipboard
         """
-        item_list = []
-        selection = self.tree_widget_out.selectedItems()
-        cols = self.tree_widget_out.columnCount()
-        for row in selection:
-            data = [row.text(c) for c in range(cols)]
-            text_line = "{3}://{1}:{2}".format(*data)
-            item_list.append(text_line)
-
-        text = "\n".join(item_list)
+        rows = sorted(index.row() for index in
+                      self.result_view.selectionModel().selectedRows())
+        text = "\n".join(res.url for res in self.result_filter.proxies(rows))
         if text:
             QApplication.clipboard().setText(text)
             self.status_bar.showMessage(self.tr("The selected proxies have been "
                 "copied to the clipboard."))
 
     def copyAllToClipboard(self):
-        """Copy all rows in tree widget to the clipboard
+        """Copy all visible rows in the result view to the clipboard
         """
-        item_list = []
-        rows = self.tree_widget_out.topLevelItemCount()
-        cols = self.tree_widget_out.columnCount()
-        for row in range(rows):
-            item = self.tree_widget_out.topLevelItem(row)
-            if item.isHidden():
-                continue
-            data = [item.text(c) for c in range(cols)]
-            text_line = "{3}://{1}:{2}".format(*data)
-            item_list.append(text_line)
-
-        text = "\n".join(item_list)
+        text = "\n".join(res.url for res in self.result_filter.proxies())
         if text:
             QApplication.clipboard().setText(text)
             self.status_bar.showMessage(self.tr("All proxies have been copied "
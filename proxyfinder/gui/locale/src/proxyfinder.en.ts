@@ -3,175 +3,190 @@
 <context>
     <name>ProxyFinderGUI</name>
     <message>
-        <location filename="../../gui.py" line="107"/>
+        <location filename="../../gui.py" line="116"/>
         <source>Exit</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="112"/>
+        <location filename="../../gui.py" line="121"/>
         <source>Restore default settings</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="448"/>
+        <location filename="../../gui.py" line="460"/>
         <source>About ProxyFinder</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="130"/>
+        <location filename="../../gui.py" line="139"/>
         <source>File</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="133"/>
+        <location filename="../../gui.py" line="142"/>
         <source>Settings</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="134"/>
+        <location filename="../../gui.py" line="143"/>
         <source>Language</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="138"/>
+        <location filename="../../gui.py" line="147"/>
         <source>Help</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="149"/>
+        <location filename="../../gui.py" line="158"/>
         <source>Select all</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="243"/>
+        <location filename="../../gui.py" line="262"/>
         <source>Copy all</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="246"/>
+        <location filename="../../gui.py" line="265"/>
         <source>Copy selected</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="188"/>
+        <location filename="../../gui.py" line="197"/>
         <source>Website to verify proxies</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="192"/>
+        <location filename="../../gui.py" line="205"/>
         <source>Port</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="192"/>
+        <location filename="../../gui.py" line="205"/>
         <source>Protocol</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="192"/>
+        <location filename="../../gui.py" line="205"/>
         <source>Error</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="192"/>
+        <location filename="../../gui.py" line="205"/>
+        <source>Latency</source>
+        <translation type="unfinished"></translation>
+    </message>
+    <message>
+        <location filename="../../gui.py" line="205"/>
         <source>State</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="204"/>
+        <location filename="../../gui.py" line="223"/>
         <source>Max proxies</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="208"/>
+        <location filename="../../gui.py" line="227"/>
         <source>Maximum number of proxies to scan. [0 = No limit]</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="211"/>
+        <location filename="../../gui.py" line="230"/>
         <source>Max threads</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="214"/>
+        <location filename="../../gui.py" line="233"/>
         <source>Maximum number of connections at the same time. [Recommended = 20]</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="217"/>
+        <location filename="../../gui.py" line="236"/>
         <source>Connection timeout</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="222"/>
+        <location filename="../../gui.py" line="241"/>
         <source>Maximum time to wait to establish a connection. [Recommended = 3.05]</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="236"/>
+        <location filename="../../gui.py" line="255"/>
         <source>Start</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="239"/>
+        <location filename="../../gui.py" line="258"/>
         <source>Cancel</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="250"/>
+        <location filename="../../gui.py" line="269"/>
         <source>Show only
 working proxies</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="294"/>
+        <location filename="../../gui.py" line="313"/>
         <source>Enter a valid URL</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="294"/>
+        <location filename="../../gui.py" line="313"/>
         <source>A valid URL must be entered to start the scan.</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="322"/>
+        <location filename="../../gui.py" line="344"/>
         <source>Stop the scan</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="322"/>
+        <location filename="../../gui.py" line="344"/>
         <source>Are you sure you want to stop the scan?</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="422"/>
+        <location filename="../../gui.py" line="445"/>
         <source>The selected proxies have been copied to the clipboard.</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="442"/>
+        <location filename="../../gui.py" line="454"/>
         <source>All proxies have been copied to the clipboard.</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="495"/>
+        <location filename="../../gui.py" line="507"/>
         <source>Quit application</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="495"/>
+        <location filename="../../gui.py" line="507"/>
         <source>Are you sure you want to Quit?</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="404"/>
+        <location filename="../../gui.py" line="433"/>
         <source>Relaunch required</source>
         <translation type="unfinished"></translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="404"/>
+        <location filename="../../gui.py" line="433"/>
         <source>You have to quit and relaunch ProxyFinder for this change to take effect.</source>
         <translation type="unfinished"></translation>
     </message>
+    <message>
+        <location filename="../../gui.py" line="378"/>
+        <source>{0} failed: {1}</source>
+        <translation type="unfinished"></translation>
+    </message>
+    <message>
+        <location filename="../../gui.py" line="380"/>
+        <source>{0}: {1} new proxies</source>
+        <translation type="unfinished"></translation>
+    </message>
 </context>
 </TS>
@@ -4,176 +4,191 @@
 <context>
     <name>ProxyFinderGUI</name>
     <message>
-        <location filename="../../gui.py" line="107"/>
+        <location filename="../../gui.py" line="116"/>
         <source>Exit</source>
         <translation>Esci</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="112"/>
+        <location filename="../../gui.py" line="121"/>
         <source>Restore default settings</source>
         <translation>Ripristina impostazioni di default</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="448"/>
+        <location filename="../../gui.py" line="460"/>
         <source>About ProxyFinder</source>
         <translation>A proposito di ProxyFinder</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="133"/>
+        <location filename="../../gui.py" line="142"/>
         <source>Settings</source>
         <translation>Impostazioni</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="138"/>
+        <location filename="../../gui.py" line="147"/>
         <source>Help</source>
         <translation>Aiuto</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="149"/>
+        <location filename="../../gui.py" line="158"/>
         <source>Select all</source>
         <translation>Seleziona tutto</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="243"/>
+        <location filename="../../gui.py" line="262"/>
         <source>Copy all</source>
         <translation>Copia tutto</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="246"/>
+        <location filename="../../gui.py" line="265"/>
         <source>Copy selected</source>
         <translation>Copia selezionati</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="188"/>
+        <location filename="../../gui.py" line="197"/>
         <source>Website to verify proxies</source>
         <translation>Sito web per verificare i proxy</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="192"/>
+        <location filename="../../gui.py" line="205"/>
         <source>Port</source>
         <translation>Porta</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="192"/>
+        <location filename="../../gui.py" line="205"/>
         <source>Protocol</source>
         <translation>Protocollo</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="192"/>
+        <location filename="../../gui.py" line="205"/>
         <source>Error</source>
         <translation>Errore</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="192"/>
+        <location filename="../../gui.py" line="205"/>
+        <source>Latency</source>
+        <translation>Latenza</translation>
+    </message>
+    <message>
+        <location filename="../../gui.py" line="205"/>
         <source>State</source>
         <translation>Stato</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="204"/>
+        <location filename="../../gui.py" line="223"/>
         <source>Max proxies</source>
         <translation>Max proxy</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="208"/>
+        <location filename="../../gui.py" line="227"/>
         <source>Maximum number of proxies to scan. [0 = No limit]</source>
         <translation>Numero massimo di proxy da scansionare. [0 = Nessun limite]</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="211"/>
+        <location filename="../../gui.py" line="230"/>
         <source>Max threads</source>
         <translation>Max threads</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="214"/>
+        <location filename="../../gui.py" line="233"/>
         <source>Maximum number of connections at the same time. [Recommended = 20]</source>
         <translation>Numero massimo di connessioni allo stesso tempo. [Raccomandato = 20]</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="217"/>
+        <location filename="../../gui.py" line="236"/>
         <source>Connection timeout</source>
         <translation>Timeout connessione</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="222"/>
+        <location filename="../../gui.py" line="241"/>
         <source>Maximum time to wait to establish a connection. [Recommended = 3.05]</source>
         <translation>Numero massimo di attesa per stabilire la connessione. [Raccomandato = 20]</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="236"/>
+        <location filename="../../gui.py" line="255"/>
         <source>Start</source>
         <translation>Avvia</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="239"/>
+        <location filename="../../gui.py" line="258"/>
         <source>Cancel</source>
         <translation>Annulla</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="250"/>
+        <location filename="../../gui.py" line="269"/>
         <source>Show only
 working proxies</source>
         <translation>Mostra solo
 proxy funzionanti</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="294"/>
+        <location filename="../../gui.py" line="313"/>
         <source>Enter a valid URL</source>
         <translation>Inserisci un URL valido</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="294"/>
+        <location filename="../../gui.py" line="313"/>
         <source>A valid URL must be entered to start the scan.</source>
         <translation>Devi inserire un URL valido per avviare la scansione.</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="322"/>
+        <location filename="../../gui.py" line="344"/>
         <source>Stop the scan</source>
         <translation>Ferma la scansione</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="322"/>
+        <location filename="../../gui.py" line="344"/>
         <source>Are you sure you want to stop the scan?</source>
         <translation>Sei sicuro di voler fermare la scansione?</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="422"/>
+        <location filename="../../gui.py" line="445"/>
         <source>The selected proxies have been copied to the clipboard.</source>
         <translation>I proxy selezionati sono stati copiati negli appunti.</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="442"/>
+        <location filename="../../gui.py" line="454"/>
         <source>All proxies have been copied to the clipboard.</source>
         <translation>Tutti i proxy sono stati copiati negli appunti.</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="495"/>
+        <location filename="../../gui.py" line="507"/>
         <source>Quit application</source>
         <translation>Esci dall&apos;applicazione</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="495"/>
+        <location filename="../../gui.py" line="507"/>
         <source>Are you sure you want to Quit?</source>
         <translation>Sei sicuro di voler uscire dall&apos;applicazione?</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="130"/>
+        <location filename="../../gui.py" line="139"/>
         <source>File</source>
         <translation>File</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="134"/>
+        <location filename="../../gui.py" line="143"/>
         <source>Language</source>
         <translation>Lingua</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="404"/>
+        <location filename="../../gui.py" line="433"/>
         <source>Relaunch required</source>
         <translation>Riavvio richiesto</translation>
     </message>
     <message>
-        <location filename="../../gui.py" line="404"/>
+        <location filename="../../gui.py" line="433"/>
         <source>You have to quit and relaunch ProxyFinder for this change to take effect.</source>
         <translation>Devi riavviare ProxyFinder per effettuare questo cambiamento.</translation>
     </message>
+    <message>
+        <location filename="../../gui.py" line="378"/>
+        <source>{0} failed: {1}</source>
+        <translation>{0} non riuscito: {1}</translation>
+    </message>
+    <message>
+        <location filename="../../gui.py" line="380"/>
+        <source>{0}: {1} new proxies</source>
+        <translation>{0}: {1} nuovi proxy</translation>
+    </message>
 </context>
 </TS>
@@ -0,0 +1,185 @@
+"""Result table model of the GUI.
+
+The checked proxies are kept once, as Proxy records, in ResultTableModel;
+the view asks only for the cells on screen. Results are appended in
+batches: one beginInsertRows() per flush, at most every FLUSH_INTERVAL ms.
+ResultFilterModel sorts by ResultTableModel.sort_key() and hides the failed
+proxies when asked, reading the records, not the cell text.
+"""
+
+from PyQt5.QtCore import (Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel,
+    QTimer)
+
+SORT_ROLE = Qt.UserRole
+FLUSH_INTERVAL = 100
+
+(COL_NUMBER, COL_IP, COL_PORT, COL_PROTOCOL, COL_ERROR, COL_LATENCY,
+ COL_STATE) = range(7)
+
+
+class ResultTableModel(QAbstractTableModel):
+    """Checked proxies, one row each
+
+    Args:
+        headers (list): Column titles
+        ok_icon (QIcon): State icon of working proxies
+        fail_icon (QIcon): State icon of failed proxies
+    """
+
+    def __init__(self, headers, ok_icon, fail_icon, parent=None):
+        super().__init__(parent)
+        self.headers = headers
+        self.ok_icon = ok_icon
+        self.fail_icon = fail_icon
+        self._results = []
+        self._pending = []
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FLUSH_INTERVAL)
+        self._timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()):  # pylint: disable=invalid-name
+        return 0 if parent.isValid() else len(self._results)
+
+    def columnCount(self, parent=QModelIndex()):  # pylint: disable=invalid-name
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):  # pylint: disable=invalid-name
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        res = self._results[row]
+        if role == Qt.DisplayRole:
+            if column == COL_NUMBER:
+                return str(row + 1)
+            if column == COL_IP:
+                return res.ip
+            if column == COL_PORT:
+                return str(res.port)
+            if column == COL_PROTOCOL:
+                return res.protocol
+            if column == COL_ERROR:
+                return res.error
+            if column == COL_LATENCY and not res.error and res.get("latency") is not None:
+                return f"{res.latency * 1000:.0f} ms"
+        elif role == Qt.DecorationRole and column == COL_STATE:
+            return self.fail_icon if res.error else self.ok_icon
+        elif role == SORT_ROLE:
+            return self.sort_key(row, column)
+        return None
+
+    def sort_key(self, row, column):
+        """Retrive the value a cell sorts by
+
+        Args:
+            row (int): Row number
+            column (int): Column number
+
+        Returns:
+            int|float|str: Sort key
+        """
+        res = self._results[row]
+        if column == COL_NUMBER:
+            return row
+        if column == COL_IP:
+            return res.ip
+        if column == COL_PORT:
+            return int(res.port)
+        if column == COL_PROTOCOL:
+            return res.protocol
+        if column == COL_ERROR:
+            return res.error
+        # failed proxies sort after the working ones
+        latency = res.get("latency")
+        return float("inf") if latency is None or res.error else latency
+
+    def proxy(self, row):
+        """Retrive the result of a row
+
+        Args:
+            row (int): Row number
+
+        Returns:
+            Proxy: Checked proxy
+        """
+        return self._results[row]
+
+    def append(self, results):
+        """Queue results, they are added to the table at the next flush
+
+        Args:
+            results (list): Checked proxies
+        """
+        self._pending.extend(results)
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def flush(self):
+        """Add the queued results to the table
+        """
+        self._timer.stop()
+        if not self._pending:
+            return
+        first = len(self._results)
+        self.beginInsertRows(QModelIndex(), first, first + len(self._pending) - 1)
+        self._results.extend(self._pending)
+        self._pending = []
+        self.endInsertRows()
+
+    def clear(self):
+        """Remove all the results
+        """
+        self._timer.stop()
+        self.beginResetModel()
+        self._results = []
+        self._pending = []
+        self.endResetModel()
+
+
+class ResultFilterModel(QSortFilterProxyModel):
+    """Sorted view of a ResultTableModel, optionally of the working proxies only
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.only_working = False
+        self.setSortRole(SORT_ROLE)
+
+    def setOnlyWorking(self, only_working):  # pylint: disable=invalid-name
+        """Show only working proxies, or all of them
+
+        Args:
+            only_working (bool): Hide the failed proxies
+        """
+        self.only_working = only_working
+        self.invalidateFilter()
+
+    def lessThan(self, left, right):  # pylint: disable=invalid-name
+        # straight from the records, cheaper than two data() calls
+        source = self.sourceModel()
+        column = left.column()
+        return source.sort_key(left.row(), column) < source.sort_key(right.row(), column)
+
+    def filterAcceptsRow(self, source_row, source_parent):  # pylint: disable=invalid-name
+        if not self.only_working:
+            return True
+        return not self.sourceModel().proxy(source_row).error
+
+    def proxies(self, rows=None):
+        """Retrive the results shown, in view order
+
+        Args:
+            rows (iterable, optional): Rows of this model. Defaults to all of them.
+
+        Returns:
+            list: Checked proxies
+        """
+        if rows is None:
+            rows = range(self.rowCount())
+        source = self.sourceModel()
+        return [source.proxy(self.mapToSource(self.index(row, 0)).row()) for row in rows]
@@ -0,0 +1,82 @@
+"""Persistent proxy health cache.
+
+Stores the last check outcome of every proxy against a target host, so
+repeated runs can return fresh successes immediately and skip proxies that
+failed recently.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "proxyfinder", "health.db")
+
+OK_TTL = 600
+FAIL_TTL = 3600
+PRUNE_AGE = 7 * 24 * 3600
+
+
+class HealthStore:
+    """SQLite store keyed by protocol, ip, port and target host
+    """
+
+    def __init__(self, path=DEFAULT_PATH, ok_ttl=OK_TTL, fail_ttl=FAIL_TTL):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.ok_ttl = ok_ttl
+        self.fail_ttl = fail_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS health ("
+                "protocol TEXT, ip TEXT, port INTEGER, host TEXT, "
+                "error TEXT, latency REAL, checked REAL, "
+                "PRIMARY KEY (protocol, ip, port, host))")
+            self._conn.execute("DELETE FROM health WHERE checked < ?",
+                               (time.time() - PRUNE_AGE,))
+
+    def close(self):
+        """Close the database
+        """
+        with self._lock:
+            self._conn.close()
+
+    def record(self, results, host, now=None):
+        """Save check results
+
+        Args:
+            results (list): Checked proxies. Keys: ip, port, protocol, error and
+                            optionally latency.
+            host (str): Target host the proxies were checked against
+            now (float, optional): Check timestamp. Defaults to time.time().
+        """
+        now = time.time() if now is None else now
+        rows = [(res["protocol"], res["ip"], res["port"], host, res["error"],
+                 res.get("latency"), now) for res in results]
+        if not rows:
+            return
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO health VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def fresh(self, host, now=None):
+        """Retrive results still within their TTL
+
+        Args:
+            host (str): Target host
+            now (float, optional): Current timestamp. Defaults to time.time().
+
+        Returns:
+            dict: (protocol, ip, port) -> (error, latency, checked)
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT protocol, ip, port, error, latency, checked FROM health "
+                "WHERE host = ? AND ((error = '' AND checked >= ?) "
+                "OR (error != '' AND checked >= ?))",
+                (host, now - self.ok_ttl, now - self.fail_ttl)).fetchall()
+        return {(p, ip, port): (error, latency, checked)
+                for p, ip, port, error, latency, checked in rows}
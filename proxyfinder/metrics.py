@@ -0,0 +1,503 @@
+"""Metrics of a check run.
+
+A Registry holds counters, gauges and histograms, optionally with labels.
+Recording is a dictionary update under a per metric lock, cheap enough to
+stay on; gauges read their value from a function when they are collected,
+so queue depths and checks in flight cost nothing until asked.
+
+Every finder has a FinderMetrics (finder.metrics) filling its registry:
+
+    proxyfinder_checks_total{protocol,result}          checks by error class
+    proxyfinder_check_duration_seconds{protocol}       whole check, any result
+    proxyfinder_check_phase_seconds{phase,protocol}    connect, ttfb and total
+                                                       time of working proxies
+    proxyfinder_cached_results_total{result}           health cache answers
+    proxyfinder_queue_depth{queue}                     proxy and result queues
+    proxyfinder_checks_in_flight                       checks running
+    proxyfinder_concurrency_limit                      max checks in flight
+    proxyfinder_source_proxies_total{source}           new proxies by plugin
+    proxyfinder_source_failures_total{source}          failed plugin scrapes
+    proxyfinder_source_duration_seconds{source}        last scrape time
+
+The registry is exposed in the Prometheus text format by MetricsServer
+(GET /metrics, and GET /metrics.json for the JSON snapshot) and written as
+JSON lines by JsonReporter.
+"""
+
+import bisect
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .concurrency import LOCAL_ERROR
+from .timeouts import DEADLINE_ERROR
+
+DEFAULT_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Proxy timing fields and their phase label
+PHASES = (("connect_time", "connect"), ("ttfb", "ttfb"), ("total_time", "total"))
+
+# check errors by class, used as label values
+ERROR_CLASSES = {
+    "": "ok",
+    "Request timed out while trying to connect": "connect_timeout",
+    "Server did not send any data": "read_timeout",
+    DEADLINE_ERROR: "deadline",
+    "Connection error": "connection_error",
+    LOCAL_ERROR: "local_error",
+    "Too many redirects": "too_many_redirects",
+    "Invalid URL": "invalid_url",
+    "HTTP error occurred": "http_error",
+    "Generic error": "generic_error",
+}
+_STATUS_ERROR = re.compile(r"Error (\d{3})\b")
+
+
+def error_class(error):
+    """Map a check error to a short class name, bounded for use as a label
+
+    Args:
+        error (str): Check error, empty if the proxy works
+
+    Returns:
+        str: Error class, e.g. ok, connect_timeout, http_403, other
+    """
+    name = ERROR_CLASSES.get(error)
+    if name is not None:
+        return name
+    match = _STATUS_ERROR.match(error)
+    if match:
+        return f"http_{match.group(1)}"
+    return "other"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+               for _, value in pairs)
+    return "{" + ",".join(f"{name}=\"{value}\""
+                          for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metric:
+    """Base of the metric types: a name, a help text and label names
+    """
+
+    type = "untyped"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def samples(self):
+        """Retrive the current values
+
+        Returns:
+            dict: Label values tuple -> value
+        """
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        """Prometheus text format lines of the metric
+
+        Returns:
+            list: Lines
+        """
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} "
+                         f"{_format_value(value)}")
+        return lines
+
+    def snapshot(self):
+        """JSON serializable values of the metric
+
+        Returns:
+            dict: Type and samples
+        """
+        return {"type": self.type,
+                "samples": [{"labels": dict(zip(self.labels, labels)), "value": value}
+                            for labels, value in sorted(self.samples().items())]}
+
+
+class Counter(Metric):
+    """Monotonic count
+    """
+
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        """Add to the count
+
+        Args:
+            *labels: Label values, in the order of the label names
+            amount (int, optional): Increment. Defaults to 1.
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that goes up and down, set directly or read from a function
+    when collected
+
+    Args:
+        function (callable, optional): Returns the value, or a dict of label
+            values tuple -> value for a labelled gauge. Defaults to None.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labels=(), function=None):
+        super().__init__(name, documentation, labels)
+        self.function = function
+
+    def set(self, value, *labels):
+        """Set the value
+
+        Args:
+            value (float): New value
+            *labels: Label values, in the order of the label names
+        """
+        with self._lock:
+            self._values[labels] = value
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        value = self.function()
+        return value if isinstance(value, dict) else {(): value}
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets
+
+    Args:
+        buckets (tuple, optional): Bucket upper bounds, sorted. Defaults to DEFAULT_BUCKETS.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets) + (math.inf,)
+
+    def observe(self, value, *labels):
+        """Count a value
+
+        Args:
+            value (float): Observed value
+            *labels: Label values, in the order of the label names
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        """Retrive the current distributions
+
+        Returns:
+            dict: Label values tuple -> (cumulative bucket counts, sum, count)
+        """
+        with self._lock:
+            values = {labels: (list(counts), total, count)
+                      for labels, (counts, total, count) in self._values.items()}
+        for counts, _, _ in values.values():
+            for i in range(1, len(counts)):
+                counts[i] += counts[i - 1]
+        return values
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for labels, (counts, total, count) in sorted(self.samples().items()):
+            for bound, bucket in zip(self.buckets, counts):
+                le = (("le", _format_value(bound)),)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} "
+                             f"{bucket}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} "
+                         f"{_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {count}")
+        return lines
+
+    def snapshot(self):
+        bounds = [_format_value(bound) for bound in self.buckets]
+        return {"type": self.type,
+                "samples": [{"labels": dict(zip(self.labels, labels)),
+                             "buckets": dict(zip(bounds, counts)), "sum": total, "count": count}
+                            for labels, (counts, total, count) in sorted(self.samples().items())]}
+
+
+class Registry:
+    """Set of named metrics
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        """Register a Counter
+
+        Returns:
+            Counter: New counter
+        """
+        return self._add(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=(), function=None):
+        """Register a Gauge
+
+        Returns:
+            Gauge: New gauge
+        """
+        return self._add(Gauge(name, documentation, labels, function))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        """Register a Histogram
+
+        Returns:
+            Histogram: New histogram
+        """
+        return self._add(Histogram(name, documentation, labels, buckets))
+
+    def get(self, name):
+        """Retrive a metric by name
+
+        Returns:
+            Metric: The metric, None if unknown
+        """
+        return self._metrics.get(name)
+
+    def render(self):
+        """Render all the metrics in the Prometheus text format
+
+        Returns:
+            str: Exposition text
+        """
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Snapshot of all the metrics, JSON serializable
+
+        Returns:
+            dict: time (seconds since the epoch) and metrics by name
+        """
+        return {"time": time.time(),
+                "metrics": {metric.name: metric.snapshot()
+                            for metric in list(self._metrics.values())}}
+
+
+class FinderMetrics:
+    """Standard metrics of a finder, see the module documentation
+
+    Args:
+        finder (ProxyFinder): Finder whose queues and tracker are read by the gauges
+        registry (Registry, optional): Registry to fill. Defaults to a new one.
+    """
+
+    def __init__(self, finder, registry=None):
+        self.registry = Registry() if registry is None else registry
+        reg = self.registry
+        self.checks = reg.counter(
+            "proxyfinder_checks_total", "Checks by protocol and result class.",
+            ("protocol", "result"))
+        self.duration = reg.histogram(
+            "proxyfinder_check_duration_seconds", "Duration of the checks, any result.",
+            ("protocol",))
+        self.phases = reg.histogram(
+            "proxyfinder_check_phase_seconds",
+            "Time to connect, to the first byte and in total of the working proxies.",
+            ("phase", "protocol"))
+        self.cached = reg.counter(
+            "proxyfinder_cached_results_total", "Results answered by the health cache.",
+            ("result",))
+        reg.gauge("proxyfinder_queue_depth", "Items waiting in the finder queues.", ("queue",),
+                  lambda: {("proxy",): finder.proxy_queue.qsize(),
+                           ("result",): finder.result_queue.qsize()})
+        reg.gauge("proxyfinder_checks_in_flight", "Checks running.",
+                  function=lambda: max(0, finder.tracker.in_flight))
+        reg.gauge("proxyfinder_concurrency_limit", "Max checks in flight.",
+                  function=finder.get_concurrency)
+        self.source_proxies = reg.counter(
+            "proxyfinder_source_proxies_total", "New proxies given by the plugins.",
+            ("source",))
+        self.source_failures = reg.counter(
+            "proxyfinder_source_failures_total", "Failed or timed out plugin scrapes.",
+            ("source",))
+        self.source_duration = reg.gauge(
+            "proxyfinder_source_duration_seconds", "Duration of the last plugin scrape.",
+            ("source",))
+
+    def observe(self, res, duration=None):
+        """Record a finished check
+
+        Args:
+            res (Proxy): Checked proxy
+            duration (float, optional): Seconds the check took. Defaults to None.
+        """
+        protocol = res["protocol"]
+        error = res["error"]
+        self.checks.inc(protocol, error_class(error))
+        if duration is not None:
+            self.duration.observe(duration, protocol)
+        if not error:
+            for field, phase in PHASES:
+                value = res.get(field)
+                if value is not None:
+                    self.phases.observe(value, phase, protocol)
+
+    def skipped(self, error):
+        """Record a result answered by the health cache
+
+        Args:
+            error (str): Cached error, empty if the proxy works
+        """
+        self.cached.inc(error_class(error))
+
+    def source_done(self, name, found, error, seconds):
+        """Record the end of a plugin scrape
+
+        Args:
+            name (str): Plugin name
+            found (int): New proxies it gave
+            error (str): Reason it failed, empty if it did not
+            seconds (float): Scrape duration
+        """
+        self.source_proxies.inc(name, amount=found)
+        if error:
+            self.source_failures.inc(name)
+        self.source_duration.set(seconds, name)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """HTTP front of a Registry, which is self.server.registry
+    """
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        if self.path == "/metrics":
+            body = self.server.registry.render().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path == "/metrics.json":
+            body = json.dumps(self.server.registry.snapshot()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer:
+    """Serve a registry over HTTP: GET /metrics (Prometheus text format)
+    and GET /metrics.json
+
+    Args:
+        registry (Registry): Metrics to serve
+        host (str, optional): Address to listen on. Defaults to 127.0.0.1.
+        port (int, optional): Port to listen on, 0 for any free one. Defaults to 9464.
+    """
+
+    def __init__(self, registry, host="127.0.0.1", port=9464):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+
+    @property
+    def address(self):
+        """str: URL of the metrics endpoint, known once started"""
+        if self._server is None:
+            return None
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        """Start serving in a separate thread
+        """
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.registry = self.registry
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """Stop serving
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class JsonReporter(threading.Thread):
+    """Separate thread writing a registry snapshot as one JSON line every
+    interval, and a last one when stopped
+
+    Args:
+        registry (Registry): Metrics to write
+        output (TextIO): File-like object to write
+        interval (float, optional): Seconds between snapshots. Defaults to 10.
+    """
+
+    def __init__(self, registry, output, interval=10.0):
+        super().__init__()
+
+        self.registry = registry
+        self.output = output
+        self.interval = interval
+        self._kill = threading.Event()
+        self.daemon = True
+
+    def stop(self):
+        """Stop writing, after a last snapshot
+        """
+        self._kill.set()
+        self.join()
+
+    def write(self):
+        """Write a snapshot now
+        """
+        self.output.write(json.dumps(self.registry.snapshot()) + "\n")
+        self.output.flush()
+
+    def run(self):
+        """Thread start point
+        """
+        while not self._kill.wait(self.interval):
+            self.write()
+        self.write()
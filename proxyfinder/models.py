@@ -0,0 +1,157 @@
+"""Proxy record type.
+
+Proxies move through plugins, checkers and front ends as Proxy objects: a
+__slots__ record far smaller than a dict, with the proxy URL formatted once.
+It still supports proxy["ip"] style access (and **proxy) for code written
+against the old dictionaries.
+
+The "https" protocol is the "Https: yes" of the proxy lists: an HTTP proxy
+that can tunnel to https sites. Both engines speak to it in clear text,
+like to any HTTP proxy, see transport_url().
+"""
+
+
+class Proxy:
+    """A proxy and, once checked, its check result.
+
+    Result fields (error, latency, cached...) are unset until a check fills
+    them, so proxy["error"] raises KeyError on an unchecked proxy, as it did
+    with dictionaries.
+
+    Successful checks also set, in seconds from the start of the check:
+    connect_time (connection through the proxy, SOCKS handshake or CONNECT
+    tunnel included), ttfb (response head of the last hop) and total_time
+    (whole check), the same way in both engines. latency is the one used
+    for ranking, equal to total_time.
+
+    Traced checks also set trace, see the tracing module.
+    """
+
+    __slots__ = ("protocol", "ip", "port", "source", "error", "latency", "connect_time",
+                 "ttfb", "total_time", "cached", "trace", "_url")
+
+    FIELDS = ("protocol", "ip", "port", "source", "error", "latency", "connect_time",
+              "ttfb", "total_time", "cached", "trace")
+
+    def __init__(self, protocol, ip, port, source=None, **result):
+        self.protocol = protocol
+        self.ip = ip
+        self.port = port
+        if source is not None:
+            self.source = source
+        for key, value in result.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, proxy):
+        """Build a Proxy from a proxy info dictionary, Proxy objects are
+        returned as they are
+
+        Args:
+            proxy (dict): Proxy info. Keys: ip, port, protocol.
+
+        Returns:
+            Proxy: Proxy record
+        """
+        if isinstance(proxy, cls):
+            return proxy
+        return cls(**proxy)
+
+    @property
+    def url(self):
+        """str: Proxy URL, as protocol://ip:port"""
+        try:
+            return self._url
+        except AttributeError:
+            self._url = f"{self.protocol}://{self.ip}:{self.port}"
+            return self._url
+
+    def __str__(self):
+        return self.url
+
+    def __repr__(self):
+        fields = ", ".join(f"{key}={self[key]!r}" for key in self.keys())
+        return f"Proxy({fields})"
+
+    def __eq__(self, other):
+        if isinstance(other, Proxy):
+            return self.as_dict() == other.as_dict()
+        if isinstance(other, dict):
+            return self.as_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    # dict compatible view
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+        if key in ("protocol", "ip", "port"):
+            try:
+                del self._url
+            except AttributeError:
+                pass
+
+    def __contains__(self, key):
+        return key in self.keys()
+
+    def get(self, key, default=None):
+        """dict.get() equivalent
+        """
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """Set fields, like dict.keys()
+        """
+        return [key for key in self.FIELDS if hasattr(self, key)]
+
+    def as_dict(self):
+        """Return a proxy info dictionary
+
+        Returns:
+            dict: Proxy info. Keys: ip, port, protocol and check result fields.
+        """
+        return {key: getattr(self, key) for key in self.keys()}
+
+
+def proxy_url(proxy):
+    """Return the proxy URL for a Proxy or a proxy info dictionary
+
+    Args:
+        proxy (Proxy|dict): Proxy info. Keys: ip, port, protocol.
+
+    Returns:
+        str: Proxy URL, as protocol://ip:port
+    """
+    if isinstance(proxy, Proxy):
+        return proxy.url
+    return "{protocol}://{ip}:{port}".format(**proxy)
+
+
+def transport_url(proxy):
+    """Return the URL the checkers reach a proxy through: an "https" proxy
+    is an HTTP proxy, spoken to in clear text
+
+    Args:
+        proxy (Proxy|dict): Proxy info. Keys: ip, port, protocol.
+
+    Returns:
+        str: Proxy URL, as scheme://ip:port
+    """
+    url = proxy_url(proxy)
+    if proxy["protocol"] == "https":
+        return "http" + url[len("https"):]
+    return url
@@ -1,54 +1,252 @@
+import re
+import time
+
 from bs4 import BeautifulSoup
 import requests
 
+from . import __version__
+from .models import Proxy
+
+
+class CachedResponse:
+    """Stand-in for a requests response replaying a cached body
+    """
+
+    status_code = 200
+
+    def __init__(self, body):
+        self.content = body
+        self.headers = {}
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+class RecordingResponse:
+    """requests response wrapper writing the body to a file while it is read
+    """
+
+    def __init__(self, response, file):
+        self._response = response
+        self._file = file
+        self._recorded = False
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    @property
+    def content(self):
+        content = self._response.content
+        if not self._recorded:
+            self._file.write(content)
+            self._recorded = True
+        return content
+
+    def iter_content(self, chunk_size=1):
+        for chunk in self._response.iter_content(chunk_size):
+            self._file.write(chunk)
+            yield chunk
+        self._recorded = True
+
 
 class PluginBase:
     """Plugin base class
     """
 
     HOST = None
+    STREAM = False
 
-    def __init__(self):
+    def __init__(self, timeout=None, cache=None):
         self.response = None
+        self.timeout = timeout
+        self.cache = cache
 
     def get_data(self):
         pass
 
-    def get_request(self):
-        self.response = requests.get(self.HOST)
+    def get_request(self, headers=None):
+        self.response = requests.get(self.HOST, timeout=self.timeout, stream=self.STREAM,
+                                     headers=headers)
+        self.response.raise_for_status()
 
     def scrape(self):
+        if self.cache is not None:
+            return self.scrape_cached()
         self.get_request()
         return self.get_data()
 
+    def scrape_cached(self):
+        """Like scrape(), but answer from the source cache while it is fresh
+        and revalidate it with a conditional request after
+        """
+        entry = self.cache.get(self.HOST)
+        if entry is not None and entry.age() < self.cache.max_age:
+            yield from self.cached_proxies(entry)
+            return
+
+        self.get_request(entry.validators() if entry is not None else None)
+        if self.response.status_code == 304 and entry is not None:
+            self.response.close()
+            self.cache.touch(self.HOST, fetched=time.time())
+            yield from self.cached_proxies(entry)
+            return
+
+        # body and proxies go to disk as they stream past, nothing is kept
+        with self.cache.body_writer(self.HOST) as body, \
+                self.cache.proxy_writer(self.HOST) as rows:
+            self.response = RecordingResponse(self.response, body)
+            for proxy in self.get_data():
+                rows.write(proxy)
+                yield proxy
+        self.cache.store(self.HOST, self.response.headers)
+
+    def cached_proxies(self, entry):
+        """Proxies of a cache entry, the cached body is parsed again if they
+        were parsed by another version
+
+        Args:
+            entry (CacheEntry): Cached response
+
+        Yields:
+            Proxy: Proxy info
+        """
+        proxies = entry.proxies()
+        if proxies is not None:
+            yield from proxies
+            return
+        self.response = CachedResponse(entry.body())
+        with self.cache.proxy_writer(self.HOST) as rows:
+            for proxy in self.get_data():
+                rows.write(proxy)
+                yield proxy
+        self.cache.store_proxies(self.HOST)
+        self.cache.touch(self.HOST, version=__version__)
+
 
 class FreeProxyListNet(PluginBase):
 
     HOST = "https://free-proxy-list.net/"
 
+    TABLE_RE = re.compile(rb"<table\b.*?</table>", re.S | re.I)
+    ROW_RE = re.compile(rb"<tr\b[^>]*>(.*?)</tr>", re.S | re.I)
+    CELL_RE = re.compile(rb"<t([dh])\b[^>]*>(.*?)</t\1>", re.S | re.I)
+    IP_RE = re.compile(rb"\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}")
+
     def get_data(self):
-        soup = BeautifulSoup(self.response.content, "html.parser")
+        proxies = self.parse_fast(self.response.content)
+        if proxies is None:
+            # page layout not recognised, let BeautifulSoup deal with it
+            proxies = self.parse_soup(self.response.content)
+        yield from proxies
+
+    @classmethod
+    def parse_fast(cls, content):
+        """Extract proxies from the page with compiled regular expressions,
+        without building a document tree.
+
+        Args:
+            content (bytes): Page body
+
+        Returns:
+            list: List of Proxy, None if the page layout is not recognised
+        """
+        table = cls.TABLE_RE.search(content)
+        if table is None:
+            return None
+        rows = cls.ROW_RE.findall(table.group())
+        if not rows:
+            return None
+
+        header = [text.strip() for tag, text in cls.CELL_RE.findall(rows[0]) if tag == b"h"]
+        try:
+            ip_col = header.index(b"IP Address")
+            port_col = header.index(b"Port")
+            https_col = header.index(b"Https")
+        except ValueError:
+            return None
+        min_cells = max(ip_col, port_col, https_col) + 1
+
+        proxies = []
+        for row in rows[1:]:
+            td = [text for tag, text in cls.CELL_RE.findall(row) if tag == b"d"]
+            if not td:
+                continue
+            if len(td) < min_cells:
+                return None
+            ip = td[ip_col]
+            port = td[port_col]
+            if not cls.IP_RE.fullmatch(ip) or not port.isdigit():
+                return None
+            protocol = "https" if td[https_col] == b"yes" else "http"
+            proxies.append(Proxy(protocol, ip.decode("ascii"), int(port)))
+        return proxies
+
+    @staticmethod
+    def parse_soup(content):
+        """Extract proxies from the page with BeautifulSoup
+
+        Args:
+            content (bytes): Page body
+
+        Yields:
+            Proxy: Proxy info
+        """
+        soup = BeautifulSoup(content, "html.parser")
         table = soup.find("table")
         rows = table.find_all("tr")
-        head = ("ip", "port", "code", "country", "anonymity", "google", "https", "last_check")
         for row in rows:
             td = row.find_all("td")
             if td:
                 ip = td[0].text
                 port = int(td[1].text)
                 protocol = "https" if td[6].text == "yes" else "http"
-                yield {"protocol": protocol, "ip": ip, "port": port}
+                yield Proxy(protocol, ip, port)
 
 
 class ProxyScrapeComBase(PluginBase):
 
     PROTOCOL = None
+    STREAM = True
+    CHUNK_SIZE = 64 * 1024
 
     def get_data(self):
-        for line in self.response.text.split("\r\n"):
-            if line:
-                ip, port = line.split(":")
-                yield {"protocol": self.PROTOCOL, "ip": ip, "port": int(port)}
+        try:
+            yield from self.parse_lines(self.response.iter_content(self.CHUNK_SIZE),
+                                        self.PROTOCOL)
+        finally:
+            self.response.close()
+
+    @staticmethod
+    def parse_lines(chunks, protocol):
+        """Parse ip:port lines while the body is downloaded, so only one chunk
+        is in memory at a time. CRLF and LF line endings are both accepted and
+        malformed lines are skipped.
+
+        Args:
+            chunks (iterable): Body as chunks of bytes
+            protocol (str): Protocol of every proxy in the list
+
+        Yields:
+            Proxy: Proxy info
+        """
+        tail = b""
+        for chunk in chunks:
+            lines = (tail + chunk).split(b"\n")
+            # the last line may continue in the next chunk
+            tail = lines.pop()
+            for line in lines:
+                ip, sep, port = line.partition(b":")
+                port = port.rstrip()
+                if sep and port.isdigit() and int(port) <= 0xFFFF:
+                    ip = ip.strip()
+                    if ip:
+                        yield Proxy(protocol, ip.decode("latin-1"), int(port))
+        if tail:
+            yield from ProxyScrapeComBase.parse_lines([tail + b"\n"], protocol)
 
 
 class HttpProxyScrapeCom(ProxyScrapeComBase):
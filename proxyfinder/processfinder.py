@@ -0,0 +1,285 @@
+"""Multi-process checking engine.
+
+ProcessProxyFinder has the same API as ProxyFinder but checks proxies in
+several worker processes, each running its own ProxyFinder (threads) or
+AsyncProxyFinder, so session setup, TLS and exception handling are spread
+over all the cores instead of one GIL.
+
+The parent keeps the proxy queue, the health cache and the results: a
+dispatcher thread hands batches of proxies to the processes through one
+shared queue, so a busy process simply takes fewer batches, and a collector
+thread puts the results back in the parent result queue as they arrive.
+Every process tells the collector which proxies it took: if it dies, they
+are reported with SHARD_ERROR, and once all the processes are gone so are
+the proxies still waiting.
+"""
+
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from .asyncfinder import AsyncProxyFinder
+from .models import Proxy
+from .proxyfinder import ProxyFinder
+
+BATCH_SIZE = 32
+SHARD_ERROR = "Worker process died"
+
+
+def _shard_source(task_queue, result_queue, tokens):
+    """Proxies sent by the parent, until the None sentinel"""
+    while True:
+        batch = task_queue.get()
+        if batch is None:
+            return
+        result_queue.put(("taken", os.getpid(), [token for token, _ in batch]))
+        for token, fields in batch:
+            proxy = Proxy(**fields)
+            tokens[id(proxy)] = token
+            yield proxy
+
+
+def _run_shard(finder_cls, url, kwargs, task_queue, result_queue):
+    """Worker process start point: check the proxies received from the
+    parent with a finder_cls instance and send the results back in batches.
+    Messages are (kind, pid, payload): "taken" with the tokens of a batch
+    received, "results" with [token, fields] pairs, "limit" with the checks
+    in flight allowed when it changes, and "done" at the end.
+    """
+    tokens = {}
+    pid = os.getpid()
+    try:
+        pf = finder_cls(url, **kwargs)
+        pf.start_feeder(_shard_source(task_queue, result_queue, tokens))
+        pf.start()
+        limit = None
+        for batch in pf.iter_batches():
+            result_queue.put(("results", pid,
+                              [(tokens.pop(id(res)), res.as_dict()) for res in batch]))
+            if pf.get_concurrency() != limit:
+                limit = pf.get_concurrency()
+                result_queue.put(("limit", pid, limit))
+            # the parent keeps them, here they would grow with the run
+            pf.proxy_found.clear()
+            pf.all_results.clear()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        result_queue.put(("done", pid, None))
+
+
+class ProcessProxyFinder(ProxyFinder):
+    """ProxyFinder sharding the checks over worker processes
+
+    Args:
+        processes (int, optional): Worker processes. Defaults to os.cpu_count().
+        use_async (bool, optional): Check with AsyncProxyFinder in every
+            process, max_threads is then the checks in flight per process.
+            Defaults to False.
+
+    Every other argument is the one of ProxyFinder, max_threads and the
+    timeouts apply to each process.
+    """
+
+    def __init__(self, url, max_proxies=-1, max_threads=20, conn_timeout=3.05,
+                 prefilter_timeout=None, stream=False, health_store=None,
+                 skip_failed=True, source_cache=None, adaptive=False, max_working=0,
+                 read_timeout=None, total_timeout=None, adaptive_timeout=False,
+                 processes=None, use_async=False, trace=False):
+        super().__init__(url, max_proxies, max_threads, conn_timeout,
+                         prefilter_timeout, stream, health_store, skip_failed,
+                         source_cache, adaptive, max_working, read_timeout,
+                         total_timeout, adaptive_timeout, trace)
+        self.processes = processes or os.cpu_count() or 1
+        self.use_async = use_async
+        # every process adapts its own limit, see get_concurrency()
+        self.limiter = None
+        self._shard_limits = {}
+        self._context = multiprocessing.get_context("spawn")
+        self._task_queue = None
+        self._shard_results = None
+        self._workers = []
+        self._in_flight = {}
+        self._kill = False
+
+        shard_kwargs = {
+            "conn_timeout": conn_timeout,
+            "prefilter_timeout": prefilter_timeout,
+            "adaptive": adaptive,
+            "read_timeout": read_timeout,
+            "total_timeout": total_timeout,
+            "adaptive_timeout": adaptive_timeout,
+            "trace": trace,
+        }
+        if use_async:
+            self._shard_cls = AsyncProxyFinder
+            shard_kwargs["max_concurrency"] = max_threads
+        else:
+            self._shard_cls = ProxyFinder
+            shard_kwargs["max_threads"] = max_threads
+        self._shard_kwargs = shard_kwargs
+
+    def _dispatch(self):
+        """Dispatcher thread start point: move proxies from the proxy queue
+        to the processes, in batches
+        """
+        token = 0
+        while not self._kill:
+            batch = []
+            try:
+                while len(batch) < BATCH_SIZE:
+                    proxy = self.proxy_queue.get_nowait()
+                    self.proxy_queue.task_done()
+                    self._in_flight[token] = proxy
+                    batch.append((token, {key: proxy[key] for key in proxy.keys()}))
+                    token += 1
+            except queue.Empty:
+                pass
+            if batch:
+                for _ in batch:
+                    self.tracker.started()
+                self._put_task(batch)
+                continue
+            if self.feeder is not None and (self.feeding.is_set()
+                                            or not self.proxy_queue.empty()):
+                # plugins are still being scraped
+                time.sleep(0.05)
+                continue
+            break
+        for _ in self._workers:
+            self._put_task(None)
+
+    def _put_task(self, item):
+        # the task queue is bounded so proxies wait in the proxy queue, where
+        # they are counted as left
+        while not self._kill:
+            try:
+                self._task_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _collect(self):
+        """Collector thread start point: put the results of the processes in
+        the result queue
+        """
+        # tokens taken by each process and not reported yet
+        outstanding = {process.pid: set() for process in self._workers}
+        running = set(outstanding)
+        died = False
+        while running and not self._kill:
+            try:
+                kind, pid, payload = self._shard_results.get(timeout=0.1)
+            except queue.Empty:
+                for process in self._workers:
+                    if process.pid in running and not process.is_alive():
+                        # died without saying goodbye
+                        running.discard(process.pid)
+                        died = True
+                        self._abandon(outstanding.pop(process.pid))
+                continue
+            if kind == "taken":
+                outstanding[pid].update(payload)
+            elif kind == "limit":
+                self._shard_limits[pid] = payload
+            elif kind == "results":
+                for token, fields in payload:
+                    outstanding[pid].discard(token)
+                    proxy = self._in_flight.pop(token, None)
+                    if proxy is not None:
+                        self._deliver(proxy, fields)
+            else:
+                running.discard(pid)
+        if died and not self._kill:
+            # nobody is left to check the rest
+            self._kill = True
+            if self.feeder is not None:
+                self.feeder.stop()
+            self.feeding.clear()
+            self._abandon(list(self._in_flight))
+            while True:
+                try:
+                    proxy = self.proxy_queue.get_nowait()
+                except queue.Empty:
+                    break
+                self.proxy_queue.task_done()
+                self.tracker.started()
+                self._deliver(proxy, {"error": SHARD_ERROR})
+
+    def _abandon(self, tokens):
+        """Report the proxies of tokens, taken by a process that died, as
+        failed
+        """
+        for token in tokens:
+            proxy = self._in_flight.pop(token, None)
+            if proxy is not None:
+                self._deliver(proxy, {"error": SHARD_ERROR})
+
+    def get_concurrency(self):
+        """Retrive the limit of checks in flight over all the processes, the
+        sum of their adaptive limits as last reported
+
+        Returns:
+            int: Checks in flight
+        """
+        if not self._workers:
+            return self.processes * self.max_threads
+        return sum(self._shard_limits.get(process.pid, self.max_threads)
+                   for process in self._workers)
+
+    def get_active_threads(self):
+        """Retrive number of checks dispatched to the processes and not
+        finished yet
+
+        Returns:
+            int: Number of checks in flight
+        """
+        return len(self._in_flight)
+
+    def _terminate(self):
+        for process in self._workers:
+            if process.is_alive():
+                process.terminate()
+
+    def cancel_pending(self):
+        """Drop the proxies still to check and stop the processes, keeping
+        the results found so far
+        """
+        self._kill = True
+        if self.feeder is not None:
+            self.feeder.stop()
+        self.feeding.clear()
+        self._drop_pending()
+        self._terminate()
+        self.complete()
+
+    def stop(self):
+        """Stop the processes and reset queues
+        """
+        self.result_queue.queue.clear()
+        self.cancel_pending()
+        self.threads.clear()
+
+    def start(self):
+        """Start the processes, the dispatcher and the collector
+        """
+        self.enqueue_proxies()
+
+        self._kill = False
+        self._shard_limits.clear()
+        self._task_queue = self._context.Queue(maxsize=2 * self.processes)
+        self._shard_results = self._context.Queue()
+        self._workers = [
+            self._context.Process(target=_run_shard, daemon=True,
+                                  args=(self._shard_cls, self.url, self._shard_kwargs,
+                                        self._task_queue, self._shard_results))
+            for _ in range(self.processes)]
+        for process in self._workers:
+            process.start()
+        for target in (self._dispatch, self._collect):
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self.threads.append(t)
+        self._watch()
@@ -0,0 +1,155 @@
+"""Progress tracking of a check run.
+
+The time left is estimated from what the checks actually do, not from the
+worst case: an EWMA of the completion rate once enough checks finished,
+before that the median duration of the checks seen so far (falling back
+to the connection timeout) spread over the concurrency.
+"""
+
+import collections
+import math
+import statistics
+import threading
+import time
+
+Progress = collections.namedtuple(
+    "Progress", ("done", "working", "in_flight", "remaining", "rate", "eta"))
+Progress.__doc__ = """Progress snapshot
+
+    done: proxies processed, checked or answered from the health cache
+    working: working proxies found
+    in_flight: checks running
+    remaining: proxies waiting in the queue
+    rate: checks finished per second, EWMA; None until known
+    eta: estimated seconds left; None until known
+"""
+
+
+def format_eta(eta):
+    """Format an estimated time left
+
+    Args:
+        eta (float): Seconds, or None if unknown
+
+    Returns:
+        str: Time left (hh:mm:ss), --:--:-- if unknown
+    """
+    if eta is None:
+        return "--:--:--"
+    return time.strftime("%H:%M:%S", time.gmtime(eta))
+
+
+class ProgressTracker:
+    """Thread safe counters of a check run and the estimators built on them
+
+    Args:
+        half_life (float, optional): Seconds for a rate sample to weight half. Defaults to 5.0.
+        window (int, optional): Check durations kept for the median. Defaults to 256.
+        min_samples (int, optional): Checks needed to trust the rate. Defaults to 10.
+    """
+
+    def __init__(self, half_life=5.0, window=256, min_samples=10):
+        self.tau = half_life / math.log(2)
+        self.min_samples = min_samples
+        self.done = 0
+        self.working = 0
+        self.checked = 0
+        self.in_flight = 0
+        self.durations = collections.deque(maxlen=window)
+        self._rate = None
+        self._last_checked = 0
+        self._last_time = None
+        self._lock = threading.Lock()
+
+    def started(self):
+        """Count a check starting
+        """
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, error, duration):
+        """Count a check ending
+
+        Args:
+            error (str): Check error, empty if the proxy works
+            duration (float): Seconds the check took, None if unknown
+        """
+        with self._lock:
+            self.in_flight -= 1
+            self.done += 1
+            self.checked += 1
+            if not error:
+                self.working += 1
+            if duration is not None:
+                self.durations.append(duration)
+
+    def skipped(self, error=None):
+        """Count a proxy processed without a check
+
+        Args:
+            error (str, optional): Cached result error, None if the proxy is
+                dropped without a result. Defaults to None.
+        """
+        with self._lock:
+            self.done += 1
+            if error == "":
+                self.working += 1
+
+    def latency(self):
+        """Median duration of the recent checks
+
+        Returns:
+            float: Seconds, None if no check finished yet
+        """
+        with self._lock:
+            durations = list(self.durations)
+        return statistics.median(durations) if durations else None
+
+    def _update_rate(self, now):
+        if self._last_time is None:
+            self._last_time = now
+            return
+        dt = now - self._last_time
+        if dt < 0.25:
+            return
+        sample = (self.checked - self._last_checked) / dt
+        if self._rate is None:
+            self._rate = sample
+        else:
+            alpha = 1 - math.exp(-dt / self.tau)
+            self._rate += alpha * (sample - self._rate)
+        self._last_checked = self.checked
+        self._last_time = now
+
+    def snapshot(self, remaining, concurrency, timeout, now=None):
+        """Take a progress snapshot
+
+        Args:
+            remaining (int): Proxies waiting in the queue
+            concurrency (int): Max checks in flight
+            timeout (float): Connection timeout, the guess before any check ends
+            now (float, optional): time.monotonic() value. Defaults to now.
+
+        Returns:
+            Progress: Progress snapshot
+        """
+        now = time.monotonic() if now is None else now
+        latency = self.latency()
+        with self._lock:
+            self._update_rate(now)
+            rate = self._rate
+            done, working, in_flight = self.done, self.working, max(0, self.in_flight)
+            mature = rate and self.checked >= self.min_samples
+
+        pending = remaining + in_flight
+        if pending == 0:
+            eta = 0.0
+        elif mature:
+            eta = pending / rate
+            if not remaining:
+                # only the last checks are running
+                eta = min(eta, latency or timeout)
+        else:
+            # no reliable rate yet, model it from the check duration
+            eta = math.ceil(pending / max(1, concurrency)) * (latency or timeout)
+        return Progress(done, working, in_flight, remaining, rate if mature else None, eta)
@@ -2,13 +2,30 @@
 check if they working on a determinate website.
 """
 
+import asyncio
 import time
 import threading
 import queue
+import socket
+import struct
+import functools
+import heapq
+import logging
 import requests
+import requests.adapters
+import urllib3.connection
 import http.client
+from urllib.parse import urlsplit, urljoin
 
 from . import plugins
+from . import dedup
+from . import tracing
+from .concurrency import AdaptiveLimit, LOCAL_ERROR, is_local_error
+from .metrics import FinderMetrics
+from .progress import ProgressTracker, format_eta
+from .timeouts import DEADLINE_ERROR, TimeoutPolicy
+from .tracing import Profile, Trace
+from .models import Proxy, proxy_url, transport_url
 
 PLUGINS = [
     plugins.FreeProxyListNet,
@@ -17,40 +34,307 @@ PLUGINS = [
     plugins.Socks5ProxyScrapeCom,
 ]
 
+PLUGIN_TIMEOUT = 15
 
-def get_proxy_list():
+logger = logging.getLogger(__name__)
+
+
+def _scrape(plugin, timeout, cache, out):
+    """Download and parse one plugin source, putting every proxy in the out
+    queue as soon as it is parsed, as a (plugin, proxy, dedup key) item. A
+    (plugin, None, error) item marks the end, error is empty if the plugin
+    did not fail. A record that is not a valid proxy fails its plugin.
+    """
+    error = ""
+    try:
+        for proxy in plugin(timeout, cache).scrape():
+            proxy = Proxy.from_dict(proxy)
+            if not isinstance(proxy.port, int) or not 0 < proxy.port <= 0xFFFF:
+                raise ValueError(f"Invalid port: {proxy.port!r}")
+            out.put((plugin, proxy, dedup.proxy_key(proxy)))
+    except Exception as e:  # pylint: disable=broad-except
+        logger.warning("Plugin %s failed: %s", plugin.__name__, e)
+        error = str(e) or type(e).__name__
+    finally:
+        out.put((plugin, None, error))
+
+
+def iter_proxy_list(timeout=PLUGIN_TIMEOUT, cache=None, on_source=None):
+    """Yield unique proxies from websites while they are being scraped.
+
+    All plugins are scraped at the same time and their proxies are yielded
+    as soon as they are parsed. A plugin that fails or takes longer than
+    timeout is skipped from that point on.
+
+    Args:
+        timeout (float, optional): Max time (in seconds) for each plugin. Defaults to 15.
+        cache (SourceCache, optional): Source response cache. Defaults to None.
+        on_source (callable, optional): Called as on_source(name, found, error)
+            when a plugin is over, with the number of new proxies it gave and
+            the reason it failed, empty if it did not. Defaults to None.
+
+    Yields:
+        Proxy: Proxy info. Keys: ip, port, protocol, source.
+    """
+    out = queue.Queue()
+    pending = set(PLUGINS)
+    for plugin in PLUGINS:
+        threading.Thread(target=_scrape, args=(plugin, timeout, cache, out),
+                         daemon=True).start()
+
+    deadline = time.monotonic() + timeout
+    index = dedup.ProxyIndex()
+    found = dict.fromkeys(PLUGINS, 0)
+    while pending:
+        try:
+            plugin, proxy, key = out.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+            for plugin in pending:
+                logger.warning("Plugin %s timed out", plugin.__name__)
+                if on_source is not None:
+                    on_source(plugin.__name__, found[plugin], "Timed out")
+            return
+        if proxy is None:
+            # key is the error of the plugin
+            pending.discard(plugin)
+            if on_source is not None:
+                on_source(plugin.__name__, found[plugin], key)
+            continue
+        # remove duplicate endpoints, the first source wins
+        if index.add_key(key):
+            proxy["source"] = plugin.__name__
+            found[plugin] += 1
+            yield proxy
+
+
+def get_proxy_list(timeout=PLUGIN_TIMEOUT, cache=None, on_source=None):
     """Retrive a list of proxies from websites
 
+    Args:
+        timeout (float, optional): Max time (in seconds) for each plugin. Defaults to 15.
+        cache (SourceCache, optional): Source response cache. Defaults to None.
+        on_source (callable, optional): Plugin progress callback, see
+            iter_proxy_list(). Defaults to None.
+
     Returns:
-        list: List of proxy info. Keys: ip, port, protocol.
+        list: List of Proxy. Keys: ip, port, protocol, source.
     """
-    proxy_list = []
-    for plugin in PLUGINS:
-        proxy_list.extend(plugin().scrape())
-    # remove duplicate ip
-    unique_proxies = list({v["ip"]:v for v in proxy_list}.values())
-    return unique_proxies
+    return list(iter_proxy_list(timeout, cache, on_source))
+
+
+@functools.lru_cache(maxsize=32)
+def _target_address(url):
+    """Resolve the url host to an IPv4 address and port, used by SOCKS4
+
+    Args:
+        url (str): A website url
+
+    Returns:
+        tuple: IPv4 address and port
+    """
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+    return socket.gethostbyname(parts.hostname), port
+
+
+def _recv_exactly(sock, size):
+    """Read exactly size bytes from a socket
+    """
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed during handshake")
+        data += chunk
+    return data
+
 
+def prefilter_proxy(proxy, url, timeout=1.0):
+    """Cheap first stage check: TCP connect to the proxy and, for SOCKS
+    proxies, the minimal handshake. Only proxies passing it are worth a full
+    check_proxy().
 
-def check_proxy(proxy, url, timeout=3.05):
+    Args:
+        proxy (Proxy|dict): Proxy info. Keys: ip, port, protocol.
+        url (str): A website url, SOCKS4 needs the target address
+        timeout (float, optional): Max time for connect and handshake. Defaults to 1.0.
+
+    Returns:
+        str: Connection error description, empty if the proxy answered
+    """
+    try:
+        sock = socket.create_connection((proxy["ip"], proxy["port"]), timeout)
+    except socket.timeout:
+        return "Request timed out while trying to connect"
+    except OSError as e:
+        return LOCAL_ERROR if is_local_error(e) else "Connection error"
+
+    with sock:
+        try:
+            if proxy["protocol"] == "socks5":
+                # greeting offering "no authentication"
+                sock.sendall(b"\x05\x01\x00")
+                if _recv_exactly(sock, 2) != b"\x05\x00":
+                    return "Connection error"
+            elif proxy["protocol"] == "socks4":
+                ip, port = _target_address(url)
+                sock.sendall(struct.pack(">BBH", 4, 1, port) + socket.inet_aton(ip) + b"\x00")
+                if _recv_exactly(sock, 8)[1] != 0x5A:
+                    return "Connection error"
+        except socket.timeout:
+            return "Server did not send any data"
+        except OSError:
+            return "Connection error"
+    return ""
+
+
+class TimingAdapter(requests.adapters.HTTPAdapter):
+    """Transport adapter recording the time (time.perf_counter) the first
+    connection through the proxy is open, SOCKS handshake or CONNECT tunnel
+    included, in timings["connect"], the time the last response head arrives
+    in timings["ttfb"], and the phases of a traced check
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.timings = {}
+        super().__init__(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if not getattr(manager, "timed", False):
+            manager.pool_classes_by_scheme = {
+                scheme: self._timed_pool(pool_cls)
+                for scheme, pool_cls in manager.pool_classes_by_scheme.items()}
+            manager.timed = True
+        return manager
+
+    def _timed_pool(self, pool_cls):
+        timings = self.timings
+
+        class TimedConnection(pool_cls.ConnectionCls):
+            def _new_conn(self):
+                tracing.mark("connect")
+                conn = super()._new_conn()
+                if not self._tunnel_host:
+                    timings.setdefault("connect", time.perf_counter())
+                    if self._is_https():
+                        tracing.mark("tls")
+                return conn
+
+            def _tunnel(self):
+                tracing.mark("handshake")
+                super()._tunnel()
+                timings.setdefault("connect", time.perf_counter())
+                if self._is_https():
+                    tracing.mark("tls")
+
+            def _is_https(self):
+                return isinstance(self, urllib3.connection.HTTPSConnection)
+
+            def connect(self):
+                super().connect()
+                tracing.mark("ttfb")
+
+            def request(self, *args, **kwargs):
+                if self.sock is not None:
+                    # kept alive from a previous hop, connect() is skipped
+                    tracing.mark("ttfb")
+                return super().request(*args, **kwargs)
+
+            def getresponse(self, *args, **kwargs):
+                response = super().getresponse(*args, **kwargs)
+                timings["ttfb"] = time.perf_counter()
+                tracing.mark("body")
+                return response
+
+        return type(pool_cls.__name__, (pool_cls,), {"ConnectionCls": TimedConnection})
+
+
+class _DeadlineExceeded(Exception):
+    pass
+
+
+def _drain(response, start, deadline):
+    """Download the response body like a plain requests.get() does, the
+    status is known already so a slow or broken body is not an error
+    """
+    try:
+        for _ in response.iter_content(65536):
+            if deadline is not None and time.perf_counter() - start >= deadline:
+                raise _DeadlineExceeded()
+    except requests.RequestException:
+        pass
+    finally:
+        response.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _trace_socks():
+    """Mark the handshake phase in the PySocks negotiations, once"""
+    try:
+        import socks  # pylint: disable=import-outside-toplevel
+    except ImportError:
+        return
+
+    def traced(negotiate):
+        @functools.wraps(negotiate)
+        def wrapper(*args, **kwargs):
+            tracing.mark("handshake")
+            return negotiate(*args, **kwargs)
+        return wrapper
+
+    negotiators = socks.socksocket._proxy_negotiators  # pylint: disable=protected-access
+    for key, negotiate in negotiators.items():
+        negotiators[key] = traced(negotiate)
+
+
+def check_proxy(proxy, url, timeout=3.05, read_timeout=None, deadline=None, trace=None):
     """Try connect proxy to url and check if it work
 
     Args:
-        proxy (dict): Proxy info. Keys: ip, port, protocol.
+        proxy (Proxy|dict): Proxy info. Keys: ip, port, protocol.
         url (str): A website url
-        timeout (float, optional): Max timeout for connection. Defaults to 3.05.
+        timeout (float, optional): Max time to connect. Defaults to 3.05.
+        read_timeout (float, optional): Max time waiting for data. Defaults to timeout.
+        deadline (float, optional): Max time for the whole check, redirects
+                                    included. Defaults to None (no limit).
+        trace (Trace, optional): Record the phases of the check in it, and
+                                 in proxy["trace"]. Defaults to None.
 
     Returns:
-        dict: Modified proxy info adding connection error description
+        Proxy|dict: Modified proxy info adding connection error description
+                    and, if it works, the timings
     """
+    read_timeout = timeout if read_timeout is None else read_timeout
+    if trace is not None:
+        _trace_socks()
     res = None
     error = ""
-    with requests.Session() as s:
-        s.proxies["http"] = "{protocol}://{ip}:{port}".format(**proxy)
-        s.proxies["https"] = "{protocol}://{ip}:{port}".format(**proxy)
+    start = time.perf_counter()
+    with requests.Session() as s, tracing.active(trace):
+        adapter = TimingAdapter()
+        s.mount("http://", adapter)
+        s.mount("https://", adapter)
+        s.proxies["http"] = s.proxies["https"] = transport_url(proxy)
 
         try:
-            res = s.get(url, verify=False, timeout=timeout)
+            # redirects are followed here to keep every hop within the deadline
+            for _ in range(s.max_redirects + 1):
+                left = timeout
+                if deadline is not None:
+                    left = deadline - (time.perf_counter() - start)
+                    if left <= 0:
+                        raise _DeadlineExceeded()
+                res = s.get(url, verify=False, stream=True, allow_redirects=False,
+                            timeout=(min(timeout, left), min(read_timeout, left)))
+                _drain(res, start, deadline)
+                if not res.is_redirect:
+                    break
+                url = urljoin(res.url, res.headers["location"])
+            else:
+                raise requests.TooManyRedirects()
+        except _DeadlineExceeded:
+            error = DEADLINE_ERROR
         except requests.ConnectTimeout:
             error = "Request timed out while trying to connect"
         except requests.ReadTimeout:
@@ -61,24 +345,47 @@ def check_proxy(proxy, url, timeout=3.05):
             error = "Invalid URL"
         except requests.HTTPError:
             error = "HTTP error occurred"
-        except requests.ConnectionError:
-            error = "Connection error"
+        except requests.ConnectionError as e:
+            error = LOCAL_ERROR if is_local_error(e) else "Connection error"
         except requests.RequestException:
             error = "Generic error"
 
-        try:
-            if res.status_code != 200:
-                str_resp = http.client.responses[res.status_code]
-                error = f"Error {res.status_code}: {str_resp}"
-        except AttributeError:
-            pass
+        if (error in ("Request timed out while trying to connect", "Server did not send any data")
+                and deadline is not None and time.perf_counter() - start >= deadline):
+            # the timeout was cut short by the deadline
+            error = DEADLINE_ERROR
+        elif not error and res.status_code != 200:
+            str_resp = http.client.responses.get(res.status_code, "Unknown")
+            error = f"Error {res.status_code}: {str_resp}"
 
         proxy["error"] = error
+        if not error:
+            total_time = time.perf_counter() - start
+            proxy["connect_time"] = adapter.timings["connect"] - start
+            proxy["ttfb"] = adapter.timings["ttfb"] - start
+            proxy["total_time"] = proxy["latency"] = total_time
+    if trace is not None:
+        proxy["trace"] = trace.entries
     return proxy
 
 
+def fastest(results, count):
+    """Return the fastest working proxies
+
+    Args:
+        results (list): Checked proxies
+        count (int): Number of proxies to return
+
+    Returns:
+        list: Up to count working proxies, fastest first
+    """
+    working = (res for res in results
+               if not res.get("error") and res.get("latency") is not None)
+    return heapq.nsmallest(count, working, key=lambda res: res["latency"])
+
+
 class SimplePrinter(threading.Thread):
-    """Simple printer thread
+    """Simple printer thread, exits when the results end
     """
 
     def __init__(self, result_queue):
@@ -98,22 +405,170 @@ class SimplePrinter(threading.Thread):
         """
         while not self._kill:
             line = self.result_queue.get()
-            if not line["error"]:
-                print("{protocol}://{ip}:{port}".format(**line))
             self.result_queue.task_done()
+            if line is None:
+                # end of the results
+                return
+            if not line["error"]:
+                print(proxy_url(line))
+
+
+class Feeder(threading.Thread):
+    """Separate thread moving proxies from a source into the check queue
+    """
+
+    def __init__(self, proxy_source, proxy_queue, proxy_found, feeding, max_proxies=-1):
+        super().__init__()
+
+        self.proxy_source = proxy_source
+        self.proxy_queue = proxy_queue
+        self.proxy_found = proxy_found
+        self.feeding = feeding
+        self.max_proxies = max_proxies
+        self._kill = False
+        self.daemon = True
+
+    def stop(self):
+        """Stop feeding
+        """
+        self._kill = True
+
+    def run(self):
+        """Thread start point
+        """
+        try:
+            for proxy in self.proxy_source:
+                if self._kill:
+                    return
+                self.proxy_found.append(proxy)
+                self.proxy_queue.put(proxy)
+                if 0 < self.max_proxies <= len(self.proxy_found):
+                    return
+        finally:
+            self.feeding.clear()
+
+
+class Dispatcher(threading.Thread):
+    """Separate thread calling back for every result of a finder, as soon as
+    it arrives
+    """
+
+    def __init__(self, finder, on_result, on_complete=None):
+        super().__init__()
+
+        self.finder = finder
+        self.on_result = on_result
+        self.on_complete = on_complete
+        self._kill = False
+        self.daemon = True
+
+    def stop(self):
+        """Stop calling back
+        """
+        self._kill = True
+
+    def run(self):
+        """Thread start point
+        """
+        for res in self.finder.iter_results():
+            if self._kill:
+                return
+            self.on_result(res)
+        if self.on_complete is not None and not self._kill:
+            self.on_complete()
+
+
+class Completion(threading.Thread):
+    """Wait for the threads of a finder to end, then mark its run complete
+    """
+
+    def __init__(self, finder):
+        super().__init__()
+
+        self.finder = finder
+        self.daemon = True
+
+    def run(self):
+        """Thread start point
+        """
+        while True:
+            # threads may be added while waiting, e.g. by PoolScaler
+            alive = [t for t in list(self.finder.threads) if t.is_alive()]
+            if not alive:
+                break
+            alive[0].join()
+        self.finder.complete()
+
+
+class Quota:
+    """Thread safe count of working proxies, calls on_reached once count of
+    them are found
+
+    Args:
+        count (int): Working proxies wanted
+        on_reached (callable): Called without arguments when the quota is reached
+    """
+
+    def __init__(self, count, on_reached):
+        self.count = count
+        self.on_reached = on_reached
+        self.found = 0
+        self.done = threading.Event()
+        self._lock = threading.Lock()
+
+    def claim(self, proxy):
+        """Count a checked proxy
+
+        Args:
+            proxy (Proxy|dict): Checked proxy
+
+        Returns:
+            bool: False if the quota was already reached and the result must be dropped
+        """
+        with self._lock:
+            if self.found >= self.count:
+                return False
+            if not proxy["error"]:
+                self.found += 1
+            return True
+
+    def check(self):
+        """Call on_reached if the quota has just been reached, after the
+        claimed result was delivered
+
+        Returns:
+            bool: True if the quota is reached
+        """
+        with self._lock:
+            if self.found < self.count:
+                return False
+            if self.done.is_set():
+                return True
+            self.done.set()
+        self.on_reached()
+        return True
 
 
 class Worker(threading.Thread):
     """Separate thread for process
     """
 
-    def __init__(self, url, proxy_queue, result_queue, timeout):
+    def __init__(self, url, proxy_queue, result_queue, timeouts, prefilter_timeout=None,
+                 feeding=None, limiter=None, quota=None, tracker=None, metrics=None,
+                 profile=None):
         super().__init__()
 
         self.url = url
         self.proxy_queue = proxy_queue
         self.result_queue = result_queue
-        self.timeout = timeout
+        self.timeouts = timeouts
+        self.prefilter_timeout = prefilter_timeout
+        self.feeding = feeding
+        self.limiter = limiter
+        self.quota = quota
+        self.tracker = tracker
+        self.metrics = metrics
+        self.profile = profile
         self._kill = False
         self.daemon = True
 
@@ -122,33 +577,145 @@ class Worker(threading.Thread):
         """
         self._kill = True
 
+    @property
+    def stopping(self):
+        """bool: True once stopped, the worker leaves after its current check"""
+        return self._kill
+
     def run(self):
         """Thread start point
         """
         while not self._kill:
-            if self.proxy_queue.empty():
+            try:
+                if self.feeding is None:
+                    proxy = self.proxy_queue.get_nowait()
+                else:
+                    proxy = self.proxy_queue.get(timeout=0.1)
+            except queue.Empty:
+                # while a Feeder is running the queue may be empty only for now
+                if self.feeding is not None and (self.feeding.is_set()
+                                                 or not self.proxy_queue.empty()):
+                    continue
                 return
+            if self.tracker is not None:
+                self.tracker.started()
+            start = time.perf_counter()
+            trace = Trace() if self.profile is not None else None
+            error = ""
+            if self.prefilter_timeout:
+                if trace is not None:
+                    trace.mark("prefilter")
+                error = prefilter_proxy(proxy, self.url, self.prefilter_timeout)
+            if error:
+                proxy["error"] = error
+                if trace is not None:
+                    trace.end()
+                    proxy["trace"] = trace.entries
+                res = proxy
             else:
-                proxy = self.proxy_queue.get()
-            res = check_proxy(proxy, self.url, self.timeout)
+                res = check_proxy(proxy, self.url, *self.timeouts.current(), trace=trace)
+                self.timeouts.record(res)
+            duration = time.perf_counter() - start
+            if self.tracker is not None:
+                self.tracker.finished(res["error"], duration)
+            if self.metrics is not None:
+                self.metrics.observe(res, duration)
+            if self.profile is not None:
+                self.profile.add(res)
+            if self.limiter is not None:
+                self.limiter.record(res["error"])
+            if self.quota is not None and not self.quota.claim(res):
+                # enough working proxies already
+                self.proxy_queue.task_done()
+                return
             self.result_queue.put(res)
             self.proxy_queue.task_done()
+            if self.quota is not None:
+                self.quota.check()
+
+
+class PoolScaler(threading.Thread):
+    """Keep the number of running workers equal to the adaptive limit
+    """
+
+    def __init__(self, finder, interval=0.2):
+        super().__init__()
+
+        self.finder = finder
+        self.interval = interval
+        self._kill = False
+        self.daemon = True
+
+    def stop(self):
+        """Stop current thread
+        """
+        self._kill = True
+
+    def scale(self):
+        """Forget the workers that ended, then start or stop workers to
+        match the limit
+
+        Returns:
+            bool: False once no worker is running, the queue is drained
+        """
+        threads = self.finder.threads
+        # only this thread adds workers once the run started
+        threads[:] = [t for t in threads if t.is_alive() or not isinstance(t, Worker)]
+        running = [t for t in threads if isinstance(t, Worker) and not t.stopping]
+        if not running:
+            return False
+        limit = self.finder.limiter.limit
+        if len(running) < limit and not self.finder.proxy_queue.empty():
+            for _ in range(limit - len(running)):
+                self.finder.add_worker()
+        else:
+            # surplus workers leave after their current check
+            for t in running[limit:]:
+                t.stop()
+        return True
+
+    def run(self):
+        """Thread start point
+        """
+        while not self._kill and self.scale():
+            time.sleep(self.interval)
 
 
 class ProxyFinder:
     """ProxyFinder Class
     """
 
-    def __init__(self, url, max_proxies=-1, max_threads=20, conn_timeout=3.05):
+    def __init__(self, url, max_proxies=-1, max_threads=20, conn_timeout=3.05,
+                 prefilter_timeout=None, stream=False, health_store=None,
+                 skip_failed=True, source_cache=None, adaptive=False, max_working=0,
+                 read_timeout=None, total_timeout=None, adaptive_timeout=False,
+                 trace=False):
         self.url = url
         self.max_proxies = max_proxies
+        self.max_working = max_working
         self.max_threads = max_threads
         self.conn_timeout = conn_timeout
+        self.timeouts = TimeoutPolicy(conn_timeout, read_timeout, total_timeout,
+                                      adaptive_timeout)
+        self.prefilter_timeout = prefilter_timeout
+        self.stream = stream
+        self.health_store = health_store
+        self.skip_failed = skip_failed
+        self.source_cache = source_cache
+        self.limiter = AdaptiveLimit(initial=max_threads) if adaptive else None
+        self.quota = Quota(max_working, self.cancel_pending) if max_working > 0 else None
+        self.tracker = ProgressTracker()
         self.proxy_queue = queue.Queue()
         self.result_queue = queue.Queue()
+        self.metrics = FinderMetrics(self)
+        self.profile = Profile() if trace else None
         self.proxy_found = []
         self.all_results = []
         self.threads = []
+        self.feeder = None
+        self.feeding = threading.Event()
+        self.completed = threading.Event()
+        self._complete_lock = threading.Lock()
 
     def get_proxies(self):
         """Retrive all proxies available in plugins
@@ -156,7 +723,7 @@ class ProxyFinder:
         Returns:
             list: All proxies found
         """
-        proxy_list = get_proxy_list()
+        proxy_list = get_proxy_list(cache=self.source_cache, on_source=self._source_callback())
         if self.max_proxies > 0:
             self.proxy_found = proxy_list[:self.max_proxies]
         else:
@@ -172,11 +739,145 @@ class ProxyFinder:
         last_results = []
         while not self.result_queue.empty():
             res = self.result_queue.get()
-            last_results.append(res)
+            if res is not None:
+                last_results.append(res)
             self.result_queue.task_done()
-        self.all_results.extend(last_results)
+        self._record(last_results)
         return last_results
 
+    def _record(self, results):
+        """Keep results handed to the caller and save them in the health store
+        """
+        self.all_results.extend(results)
+        if self.health_store is not None:
+            # local errors say nothing about the proxy
+            self.health_store.record([res for res in results
+                                      if not res.get("cached") and res["error"] != LOCAL_ERROR],
+                                     urlsplit(self.url).hostname)
+
+    def iter_batches(self, timeout=None):
+        """Yield the results as they arrive, without polling: wait for one,
+        then take all the ones already queued. Ends when the run is complete.
+
+        Args:
+            timeout (float, optional): Seconds to wait before yielding an
+                empty batch. Defaults to None (wait as long as needed).
+
+        Yields:
+            list: Checked proxies
+        """
+        while True:
+            if self.completed.is_set() and self.result_queue.empty():
+                # the end mark was taken by get_last_results()
+                return
+            try:
+                batch = [self.result_queue.get(timeout=timeout)]
+            except queue.Empty:
+                yield []
+                continue
+            try:
+                while batch[-1] is not None:
+                    batch.append(self.result_queue.get_nowait())
+            except queue.Empty:
+                pass
+            for _ in batch:
+                self.result_queue.task_done()
+            done = batch[-1] is None
+            if done:
+                batch.pop()
+            if batch:
+                self._record(batch)
+                yield batch
+            if done:
+                return
+
+    def iter_results(self):
+        """Yield the results one by one as they arrive, blocking in between.
+        Ends when the run is complete.
+
+        Yields:
+            Proxy: Checked proxy
+        """
+        for batch in self.iter_batches():
+            yield from batch
+
+    async def aiter_results(self):
+        """Asynchronous iterator over the results as they arrive, for
+        callers running an asyncio event loop. Ends when the run is complete.
+
+        Yields:
+            Proxy: Checked proxy
+        """
+        loop = asyncio.get_running_loop()
+        results = asyncio.Queue()
+
+        def pump():
+            try:
+                for batch in self.iter_batches():
+                    loop.call_soon_threadsafe(results.put_nowait, batch)
+                loop.call_soon_threadsafe(results.put_nowait, None)
+            except RuntimeError:
+                # the loop is closed, nobody is listening any more
+                pass
+
+        threading.Thread(target=pump, daemon=True).start()
+        while True:
+            batch = await results.get()
+            if batch is None:
+                return
+            for res in batch:
+                yield res
+
+    def start_dispatcher(self, on_result, on_complete=None):
+        """Call on_result(proxy) for every result as soon as it arrives, and
+        on_complete() when the run is complete, from a separate thread
+
+        Args:
+            on_result (callable): Called with every checked proxy
+            on_complete (callable, optional): Called without arguments at the end. Defaults to None.
+
+        Returns:
+            Dispatcher: Dispatcher thread
+        """
+        dispatcher = Dispatcher(self, on_result, on_complete)
+        dispatcher.start()
+        return dispatcher
+
+    def complete(self):
+        """Mark the run complete: queue the end of the results (None) for
+        the consumers, once
+        """
+        with self._complete_lock:
+            if self.completed.is_set():
+                return
+            self.completed.set()
+        self.result_queue.put(None)
+
+    def _watch(self):
+        """Complete the run when all the threads are over
+        """
+        Completion(self).start()
+
+    def get_fastest(self, count):
+        """Retrive the fastest working proxies found so far
+
+        Args:
+            count (int): Number of proxies to return
+
+        Returns:
+            list: Up to count working proxies, fastest first
+        """
+        return fastest(self.all_results, count)
+
+    def get_profile(self):
+        """Retrive where the time of the checks went, by phase
+
+        Returns:
+            Profile: Profile of the checks so far, None unless the finder
+                     was created with trace=True
+        """
+        return self.profile
+
     def get_proxies_left(self):
         """Retrive number of proxies to process
 
@@ -185,14 +886,33 @@ class ProxyFinder:
         """
         return self.proxy_queue.qsize()
 
+    def get_progress(self):
+        """Retrive a progress snapshot, see progress.Progress
+
+        Returns:
+            Progress: Proxies done, working, in flight and remaining, completion
+                      rate and estimated seconds left
+        """
+        return self.tracker.snapshot(self.get_proxies_left(), self.get_concurrency(),
+                                     self.conn_timeout)
+
     def get_estimated_time(self):
         """Retrive estimated time to finish all processes
 
         Returns:
-            str: Estimated time (hh:mm:ss)
+            str: Estimated time (hh:mm:ss), --:--:-- if unknown
+        """
+        return format_eta(self.get_progress().eta)
+
+    def get_concurrency(self):
+        """Retrive the current limit of checks in flight
+
+        Returns:
+            int: max_threads, or the adaptive limit in adaptive mode
         """
-        est_secs = (self.proxy_queue.qsize() * self.conn_timeout) / self.max_threads
-        return time.strftime('%H:%M:%S', time.gmtime(est_secs))
+        if self.limiter is not None:
+            return self.limiter.limit
+        return self.max_threads
 
     def get_active_threads(self):
         """Retrive number of active threads
@@ -208,35 +928,186 @@ class ProxyFinder:
         Returns:
             bool: True if all processes are finished
         """
-        for thread in self.threads:
+        if self.quota is not None and self.quota.done.is_set():
+            # checks still in flight are abandoned
+            return True
+        for thread in list(self.threads):
             if thread.is_alive():
                 return False
         return True
 
+    def triage(self, proxies):
+        """Consult the health store before checking proxies.
+
+        Proxies with a fresh result are put in the result queue straight away,
+        marked as cached. Recently failed ones are skipped, or checked last if
+        skip_failed is False.
+
+        Args:
+            proxies (iterable): Proxies to check
+
+        Yields:
+            Proxy: Proxies that need a check
+        """
+        known = self.health_store.fresh(urlsplit(self.url).hostname)
+        deferred = []
+        for proxy in proxies:
+            cached = known.get((proxy["protocol"], proxy["ip"], proxy["port"]))
+            if cached is None:
+                yield proxy
+                continue
+            error, latency, _ = cached
+            if error and not self.skip_failed:
+                deferred.append(proxy)
+                continue
+            proxy["error"] = error
+            proxy["latency"] = latency
+            proxy["cached"] = True
+            if self.quota is not None and not self.quota.claim(proxy):
+                return
+            self.tracker.skipped(error)
+            self.metrics.skipped(error)
+            self.result_queue.put(proxy)
+            if self.quota is not None and self.quota.check():
+                return
+        yield from deferred
+
+    def is_feeding(self):
+        """Check if proxies are still being scraped in streaming mode
+
+        Returns:
+            bool: True if more proxies may be added to the queue
+        """
+        return self.feeding.is_set()
+
+    def _source_callback(self, on_source=None):
+        """Wrap a plugin progress callback to record the scrape metrics, the
+        plugins start now
+        """
+        start = time.monotonic()
+
+        def callback(name, found, error):
+            self.metrics.source_done(name, found, error, time.monotonic() - start)
+            if on_source is not None:
+                on_source(name, found, error)
+        return callback
+
+    def start_feeder(self, proxy_source=None, on_source=None):
+        """Start moving proxies from proxy_source into the check queue while
+        they are being scraped
+
+        Args:
+            proxy_source (iterable, optional): Proxies to check. Defaults to iter_proxy_list().
+            on_source (callable, optional): Plugin progress callback of
+                iter_proxy_list(), used with the default proxy_source. Defaults to None.
+        """
+        if proxy_source is None:
+            proxy_source = iter_proxy_list(cache=self.source_cache,
+                                           on_source=self._source_callback(on_source))
+        if self.health_store is not None:
+            proxy_source = self.triage(proxy_source)
+        self.proxy_found = []
+        self.feeding.set()
+        self.feeder = Feeder(proxy_source, self.proxy_queue, self.proxy_found,
+                             self.feeding, self.max_proxies)
+        self.feeder.start()
+
     def stop(self):
         """Stop all active threads and reset queues
         """
-        for thread in self.threads:
+        if self.feeder is not None:
+            self.feeder.stop()
+        for thread in list(self.threads):
             thread.stop()
         self.proxy_queue.queue.clear()
         self.result_queue.queue.clear()
         self.threads.clear()
+        self.complete()
 
-    def start(self):
-        """Start threads and processes
+    def _deliver(self, proxy, fields):
+        """Copy a result checked elsewhere (another process or node) on the
+        proxy and deliver it
+        """
+        for key, value in fields.items():
+            proxy[key] = value
+        self.tracker.finished(proxy["error"], proxy.get("total_time"))
+        self.metrics.observe(proxy, proxy.get("total_time"))
+        if self.profile is not None:
+            self.profile.add(proxy)
+        if self.quota is not None and not self.quota.claim(proxy):
+            return
+        self.result_queue.put(proxy)
+        if self.quota is not None:
+            self.quota.check()
+
+    def cancel_pending(self):
+        """Drop the proxies still to check and let the workers go, keeping
+        the results found so far. Called when max_working proxies are found.
+        """
+        if self.feeder is not None:
+            self.feeder.stop()
+        self.feeding.clear()
+        for thread in list(self.threads):
+            thread.stop()
+        self._drop_pending()
+        self.complete()
+
+    def _drop_pending(self):
+        """Empty the proxy queue, marking the proxies done so that
+        proxy_queue.join() does not wait for them
         """
+        while True:
+            try:
+                self.proxy_queue.get_nowait()
+            except queue.Empty:
+                return
+            self.proxy_queue.task_done()
+
+    def enqueue_proxies(self):
+        """Put proxies to check in queue, or start the feeder in streaming mode
+        """
+        if self.feeder is not None:
+            # start_feeder() was called already
+            return
+
+        if self.stream and not self.proxy_found:
+            # check proxies while plugins are still being scraped
+            self.start_feeder()
+            return
+
         if not self.proxy_found:
             self.get_proxies()
 
+        proxies = self.proxy_found
+        if self.health_store is not None:
+            proxies = self.triage(proxies)
+
         # Put proxies in queue
-        for proxy in self.proxy_found:
+        for proxy in proxies:
             self.proxy_queue.put(proxy)
 
+    def add_worker(self):
+        """Start one more worker thread
+        """
+        t = Worker(self.url, self.proxy_queue, self.result_queue, self.timeouts,
+                   self.prefilter_timeout, self.feeding if self.feeder else None,
+                   self.limiter, self.quota, self.tracker, self.metrics, self.profile)
+        t.start()
+        self.threads.append(t)
+
+    def start(self):
+        """Start threads and processes
+        """
+        self.enqueue_proxies()
+
         # Create threads
-        for _ in range(self.max_threads):
-            t = Worker(self.url, self.proxy_queue, self.result_queue, self.conn_timeout)
-            t.start()
-            self.threads.append(t)
+        for _ in range(self.get_concurrency()):
+            self.add_worker()
+        if self.limiter is not None:
+            scaler = PoolScaler(self)
+            scaler.start()
+            self.threads.append(scaler)
+        self._watch()
 
 
 if __name__ == "__main__":
@@ -245,9 +1116,4 @@ if __name__ == "__main__":
 
     pp = SimplePrinter(pf.result_queue)
     pp.start()
-
-    while not pf.is_finished():
-        time.sleep(1)
-
-    pp.stop()
-    pf.stop()
+    pp.join()
@@ -0,0 +1,224 @@
+"""On-disk cache of plugin source responses.
+
+For every source URL the cache keeps the raw body, the parsed proxies (one
+JSON [protocol, ip, port] row per line, written and read as they stream)
+and the ETag/Last-Modified validators. A source younger than max_age is served
+from disk without any request, an older one is revalidated with a
+conditional GET and served from disk on 304 Not Modified.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from . import __version__
+from .models import Proxy
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "proxyfinder", "sources")
+
+MAX_AGE = 300
+
+
+class CacheEntry:
+    """Cached source response
+    """
+
+    def __init__(self, cache, url, meta):
+        self.cache = cache
+        self.url = url
+        self.etag = meta.get("etag")
+        self.last_modified = meta.get("last_modified")
+        self.fetched = meta.get("fetched", 0)
+        self.version = meta.get("version")
+
+    def age(self, now=None):
+        """Seconds since the source was last downloaded or revalidated
+        """
+        now = time.time() if now is None else now
+        return now - self.fetched
+
+    def validators(self):
+        """Conditional request headers
+
+        Returns:
+            dict: If-None-Match and If-Modified-Since headers
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def body(self):
+        """Raw response body
+
+        Returns:
+            bytes: Body
+        """
+        with open(self.cache.path_for(self.url, "body"), "rb") as f:
+            return f.read()
+
+    def proxies(self):
+        """Parsed proxies, None if they were parsed by another version of
+        proxyfinder and the body has to be parsed again
+
+        Returns:
+            iterator: Proxy objects, read from disk as they are consumed
+        """
+        if self.version != __version__:
+            return None
+        try:
+            f = open(self.cache.path_for(self.url, "proxies"), "r")
+        except OSError:
+            return None
+        return self._read_proxies(f)
+
+    @staticmethod
+    def _read_proxies(f):
+        with f:
+            for line in f:
+                protocol, ip, port = json.loads(line)
+                yield Proxy(protocol, ip, port)
+
+
+class ProxyWriter:
+    """File receiving the parsed proxies of a source while they are parsed
+
+    Args:
+        path (str): File path
+    """
+
+    def __init__(self, path):
+        self._file = open(path, "w")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, proxy):
+        """Append a proxy
+
+        Args:
+            proxy (Proxy): Parsed proxy
+        """
+        self._file.write(json.dumps((proxy["protocol"], proxy["ip"], proxy["port"])) + "\n")
+
+    def close(self):
+        """Close the file
+        """
+        self._file.close()
+
+
+class SourceCache:
+    """Directory of cached source responses
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_age=MAX_AGE):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_age = max_age
+
+    def path_for(self, url, kind):
+        """Return the path of a cache file
+
+        Args:
+            url (str): Source url
+            kind (str): meta, body or proxies
+
+        Returns:
+            str: File path
+        """
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:20]
+        return os.path.join(self.path, f"{key}.{kind}")
+
+    def _write(self, path, data):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def get(self, url):
+        """Retrive the cache entry for url
+
+        Args:
+            url (str): Source url
+
+        Returns:
+            CacheEntry: Cached response, None if missing
+        """
+        try:
+            with open(self.path_for(url, "meta"), "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self.path_for(url, "body")):
+            return None
+        return CacheEntry(self, url, meta)
+
+    def body_writer(self, url):
+        """Open the file receiving a new body for url, store() makes it the
+        cached one
+
+        Args:
+            url (str): Source url
+
+        Returns:
+            file: Binary file object
+        """
+        return open(self.path_for(url, "body") + ".tmp", "wb")
+
+    def proxy_writer(self, url):
+        """Open the file receiving the parsed proxies of a new body for url,
+        store() or store_proxies() makes it the cached one
+
+        Args:
+            url (str): Source url
+
+        Returns:
+            ProxyWriter: Writer
+        """
+        return ProxyWriter(self.path_for(url, "proxies") + ".tmp")
+
+    def store(self, url, headers):
+        """Save a downloaded source, its body and proxies were written with
+        body_writer() and proxy_writer()
+
+        Args:
+            url (str): Source url
+            headers (dict): Response headers
+        """
+        body_path = self.path_for(url, "body")
+        os.replace(body_path + ".tmp", body_path)
+        self.store_proxies(url)
+        self._write(self.path_for(url, "meta"), {
+            "url": url,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "fetched": time.time(),
+            "version": __version__,
+        })
+
+    def store_proxies(self, url):
+        """Save the parsed proxies of a source, written with proxy_writer()
+
+        Args:
+            url (str): Source url
+        """
+        proxies_path = self.path_for(url, "proxies")
+        os.replace(proxies_path + ".tmp", proxies_path)
+
+    def touch(self, url, **updates):
+        """Update the metadata of a cached source, e.g. fetched=time.time()
+        after a 304 Not Modified
+
+        Args:
+            url (str): Source url
+        """
+        with open(self.path_for(url, "meta"), "r") as f:
+            meta = json.load(f)
+        meta.update(updates)
+        self._write(self.path_for(url, "meta"), meta)
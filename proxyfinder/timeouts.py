@@ -0,0 +1,83 @@
+"""Check timeouts.
+
+A check has three limits: connecting to the proxy, waiting for data once
+connected, and the whole check, redirects included. TimeoutPolicy holds
+them and, in adaptive mode, tightens them to a multiple of the p95 timings
+of the working proxies seen so far: a blackholed proxy then costs a
+fraction of the configured timeout. Adaptive values never exceed the
+configured ones.
+"""
+
+import collections
+import threading
+
+DEADLINE_ERROR = "Check deadline exceeded"
+
+
+def _p95(values):
+    values = sorted(values)
+    return values[int(0.95 * (len(values) - 1))]
+
+
+class TimeoutPolicy:
+    """Connect, read and total timeouts of a check
+
+    Args:
+        connect (float, optional): Max time to connect to the proxy. Defaults to 3.05.
+        read (float, optional): Max time waiting for data. Defaults to connect.
+        total (float, optional): Max time for the whole check. Defaults to no limit.
+        adaptive (bool, optional): Follow the timings of working proxies. Defaults to False.
+        factor (float, optional): Adaptive timeouts are factor times the p95. Defaults to 3.0.
+        min_samples (int, optional): Working proxies needed before adapting. Defaults to 30.
+        floor (float, optional): Lowest adaptive timeout. Defaults to 0.5.
+        window (int, optional): Recent working proxies considered. Defaults to 512.
+    """
+
+    def __init__(self, connect=3.05, read=None, total=None, adaptive=False, factor=3.0,
+                 min_samples=30, floor=0.5, window=512):
+        self.connect = connect
+        self.read = connect if read is None else read
+        self.total = total
+        self.adaptive = adaptive
+        self.factor = factor
+        self.min_samples = min_samples
+        self.floor = floor
+        self._samples = collections.deque(maxlen=window)
+        self._pending = 0
+        self._current = (self.connect, self.read, self.total)
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Timeouts to use for the next check
+
+        Returns:
+            tuple: connect, read and total timeouts, total None if unlimited
+        """
+        return self._current
+
+    def record(self, proxy):
+        """Learn from a checked proxy, in adaptive mode
+
+        Args:
+            proxy (Proxy|dict): Checked proxy, only working ones with timings count
+        """
+        if not self.adaptive or proxy["error"] or proxy.get("total_time") is None:
+            return
+        connect = proxy.get("connect_time") or 0.0
+        read = max(0.0, (proxy.get("ttfb") or connect) - connect)
+        with self._lock:
+            self._samples.append((connect, read, proxy["total_time"]))
+            self._pending += 1
+            # sorting the window on every check is not worth it
+            if len(self._samples) >= self.min_samples and self._pending >= 8:
+                self._pending = 0
+                self._current = self._adapt()
+
+    def _adapt(self):
+        connect, read, total = zip(*self._samples)
+        connect = min(self.connect, max(self.floor, self.factor * _p95(connect)))
+        read = min(self.read, max(self.floor, self.factor * _p95(read)))
+        total = max(self.floor, self.factor * _p95(total))
+        if self.total is not None:
+            total = min(self.total, total)
+        return connect, read, total
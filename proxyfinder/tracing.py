@@ -0,0 +1,229 @@
+"""Per-phase tracing of the checks.
+
+With tracing on, every check records when it enters each phase:
+
+    prefilter  TCP connect and handshake of the prefilter stage
+    dns        resolving the target, when done here (SOCKS4, SOCKS5)
+    connect    TCP connection to the proxy
+    handshake  SOCKS negotiation or HTTP CONNECT tunnel
+    tls        TLS with the target, for https urls
+    ttfb       sending the request and waiting for the response head
+    body       downloading the response body
+
+The trace is kept in a context variable while the check runs, so the
+connection code marks the phases without it being passed around; threads
+and asyncio tasks each see their own. The checkers built on requests see
+DNS inside the SOCKS handshake, where PySocks does it.
+
+A finished check carries its trace in proxy["trace"]: [phase, start, end]
+entries in seconds from the start of the check, one per phase entered, a
+phase entered again (redirects) gets one more entry. A failed check ends in
+the phase it failed in, which shows where the timeouts go.
+
+Profile aggregates the traces of a run and reports where the wall time went.
+It counts every check, but keeps the phase durations of the last window
+checks only for the percentiles, so a daemon can trace without end.
+"""
+
+import collections
+import contextlib
+import contextvars
+import statistics
+import threading
+import time
+
+PHASES = ("prefilter", "dns", "connect", "handshake", "tls", "ttfb", "body")
+
+_current = contextvars.ContextVar("proxyfinder_trace", default=None)
+
+
+class Trace:
+    """Phase timestamps of one check
+    """
+
+    __slots__ = ("start", "entries", "_phase", "_since")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.entries = []
+        self._phase = None
+        self._since = self.start
+
+    def mark(self, phase, now=None):
+        """Enter a phase, leaving the current one
+
+        Args:
+            phase (str): Phase name, see PHASES
+            now (float, optional): time.perf_counter() value. Defaults to now.
+        """
+        now = time.perf_counter() if now is None else now
+        if phase == self._phase:
+            return
+        self.end(now)
+        self._phase = phase
+        self._since = now
+
+    def end(self, now=None):
+        """Leave the current phase
+
+        Args:
+            now (float, optional): time.perf_counter() value. Defaults to now.
+        """
+        now = time.perf_counter() if now is None else now
+        if self._phase is not None:
+            self.entries.append([self._phase, self._since - self.start, now - self.start])
+            self._phase = None
+
+
+@contextlib.contextmanager
+def active(trace):
+    """Make trace the one marked by mark() in the current context, and end
+    it on exit. Does nothing if trace is None.
+
+    Args:
+        trace (Trace): Trace of the check, or None
+    """
+    if trace is None:
+        yield
+        return
+    token = _current.set(trace)
+    try:
+        yield
+    finally:
+        trace.end()
+        _current.reset(token)
+
+
+def mark(phase):
+    """Enter a phase of the check running in this context, if it is traced
+
+    Args:
+        phase (str): Phase name, see PHASES
+    """
+    trace = _current.get()
+    if trace is not None:
+        trace.mark(phase)
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Profile:
+    """Thread safe aggregate of the check traces of a run
+
+    Args:
+        window (int, optional): Durations kept per phase for the percentiles.
+            Defaults to 10000.
+    """
+
+    def __init__(self, window=10000):
+        self.window = window
+        self.checks = 0
+        self.failed = 0
+        # by phase: durations of the last window checks, and checks, total seconds of all
+        self.phases = {}
+        self.totals = {}
+        self.results = {}
+        self._first = None
+        self._last = None
+        self._lock = threading.Lock()
+
+    def add(self, proxy, now=None):
+        """Count a traced check
+
+        Args:
+            proxy (Proxy|dict): Checked proxy, with its trace
+            now (float, optional): time.monotonic() value at the end of the check.
+                Defaults to now.
+        """
+        entries = proxy.get("trace")
+        if not entries:
+            return
+        now = time.monotonic() if now is None else now
+        elapsed = max(end for _, _, end in entries)
+        error = proxy.get("error") or ""
+        with self._lock:
+            self.checks += 1
+            if error:
+                self.failed += 1
+            if self._first is None or now - elapsed < self._first:
+                self._first = now - elapsed
+            if self._last is None or now > self._last:
+                self._last = now
+            spent = {}
+            for phase, start, end in entries:
+                spent[phase] = spent.get(phase, 0.0) + end - start
+            for phase, seconds in spent.items():
+                values = self.phases.get(phase)
+                if values is None:
+                    values = self.phases[phase] = collections.deque(maxlen=self.window)
+                values.append(seconds)
+                count, total = self.totals.get(phase, (0, 0.0))
+                self.totals[phase] = (count + 1, total + seconds)
+            # failed checks by the phase they failed in
+            last_phase = max(entries, key=lambda entry: entry[2])[0]
+            key = (error or "ok", "" if not error else last_phase)
+            count, total = self.results.get(key, (0, 0.0))
+            self.results[key] = (count + 1, total + elapsed)
+
+    def summary(self):
+        """Aggregate figures of the run
+
+        Returns:
+            dict: checks, failed, wall (seconds from the first check start
+                  to the last check end), busy (check seconds, all checks
+                  summed), phases (by name: checks, total, mean, p50, p95
+                  seconds, the percentiles over the last window checks, and
+                  share of busy) and results (error, phase it
+                  ended in, checks, total seconds), slowest first
+        """
+        with self._lock:
+            phases = {phase: list(values) for phase, values in self.phases.items()}
+            totals = dict(self.totals)
+            results = dict(self.results)
+            checks, failed = self.checks, self.failed
+            wall = (self._last - self._first) if checks else 0.0
+        busy = sum(total for _, total in results.values())
+        summary = {"checks": checks, "failed": failed, "wall": wall, "busy": busy,
+                   "phases": {}, "results": []}
+        for phase in sorted(phases, key=lambda name: PHASES.index(name)
+                            if name in PHASES else len(PHASES)):
+            values = phases[phase]
+            count, total = totals[phase]
+            summary["phases"][phase] = {
+                "checks": count, "total": total, "mean": total / count,
+                "p50": statistics.median(values), "p95": _percentile(values, 0.95),
+                "share": total / busy if busy else 0.0}
+        for (error, phase), (count, total) in sorted(results.items(),
+                                                     key=lambda item: -item[1][1]):
+            summary["results"].append({"error": error, "phase": phase,
+                                       "checks": count, "total": total})
+        return summary
+
+    def report(self):
+        """Format the profile as a text report
+
+        Returns:
+            str: Report
+        """
+        summary = self.summary()
+        if not summary["checks"]:
+            return "No traced checks."
+        wall, busy = summary["wall"], summary["busy"]
+        lines = [f"Profile of {summary['checks']} checks ({summary['failed']} failed): "
+                 f"{wall:.1f} s wall, {busy:.1f} s of checks, "
+                 f"{busy / wall if wall else 0:.1f} in flight on average",
+                 "",
+                 f"{'phase':<10} {'checks':>7} {'total s':>9} {'share':>6} "
+                 f"{'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8}"]
+        for phase, row in summary["phases"].items():
+            lines.append(f"{phase:<10} {row['checks']:>7} {row['total']:>9.2f} "
+                         f"{row['share']:>6.1%} {row['mean'] * 1000:>8.0f} "
+                         f"{row['p50'] * 1000:>8.0f} {row['p95'] * 1000:>8.0f}")
+        lines += ["", f"{'result':<42} {'ended in':<10} {'checks':>7} {'total s':>9}"]
+        for row in summary["results"]:
+            lines.append(f"{row['error'][:42]:<42} {row['phase'] or '-':<10} "
+                         f"{row['checks']:>7} {row['total']:>9.2f}")
+        return "\n".join(lines)
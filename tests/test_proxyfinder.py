@@ -3,9 +3,74 @@
 """Tests for `proxyfinder` package."""
 
 
+import asyncio
+import errno
+import os
+import socket
+import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import requests
 
 from proxyfinder import proxyfinder
+from proxyfinder import asyncfinder
+from proxyfinder import plugins
+from proxyfinder import health
+from proxyfinder import dedup
+from proxyfinder import sourcecache
+from proxyfinder import concurrency
+from proxyfinder import progress
+from proxyfinder import timeouts
+from proxyfinder import processfinder
+from proxyfinder import distributed
+from proxyfinder import metrics
+from proxyfinder import tracing
+from proxyfinder import daemon
+from proxyfinder import api
+from proxyfinder.models import Proxy
+
+
+class StubProxyHandler(BaseHTTPRequestHandler):
+    """HTTP proxy stand-in answering every forwarded request with 200"""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_proxy():
+    """Start a stub proxy on a free local port, returns the server"""
+    server = HTTPServer(("127.0.0.1", 0), StubProxyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+                         "benchmarks", "data")
+
+
+def load_page(filename):
+    """Read a saved source page"""
+    with open(os.path.join(DATA_PATH, filename), "rb") as f:
+        return f.read()
+
+
+def closed_port(test):
+    """Return a local port nobody is listening on, held until the test ends
+    so that no other server gets it"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    test.addCleanup(sock.close)
+    return sock.getsockname()[1]
 
 
 class TestProxyfinder(unittest.TestCase):
@@ -19,3 +84,981 @@ class TestProxyfinder(unittest.TestCase):
 
     def test_000_something(self):
         """Test something."""
+
+
+class TestAsyncProxyFinder(unittest.TestCase):
+    """Tests for the asyncio checking engine."""
+
+    def setUp(self):
+        self.server = start_stub_proxy()
+        self.port = self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_check_working_proxy(self):
+        proxy = {"protocol": "http", "ip": "127.0.0.1", "port": self.port}
+        res = asyncio.run(asyncfinder.async_check_proxy(proxy, "http://example.invalid/", 2))
+        self.assertEqual(res["error"], "")
+
+    def test_check_dead_proxy(self):
+        proxy = {"protocol": "http", "ip": "127.0.0.1", "port": closed_port(self)}
+        res = asyncio.run(asyncfinder.async_check_proxy(proxy, "http://example.invalid/", 2))
+        self.assertEqual(res["error"], "Connection error")
+
+    def test_dns_cache(self):
+        async def resolve():
+            loop = asyncio.get_running_loop()
+            cache = asyncfinder._DnsCache()
+            ips = await asyncio.gather(*(cache.resolve(loop, "localhost", 80, socket.AF_INET)
+                                         for _ in range(3)))
+            # numeric hosts are not looked up
+            ips.append(await cache.resolve(loop, "10.0.0.1", 80))
+            return ips, len(cache._entries)
+        self.assertEqual(asyncio.run(resolve()), (["127.0.0.1"] * 3 + ["10.0.0.1"], 1))
+
+    def test_engine_checks_every_proxy(self):
+        pf = asyncfinder.AsyncProxyFinder("http://example.invalid/", max_concurrency=4,
+                                          conn_timeout=2)
+        pf.proxy_found = [{"protocol": "http", "ip": "127.0.0.1", "port": self.port}
+                          for _ in range(10)]
+        pf.start()
+        pf.threads[0].join(10)
+        self.assertTrue(pf.is_finished())
+        results = pf.get_last_results()
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(not res["error"] for res in results))
+
+
+class TestPrefilter(unittest.TestCase):
+    """Tests for the TCP connect prefilter stage."""
+
+    def setUp(self):
+        self.server = start_stub_proxy()
+        self.port = self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_prefilter(self):
+        alive = {"protocol": "http", "ip": "127.0.0.1", "port": self.port}
+        dead = {"protocol": "http", "ip": "127.0.0.1", "port": closed_port(self)}
+        url = "http://example.invalid/"
+        self.assertEqual(proxyfinder.prefilter_proxy(alive, url), "")
+        self.assertEqual(proxyfinder.prefilter_proxy(dead, url), "Connection error")
+        self.assertEqual(asyncio.run(asyncfinder.async_prefilter_proxy(alive, url)), "")
+        self.assertEqual(asyncio.run(asyncfinder.async_prefilter_proxy(dead, url)),
+                         "Connection error")
+
+
+class TestAdaptiveLimit(unittest.TestCase):
+    """Tests for the AIMD concurrency controller."""
+
+    def run_window(self, limit, now, errors):
+        for error in errors:
+            limit.record(error, now)
+        return limit.limit
+
+    def test_grows_and_backs_off(self):
+        limit = concurrency.AdaptiveLimit(initial=10, maximum=18, increase=5)
+        now = time.monotonic()
+        self.assertEqual(self.run_window(limit, now + 1, [""] * 20), 15)
+        self.assertEqual(self.run_window(limit, now + 2, [""] * 20), 18)
+        # out of file descriptors: halve
+        self.assertEqual(self.run_window(limit, now + 3, [concurrency.LOCAL_ERROR] * 20), 9)
+        # timeouts well above the usual ratio: halve
+        self.assertEqual(self.run_window(limit, now + 4, ["Server did not send any data"] * 20), 4)
+
+    def test_fd_ceiling(self):
+        self.assertGreater(concurrency.fd_ceiling(), 0)
+        limit = concurrency.AdaptiveLimit(initial=10 ** 6)
+        self.assertEqual(limit.limit, concurrency.fd_ceiling())
+
+    def test_is_local_error(self):
+        try:
+            try:
+                raise OSError(errno.EMFILE, "Too many open files")
+            except OSError as e:
+                raise ValueError("wrapped") from e
+        except ValueError as e:
+            self.assertTrue(concurrency.is_local_error(e))
+        self.assertFalse(concurrency.is_local_error(ConnectionRefusedError()))
+
+    def test_adaptive_engines(self):
+        server = start_stub_proxy()
+        proxy = {"protocol": "http", "ip": "127.0.0.1", "port": server.server_address[1]}
+        try:
+            for pf in (proxyfinder.ProxyFinder("http://example.invalid/", max_threads=2,
+                                               conn_timeout=2, adaptive=True),
+                       asyncfinder.AsyncProxyFinder("http://example.invalid/",
+                                                    max_concurrency=2, conn_timeout=2,
+                                                    adaptive=True)):
+                pf.proxy_found = [Proxy(**proxy) for _ in range(30)]
+                pf.start()
+                deadline = time.monotonic() + 20
+                while not pf.is_finished() and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                results = pf.get_last_results()
+                self.assertEqual(len(results), 30)
+                self.assertTrue(all(not res.error for res in results))
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_scaler_prunes_workers(self):
+        pf = proxyfinder.ProxyFinder("http://example.invalid/", max_threads=2, adaptive=True)
+        for _ in range(3):
+            # nothing to check, they end right away
+            pf.add_worker()
+        for t in pf.threads:
+            t.join()
+        pf.threads[0].stop()
+        self.assertTrue(pf.threads[0].stopping)
+        self.assertFalse(proxyfinder.PoolScaler(pf).scale())
+        self.assertEqual(pf.threads, [])
+
+
+class TestProgress(unittest.TestCase):
+    """Tests for the progress snapshot and its time estimate."""
+
+    def test_eta_follows_completion_rate(self):
+        tracker = progress.ProgressTracker()
+        # before any check: worst case over the concurrency
+        self.assertEqual(tracker.snapshot(100, 10, 3.0, now=0).eta, 30.0)
+        for second in range(1, 6):
+            for _ in range(50):
+                tracker.started()
+                tracker.finished("" if second % 2 else "Connection error", 0.2)
+            snap = tracker.snapshot(1000 - 50 * second, 10, 3.0, now=second)
+        self.assertEqual(snap.done, 250)
+        self.assertEqual(snap.working, 150)
+        self.assertEqual(snap.in_flight, 0)
+        self.assertAlmostEqual(snap.rate, 50)
+        self.assertAlmostEqual(snap.eta, 750 / 50)
+        self.assertEqual(progress.format_eta(snap.eta), "00:00:15")
+        self.assertEqual(progress.format_eta(None), "--:--:--")
+
+
+class FakePlugin(plugins.PluginBase):
+    """Plugin stand-in yielding fixed records without network"""
+
+    DATA = [{"protocol": "http", "ip": "10.0.0.1", "port": 8080}]
+    DELAY = 0
+
+    def get_request(self):
+        time.sleep(self.DELAY)
+
+    def get_data(self):
+        yield from self.DATA
+
+
+class SlowPlugin(FakePlugin):
+    DATA = [{"protocol": "http", "ip": "10.0.0.2", "port": 8080}]
+    DELAY = 2
+
+
+class BrokenPlugin(FakePlugin):
+    def get_data(self):
+        raise ValueError("layout changed")
+
+
+class BadRecordPlugin(FakePlugin):
+    DATA = [{"protocol": "http", "ip": "10.0.0.3", "port": 8080},
+            {"protocol": "http", "ip": "10.0.0.4", "port": 8080, "country": "IT"}]
+
+
+class TestGetProxyList(unittest.TestCase):
+    """Tests for plugin scraping."""
+
+    def test_failing_and_slow_plugins_are_skipped(self):
+        sources = {}
+        with mock.patch.object(proxyfinder, "PLUGINS", [SlowPlugin, BrokenPlugin, FakePlugin]):
+            start = time.monotonic()
+            proxy_list = list(proxyfinder.iter_proxy_list(
+                timeout=0.5, on_source=lambda name, *state: sources.update({name: state})))
+        self.assertLess(time.monotonic() - start, 1.5)
+        self.assertEqual([proxy.url for proxy in proxy_list], ["http://10.0.0.1:8080"])
+        self.assertEqual(proxy_list[0].source, "FakePlugin")
+        self.assertEqual(sources["FakePlugin"], (1, ""))
+        self.assertEqual(sources["SlowPlugin"], (0, "Timed out"))
+        self.assertEqual(sources["BrokenPlugin"][0], 0)
+        self.assertTrue(sources["BrokenPlugin"][1])
+
+    def test_bad_record_fails_its_plugin_only(self):
+        sources = {}
+        with mock.patch.object(proxyfinder, "PLUGINS", [BadRecordPlugin, FakePlugin]):
+            proxy_list = proxyfinder.get_proxy_list(
+                timeout=2, on_source=lambda name, *state: sources.update({name: state}))
+        self.assertIn("http://10.0.0.1:8080", [proxy.url for proxy in proxy_list])
+        self.assertNotIn("http://10.0.0.4:8080", [proxy.url for proxy in proxy_list])
+        self.assertEqual(sources["FakePlugin"], (1, ""))
+        self.assertTrue(sources["BadRecordPlugin"][1])
+
+
+class TestStreaming(unittest.TestCase):
+    """Tests for checking proxies while they are being scraped."""
+
+    def setUp(self):
+        self.server = start_stub_proxy()
+        self.port = self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def slow_source(self, **kwargs):
+        for _ in range(5):
+            time.sleep(0.2)
+            yield {"protocol": "http", "ip": "127.0.0.1", "port": self.port}
+
+    def test_stream_checks_while_scraping(self):
+        for engine in (proxyfinder.ProxyFinder, asyncfinder.AsyncProxyFinder):
+            pf = engine("http://example.invalid/", -1, 2, 2, stream=True)
+            with mock.patch.object(proxyfinder, "iter_proxy_list", self.slow_source):
+                pf.start()
+                # the first result arrives before the source is exhausted
+                first = pf.result_queue.get(timeout=5)
+                self.assertTrue(pf.is_feeding())
+                for thread in pf.threads:
+                    thread.join(10)
+            self.assertEqual(len(pf.proxy_found), 5)
+            self.assertEqual(len(pf.get_last_results()) + 1, 5)
+            self.assertEqual(first["error"], "")
+
+
+class TestHealthStore(unittest.TestCase):
+    """Tests for the persistent health cache."""
+
+    def test_fresh_results_skip_the_check(self):
+        store = health.HealthStore(":memory:", ok_ttl=60, fail_ttl=600)
+        now = time.time()
+        store.record([{"protocol": "http", "ip": "10.0.0.1", "port": 80, "error": ""},
+                      {"protocol": "http", "ip": "10.0.0.2", "port": 80, "error": "Connection error"}],
+                     "example.com", now - 10)
+        store.record([{"protocol": "http", "ip": "10.0.0.3", "port": 80, "error": ""}],
+                     "example.com", now - 120)
+
+        pf = proxyfinder.ProxyFinder("http://example.com/", health_store=store)
+        proxies = [{"protocol": "http", "ip": f"10.0.0.{i}", "port": 80} for i in range(1, 5)]
+        to_check = list(pf.triage(proxies))
+        self.assertEqual([p["ip"] for p in to_check], ["10.0.0.3", "10.0.0.4"])
+        cached = pf.get_last_results()
+        self.assertEqual([(p["ip"], p["error"]) for p in cached],
+                         [("10.0.0.1", ""), ("10.0.0.2", "Connection error")])
+
+        pf.skip_failed = False
+        to_check = list(pf.triage(proxies))
+        self.assertEqual([p["ip"] for p in to_check], ["10.0.0.3", "10.0.0.4", "10.0.0.2"])
+        store.close()
+
+
+class TestProxyIndex(unittest.TestCase):
+    """Tests for the dedup index."""
+
+    def test_keyed_on_full_endpoint(self):
+        index = dedup.ProxyIndex()
+        proxies = [{"protocol": "http", "ip": "10.0.0.1", "port": 80},
+                   {"protocol": "http", "ip": "10.0.0.1", "port": 8080},
+                   {"protocol": "socks5", "ip": "10.0.0.1", "port": 80},
+                   {"protocol": "http", "ip": "2001:db8::1", "port": 80},
+                   {"protocol": "http", "ip": "proxy.example.com", "port": 80},
+                   {"protocol": "http", "ip": "10.0.0.1", "port": 80},
+                   {"protocol": "http", "ip": "2001:db8:0::1", "port": 80}]
+        added = [index.add(proxy) for proxy in proxies]
+        self.assertEqual(added, [True, True, True, True, True, False, False])
+        self.assertEqual(len(index), 5)
+
+    def test_pack_roundtrip(self):
+        for endpoint in (("socks4", "1.2.3.4", 1080), ("https", "::ffff:1.2.3.4", 443)):
+            self.assertEqual(dedup.unpack_key(dedup.pack_key(*endpoint)), endpoint)
+
+
+class TestProxy(unittest.TestCase):
+    """Tests for the Proxy record type."""
+
+    def test_dict_compat(self):
+        proxy = Proxy("socks5", "10.0.0.1", 1080)
+        self.assertEqual(proxy.url, "socks5://10.0.0.1:1080")
+        self.assertEqual("{protocol}://{ip}:{port}".format(**proxy), proxy.url)
+        self.assertEqual(proxy, {"protocol": "socks5", "ip": "10.0.0.1", "port": 1080})
+        with self.assertRaises(KeyError):
+            proxy["error"]  # pylint: disable=pointless-statement
+        proxy["error"] = ""
+        self.assertEqual(proxy.get("error"), "")
+        self.assertIsNone(proxy.get("latency"))
+        proxy["port"] = 1081
+        self.assertEqual(proxy.url, "socks5://10.0.0.1:1081")
+
+
+class TestFreeProxyListNet(unittest.TestCase):
+    """Tests for the free-proxy-list.net parsers."""
+
+    def test_fast_path_matches_soup(self):
+        page = load_page("free-proxy-list.html")
+        fast = plugins.FreeProxyListNet.parse_fast(page)
+        self.assertEqual(len(fast), 300)
+        self.assertEqual(fast, list(plugins.FreeProxyListNet.parse_soup(page)))
+
+    def test_unknown_layout_falls_back(self):
+        page = load_page("free-proxy-list.html").replace(b"<th>Port</th>", b"<th>Porta</th>")
+        self.assertIsNone(plugins.FreeProxyListNet.parse_fast(page))
+        plugin = plugins.FreeProxyListNet()
+        plugin.response = mock.Mock(content=page)
+        self.assertEqual(len(list(plugin.get_data())), 300)
+
+
+class TestProxyScrapeCom(unittest.TestCase):
+    """Tests for the streaming text list parser."""
+
+    def test_parse_lines(self):
+        chunks = [b"1.2.3.4:80\r\n5.6.7", b".8:8080\nbad line\n:\n9.9.9.9:99999\r\n",
+                  b" 1.1.1.1:1 \n2.2.2.2:3"]
+        proxies = plugins.ProxyScrapeComBase.parse_lines(chunks, "socks4")
+        self.assertEqual([proxy.url for proxy in proxies],
+                         ["socks4://1.2.3.4:80", "socks4://5.6.7.8:8080",
+                          "socks4://1.1.1.1:1", "socks4://2.2.2.2:3"])
+
+
+class StubSourceHandler(BaseHTTPRequestHandler):
+    """Proxy list source answering conditional requests"""
+
+    BODY = b"10.0.0.1:8080\r\n10.0.0.2:3128\r\n"
+    requests = []
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.requests.append(304)
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.requests.append(200)
+        self.send_response(200)
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(self.BODY)))
+        self.end_headers()
+        self.wfile.write(self.BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestSourceCache(unittest.TestCase):
+    """Tests for the plugin source cache."""
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), StubSourceHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.tmp = tempfile.TemporaryDirectory()
+        StubSourceHandler.requests = []
+
+        class LocalSource(plugins.ProxyScrapeComBase):
+            HOST = f"http://127.0.0.1:{self.server.server_address[1]}/list"
+            PROTOCOL = "http"
+        self.plugin = LocalSource
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def scrape(self, cache):
+        return [proxy.url for proxy in self.plugin(5, cache).scrape()]
+
+    def test_conditional_get(self):
+        expected = ["http://10.0.0.1:8080", "http://10.0.0.2:3128"]
+        cache = sourcecache.SourceCache(self.tmp.name, max_age=0)
+        self.assertEqual(self.scrape(cache), expected)
+        self.assertEqual(self.scrape(cache), expected)
+        self.assertEqual(StubSourceHandler.requests, [200, 304])
+
+        cache.max_age = 60
+        self.assertEqual(self.scrape(cache), expected)
+        self.assertEqual(StubSourceHandler.requests, [200, 304])
+        self.assertEqual(cache.get(self.plugin.HOST).body(), StubSourceHandler.BODY)
+
+        # proxies parsed by another version are parsed again from the body
+        cache.touch(self.plugin.HOST, version="0")
+        self.assertIsNone(cache.get(self.plugin.HOST).proxies())
+        self.assertEqual(self.scrape(cache), expected)
+        self.assertEqual([proxy.url for proxy in cache.get(self.plugin.HOST).proxies()],
+                         expected)
+        self.assertEqual(StubSourceHandler.requests, [200, 304])
+
+
+class TestEnginesAgree(unittest.TestCase):
+    """Both engines through the benchmark stand-in proxies."""
+
+    def test_http_and_socks(self):
+        from benchmarks import servers
+        # "https" is a clear text HTTP proxy able to tunnel, for both engines
+        specs = [(protocol, behaviour) for protocol in ("http", "https", "socks4", "socks5")
+                 for behaviour in ("ok", "fail", "dead")]
+        with servers.StandIns(specs) as stand_ins:
+            for protocol, ip, port, behaviour in stand_ins.proxies():
+                res = proxyfinder.check_proxy(Proxy(protocol, ip, port), stand_ins.target_url, 2)
+                ares = asyncio.run(asyncfinder.async_check_proxy(
+                    Proxy(protocol, ip, port), stand_ins.target_url, 2))
+                self.assertEqual(res.error == "", behaviour == "ok", (protocol, behaviour))
+                self.assertEqual(ares.error == "", behaviour == "ok", (protocol, behaviour))
+                if behaviour == "ok":
+                    for r in (res, ares):
+                        self.assertLessEqual(r.connect_time, r.ttfb)
+                        self.assertLessEqual(r.ttfb, r.total_time)
+                        self.assertEqual(r.latency, r.total_time)
+
+    def test_timings(self):
+        from benchmarks import servers
+        # the stand-ins wait before the SOCKS handshake, or before the answer
+        # of an absolute-form HTTP request
+        with servers.StandIns([("socks5", "ok"), ("http", "ok")], latency=0.3) as stand_ins:
+            for protocol, ip, port, _ in stand_ins.proxies():
+                for res in (proxyfinder.check_proxy(Proxy(protocol, ip, port),
+                                                    stand_ins.target_url, 2),
+                            asyncio.run(asyncfinder.async_check_proxy(
+                                Proxy(protocol, ip, port), stand_ins.target_url, 2))):
+                    self.assertEqual(res.error, "")
+                    if protocol == "socks5":
+                        self.assertGreaterEqual(res.connect_time, 0.3)
+                    else:
+                        self.assertLess(res.connect_time, 0.3)
+                    self.assertGreaterEqual(res.ttfb, 0.3)
+                    self.assertLessEqual(res.ttfb, res.total_time)
+
+    def test_fastest(self):
+        results = [Proxy("http", "10.0.0.1", 80, error="", latency=0.3),
+                   Proxy("http", "10.0.0.2", 80, error="Timeout"),
+                   Proxy("http", "10.0.0.3", 80, error="", latency=0.1),
+                   Proxy("http", "10.0.0.4", 80, error="", latency=0.2)]
+        self.assertEqual([res.ip for res in proxyfinder.fastest(results, 2)],
+                         ["10.0.0.3", "10.0.0.4"])
+
+
+class TestEarlyExit(unittest.TestCase):
+    """max_working stops both engines once enough proxies work."""
+
+    def test_stops_at_max_working(self):
+        from benchmarks import servers
+        specs = [("http", "blackhole")] * 20 + [("http", "ok")] * 5 + [("http", "blackhole")] * 20
+        with servers.StandIns(specs) as stand_ins:
+            for pf in (proxyfinder.ProxyFinder(stand_ins.target_url, max_threads=30,
+                                               conn_timeout=5, max_working=3),
+                       asyncfinder.AsyncProxyFinder(stand_ins.target_url, max_concurrency=30,
+                                                    conn_timeout=5, max_working=3)):
+                name = type(pf).__name__
+                pf.proxy_found = [Proxy(protocol, ip, port)
+                                  for protocol, ip, port, _ in stand_ins.proxies()]
+                start = time.monotonic()
+                pf.start()
+                while not pf.is_finished():
+                    time.sleep(0.05)
+                # blackholes would hold every slot for the whole timeout
+                self.assertLess(time.monotonic() - start, 4, name)
+                working = [res for res in pf.get_last_results() if not res.error]
+                self.assertEqual(len(working), 3, name)
+                self.assertEqual(pf.get_proxies_left(), 0)
+                # every proxy taken or dropped is marked done
+                joiner = threading.Thread(target=pf.proxy_queue.join, daemon=True)
+                joiner.start()
+                joiner.join(10)
+                self.assertFalse(joiner.is_alive(), name)
+
+
+class TestTimeouts(unittest.TestCase):
+    """Separate connect/read timeouts, deadline and adaptive timeouts."""
+
+    def test_deadline(self):
+        from benchmarks import servers
+        with servers.StandIns([("http", "blackhole"), ("socks5", "blackhole")]) as stand_ins:
+            for protocol, ip, port, _ in stand_ins.proxies():
+                for check in (proxyfinder.check_proxy,
+                              lambda *args: asyncio.run(asyncfinder.async_check_proxy(*args))):
+                    start = time.monotonic()
+                    res = check(Proxy(protocol, ip, port), stand_ins.target_url, 1, 5, 0.5)
+                    self.assertEqual(res.error, "Check deadline exceeded")
+                    self.assertLess(time.monotonic() - start, 1)
+
+    def test_adaptive_policy(self):
+        policy = timeouts.TimeoutPolicy(3.0, 6.0, adaptive=True, min_samples=10, floor=0.1)
+        self.assertEqual(policy.current(), (3.0, 6.0, None))
+        for i in range(40):
+            policy.record(Proxy("http", "10.0.0.1", 80, error="", connect_time=0.1,
+                                ttfb=0.3, total_time=0.4 if i else 5.0))
+        connect, read, total = policy.current()
+        self.assertAlmostEqual(connect, 0.3)
+        self.assertAlmostEqual(read, 0.6)
+        # one outlier does not move the p95
+        self.assertAlmostEqual(total, 1.2)
+        policy.record(Proxy("http", "10.0.0.1", 80, error="Connection error"))
+        self.assertEqual(policy.current(), (connect, read, total))
+
+
+class TestProcessProxyFinder(unittest.TestCase):
+    """Checks sharded over worker processes."""
+
+    def test_matches_in_process_engine(self):
+        from benchmarks import servers
+        specs = [(protocol, behaviour) for protocol in ("http", "socks4", "socks5")
+                 for behaviour in ("ok", "fail", "dead")] * 4
+        with servers.StandIns(specs) as stand_ins:
+            pf = processfinder.ProcessProxyFinder(stand_ins.target_url, max_threads=5,
+                                                  conn_timeout=2, processes=2, adaptive=True)
+            pf.proxy_found = [Proxy(protocol, ip, port)
+                              for protocol, ip, port, _ in stand_ins.proxies()]
+            pf.start()
+            deadline = time.monotonic() + 30
+            while not pf.is_finished() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            results = pf.get_last_results()
+            self.assertEqual(len(results), len(specs))
+            # the processes adapt their limits, the parent adds them up
+            self.assertIsNone(pf.limiter)
+            self.assertTrue(pf._shard_limits)
+            self.assertEqual(pf.get_concurrency(), sum(
+                pf._shard_limits.get(process.pid, 5) for process in pf._workers))
+            # results are the parent proxies, updated
+            self.assertTrue(all(any(res is proxy for proxy in pf.proxy_found)
+                                for res in results))
+            behaviours = {port: behaviour for _, _, port, behaviour in stand_ins.proxies()}
+            for res in results:
+                self.assertEqual(res.error == "", behaviours[res.port] == "ok", res)
+
+    def test_dead_process(self):
+        from benchmarks import servers
+        specs = [("http", "ok")] * 10 + [("http", "blackhole")] * 10
+        with servers.StandIns(specs) as stand_ins:
+            pf = processfinder.ProcessProxyFinder(stand_ins.target_url, max_threads=20,
+                                                  conn_timeout=10, processes=2)
+            pf.proxy_found = [Proxy(protocol, ip, port)
+                              for protocol, ip, port, _ in stand_ins.proxies()]
+            pf.start()
+            deadline = time.monotonic() + 30
+            while pf.get_progress().done < 10 and time.monotonic() < deadline:
+                time.sleep(0.05)
+            # the blackholes are in flight, in a process that goes away
+            for process in pf._workers:
+                process.kill()
+            deadline = time.monotonic() + 5
+            while not pf.is_finished() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            self.assertTrue(pf.is_finished())
+            errors = [res.error for res in pf.get_last_results()]
+            self.assertEqual(errors.count(""), 10)
+            self.assertEqual(errors.count(processfinder.SHARD_ERROR), 10)
+
+
+class TestDistributed(unittest.TestCase):
+    """Coordinator and workers on localhost."""
+
+    def test_workers_share_the_job(self):
+        from benchmarks import servers
+        specs = [(protocol, behaviour) for protocol in ("http", "socks4", "socks5")
+                 for behaviour in ("ok", "fail", "dead")] * 5
+        with servers.StandIns(specs) as stand_ins:
+            coordinator = distributed.Coordinator(stand_ins.target_url, conn_timeout=2,
+                                                  lease_size=4, lease_ttl=0.5, secret="s3cret")
+            coordinator.proxy_found = [Proxy(protocol, ip, port)
+                                       for protocol, ip, port, _ in stand_ins.proxies()]
+            coordinator.start()
+            try:
+                # a worker leasing a batch and vanishing: its lease expires
+                ghost = distributed.CoordinatorClient(coordinator.address, "s3cret")
+                ghost_lease = ghost.call("POST", "/lease", {"worker": "ghost", "size": 4})
+                self.assertEqual(len(ghost_lease["proxies"]), 4)
+                self.assertRaises(requests.HTTPError, distributed.CoordinatorClient(
+                    coordinator.address).call, "GET", "/config")
+                with self.assertRaises(requests.HTTPError) as caught:
+                    distributed.run_worker(coordinator.address, secret="wrong")
+                self.assertEqual(caught.exception.response.status_code, 403)
+                # malformed reports are refused whole, the proxies stay leased
+                token = ghost_lease["proxies"][0][0]
+                for results in ([[token, None]], [[token, {"latency": 0.1}]],
+                                [[token, {"error": None, "latency": 0.1}]], [[token]]):
+                    with self.assertRaises(requests.HTTPError) as caught:
+                        ghost.call("POST", "/report", {"worker": "ghost", "leases": [],
+                                                       "results": results})
+                    self.assertEqual(caught.exception.response.status_code, 400)
+
+                checked = []
+                workers = [threading.Thread(target=lambda i=i: checked.append(
+                    distributed.run_worker(coordinator.address, max_threads=3, lease_size=4,
+                                           secret="s3cret", use_async=i == 2)))
+                           for i in range(3)]
+                for worker in workers:
+                    worker.start()
+                for worker in workers:
+                    worker.join(30)
+                self.assertTrue(coordinator.is_finished())
+                self.assertEqual(sum(checked), len(specs))
+
+                # the ghost comes back too late, its results are ignored
+                reply = ghost.call("POST", "/report", {"worker": "ghost", "leases": [],
+                                                       "results": [[token, {"error": "", "latency": 0.1}] for
+                                                                   token, *_ in ghost_lease["proxies"]]})
+                self.assertEqual(reply["accepted"], 0)
+                results = coordinator.get_last_results()
+            finally:
+                coordinator.stop()
+
+            self.assertEqual(len(results), len(specs))
+            behaviours = {port: behaviour for _, _, port, behaviour in stand_ins.proxies()}
+            for res in results:
+                self.assertEqual(res.error == "", behaviours[res.port] == "ok", res)
+
+
+class TestResultDelivery(unittest.TestCase):
+    """Results pushed to iterators and callbacks, ending on completion."""
+
+    def test_iterators_and_callbacks(self):
+        from benchmarks import servers
+        specs = [("http", "ok"), ("socks5", "fail"), ("socks4", "dead")] * 4
+        with servers.StandIns(specs) as stand_ins:
+            def make(cls, **kwargs):
+                pf = cls(stand_ins.target_url, conn_timeout=2, **kwargs)
+                pf.proxy_found = [Proxy(protocol, ip, port)
+                                  for protocol, ip, port, _ in stand_ins.proxies()]
+                return pf
+
+            pf = make(proxyfinder.ProxyFinder, max_threads=5)
+            pf.start()
+            self.assertEqual(len(list(pf.iter_results())), len(specs))
+            self.assertTrue(pf.completed.is_set())
+            self.assertEqual(len(pf.all_results), len(specs))
+
+            async def consume(pf):
+                return [res async for res in pf.aiter_results()]
+            pf = make(asyncfinder.AsyncProxyFinder, max_concurrency=5)
+            pf.start()
+            self.assertEqual(len(asyncio.run(consume(pf))), len(specs))
+
+            pf = make(proxyfinder.ProxyFinder, max_threads=5)
+            received = []
+            done = threading.Event()
+            pf.start()
+            pf.start_dispatcher(received.append, done.set)
+            self.assertTrue(done.wait(10))
+            self.assertEqual(len(received), len(specs))
+
+    def test_stop_ends_iteration(self):
+        from benchmarks import servers
+        with servers.StandIns([("http", "blackhole")] * 3) as stand_ins:
+            pf = proxyfinder.ProxyFinder(stand_ins.target_url, max_threads=3, conn_timeout=30)
+            pf.proxy_found = [Proxy(protocol, ip, port)
+                              for protocol, ip, port, _ in stand_ins.proxies()]
+            pf.start()
+            threading.Timer(0.2, pf.stop).start()
+            start = time.monotonic()
+            self.assertEqual(list(pf.iter_results()), [])
+            self.assertLess(time.monotonic() - start, 5)
+
+
+class TestResultModel(unittest.TestCase):
+    """GUI result model: batched rows, working-only filter and sorting."""
+
+    def test_filter_and_sort(self):
+        try:
+            from PyQt5.QtCore import QCoreApplication, Qt
+        except ImportError:
+            self.skipTest("PyQt5 is not installed")
+        from proxyfinder.gui import resultmodel
+        self.app = QCoreApplication.instance() or QCoreApplication([])
+        model = resultmodel.ResultTableModel(list("#ABCDEF"), None, None)
+        view = resultmodel.ResultFilterModel()
+        view.setSourceModel(model)
+        model.append([Proxy("http", "10.0.0.1", 80, error="", latency=0.3),
+                      Proxy("http", "10.0.0.2", 81, error="Connection error")])
+        model.append([Proxy("socks5", "10.0.0.3", 1080, error="", latency=0.1)])
+        self.assertEqual(model.rowCount(), 0)
+        model.flush()
+        self.assertEqual(model.rowCount(), 3)
+
+        view.sort(resultmodel.COL_LATENCY, Qt.AscendingOrder)
+        self.assertEqual([res.ip for res in view.proxies()],
+                         ["10.0.0.3", "10.0.0.1", "10.0.0.2"])
+        view.setOnlyWorking(True)
+        self.assertEqual([res.url for res in view.proxies()],
+                         ["socks5://10.0.0.3:1080", "http://10.0.0.1:80"])
+        self.assertEqual(view.index(1, resultmodel.COL_LATENCY).data(), "300 ms")
+
+
+class TestMetrics(unittest.TestCase):
+    """Metrics registry, Prometheus text format and finder metrics."""
+
+    def test_registry(self):
+        registry = metrics.Registry()
+        counter = registry.counter("demo_total", "Demo counter.", ("kind",))
+        histogram = registry.histogram("demo_seconds", "Demo histogram.", buckets=(0.1, 1))
+        registry.gauge("demo_depth", "Demo gauge.", function=lambda: 7)
+        counter.inc("a")
+        counter.inc("a", amount=2)
+        counter.inc("b\"")
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value)
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE demo_total counter", lines)
+        self.assertIn('demo_total{kind="a"} 3', lines)
+        self.assertIn('demo_total{kind="b\\""} 1', lines)
+        self.assertIn('demo_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('demo_seconds_bucket{le="1"} 2', lines)
+        self.assertIn('demo_seconds_bucket{le="+Inf"} 3', lines)
+        self.assertIn("demo_seconds_count 3", lines)
+        self.assertIn("demo_depth 7", lines)
+        self.assertEqual(registry.snapshot()["metrics"]["demo_seconds"]["samples"][0]["count"], 3)
+        self.assertEqual(metrics.error_class("Error 403: Forbidden"), "http_403")
+        self.assertEqual(metrics.error_class("Check deadline exceeded"), "deadline")
+
+    def test_finder_metrics(self):
+        from benchmarks import servers
+        specs = [("http", "ok"), ("socks5", "ok"), ("http", "fail"), ("socks4", "dead")] * 3
+        with servers.StandIns(specs) as stand_ins:
+            pf = proxyfinder.ProxyFinder(stand_ins.target_url, max_threads=4, conn_timeout=2)
+            pf.proxy_found = [Proxy(protocol, ip, port)
+                              for protocol, ip, port, _ in stand_ins.proxies()]
+            server = metrics.MetricsServer(pf.metrics.registry, port=0)
+            server.start()
+            try:
+                pf.start()
+                self.assertEqual(len(list(pf.iter_results())), len(specs))
+                text = requests.get(server.address, timeout=5).text
+                snapshot = requests.get(server.address + ".json", timeout=5).json()
+            finally:
+                server.stop()
+        checks = {tuple(sample["labels"].values()): sample["value"] for sample in
+                  snapshot["metrics"]["proxyfinder_checks_total"]["samples"]}
+        self.assertEqual(sum(checks.values()), len(specs))
+        self.assertEqual(checks[("http", "ok")], 3)
+        self.assertEqual(checks[("socks5", "ok")], 3)
+        self.assertIn('proxyfinder_check_phase_seconds_count{phase="connect",protocol="http"} 3',
+                      text)
+        self.assertIn('proxyfinder_queue_depth{queue="proxy"} 0', text)
+
+
+class TestTracing(unittest.TestCase):
+    """Per-phase traces of the checks and the run profile."""
+
+    def test_trace(self):
+        trace = tracing.Trace()
+        trace.mark("connect", trace.start + 0.1)
+        trace.mark("connect", trace.start + 0.2)
+        trace.mark("ttfb", trace.start + 0.3)
+        trace.end(trace.start + 1.0)
+        self.assertEqual([phase for phase, _, _ in trace.entries], ["connect", "ttfb"])
+        self.assertAlmostEqual(trace.entries[1][2] - trace.entries[1][1], 0.7)
+        # marks outside an active trace are ignored
+        tracing.mark("body")
+        self.assertEqual(len(trace.entries), 2)
+
+    def test_profile_window(self):
+        profile = tracing.Profile(window=2)
+        for seconds in (1.0, 2.0, 3.0, 4.0):
+            profile.add({"error": "", "trace": [["connect", 0.0, seconds]]})
+        connect = profile.summary()["phases"]["connect"]
+        self.assertEqual(len(profile.phases["connect"]), 2)
+        self.assertEqual(connect["checks"], 4)
+        self.assertEqual(connect["total"], 10.0)
+        self.assertEqual(connect["p50"], 3.5)
+
+    def test_profile(self):
+        from benchmarks import servers
+        specs = [("http", "ok"), ("socks5", "ok"), ("socks4", "fail"), ("socks5", "dead")] * 2
+        for finder_cls, workers in ((proxyfinder.ProxyFinder, "max_threads"),
+                                    (asyncfinder.AsyncProxyFinder, "max_concurrency")):
+            with self.subTest(finder_cls.__name__), servers.StandIns(specs) as stand_ins:
+                pf = finder_cls(stand_ins.target_url, conn_timeout=2, trace=True,
+                                **{workers: 4})
+                pf.proxy_found = [Proxy(protocol, ip, port)
+                                  for protocol, ip, port, _ in stand_ins.proxies()]
+                pf.start()
+                results = list(pf.iter_results())
+                phases = {res.protocol + " " + (res.error or "ok"):
+                          [phase for phase, _, _ in res.trace] for res in results}
+                self.assertEqual(phases["http ok"], ["connect", "ttfb", "body"])
+                self.assertEqual(phases["socks5 ok"][:2], ["connect", "handshake"])
+                self.assertEqual(phases["socks5 ok"][-2:], ["ttfb", "body"])
+                self.assertEqual(phases["socks4 Connection error"][-1], "handshake")
+                self.assertEqual(phases["socks5 Connection error"], ["connect"])
+
+                summary = pf.get_profile().summary()
+                self.assertEqual(summary["checks"], len(specs))
+                self.assertEqual(summary["failed"], 4)
+                self.assertEqual(summary["phases"]["connect"]["checks"], len(specs))
+                self.assertIn({"error": "Connection error", "phase": "handshake", "checks": 2},
+                              [{key: row[key] for key in ("error", "phase", "checks")}
+                               for row in summary["results"]])
+                self.assertIn("handshake", pf.get_profile().report())
+
+
+class TestDaemon(unittest.TestCase):
+    """Proxy pool schedule and daemon mode."""
+
+    def test_schedule(self):
+        pool = daemon.ProxyPool(min_interval=10, max_interval=40, max_failures=2, jitter=0)
+        changes = []
+        pool.subscribe(lambda proxy, working: changes.append((proxy.port, working)))
+        good, dead = Proxy("http", "10.0.0.1", 1), Proxy("http", "10.0.0.2", 2)
+        self.assertTrue(pool.add(good, now=0))
+        self.assertTrue(pool.add(dead, now=0))
+        self.assertFalse(pool.add(Proxy("http", "10.0.0.1", 1), now=0))
+
+        self.assertIs(pool.pop_due(now=0)[0], good)
+        self.assertIs(pool.pop_due(now=0)[0], dead)
+        self.assertEqual(pool.pop_due(now=0), (None, None))
+        good["error"] = ""
+        pool.update(good, now=0)
+        dead["error"] = "Connection error"
+        pool.update(dead, now=0)
+        # a candidate failing its first check is dropped and not taken back
+        self.assertNotIn(dead, pool)
+        self.assertFalse(pool.add(dead, now=1))
+        self.assertEqual(pool.get_working(), [good])
+
+        # steady proxies wait longer and longer, up to max_interval
+        dues = []
+        now = 0
+        for _ in range(4):
+            proxy, wait = pool.pop_due(now)
+            self.assertIsNone(proxy)
+            now += wait
+            dues.append(wait)
+            self.assertIs(pool.pop_due(now)[0], good)
+            pool.update(good, now)
+        self.assertEqual(dues, [10, 20, 40, 40])
+
+        # a proxy going down is checked again soon, then dropped
+        good["error"] = "Connection error"
+        now += pool.pop_due(now)[1]
+        pool.pop_due(now)
+        pool.update(good, now)
+        self.assertEqual(pool.get_working_count(), 0)
+        self.assertEqual(pool.pop_due(now)[1], 10)
+        now += 10
+        pool.pop_due(now)
+        pool.update(good, now)
+        self.assertEqual(len(pool), 0)
+        # a local error is not the proxy's fault, even on a first check
+        local = Proxy("http", "10.0.0.3", 3)
+        self.assertTrue(pool.add(local, now=now))
+        self.assertIs(pool.pop_due(now)[0], local)
+        local["error"] = concurrency.LOCAL_ERROR
+        pool.update(local, now)
+        self.assertIn(local, pool)
+        self.assertEqual(pool.pop_due(now)[1], daemon.LOCAL_RETRY)
+        self.assertIs(pool.pop_due(now + daemon.LOCAL_RETRY)[0], local)
+
+        # working again is notified too, with the new latency
+        self.assertEqual(changes, [(1, True)] * 5 + [(1, False)])
+        pool.forget(now=now + daemon.FORGET_AFTER)
+        self.assertTrue(pool.add(dead, now=now + daemon.FORGET_AFTER))
+
+    def test_daemon(self):
+        from benchmarks import servers
+        specs = [("http", "ok"), ("socks5", "ok"), ("socks4", "fail"), ("http", "dead")] * 2
+        with servers.StandIns(specs) as stand_ins:
+            pool = daemon.ProxyPool(min_interval=0.2, max_interval=0.4)
+            pf = daemon.ProxyDaemon(
+                stand_ins.target_url, max_threads=4, conn_timeout=2, pool=pool,
+                proxy_source=lambda: [Proxy(protocol, ip, port)
+                                      for protocol, ip, port, _ in stand_ins.proxies()])
+            pf.start()
+            time.sleep(1.5)
+            self.assertFalse(pf.is_finished())
+            working = pf.get_fastest(10)
+            entries = [pool.entries[key] for key in list(pool.entries)]
+            pf.stop()
+        self.assertEqual(sorted(proxy.protocol for proxy in working),
+                         ["http", "http", "socks5", "socks5"])
+        self.assertEqual(len(entries), 4)
+        self.assertTrue(all(entry.checks >= 3 for entry in entries))
+        self.assertEqual(pf.all_results, [])
+        self.assertTrue(pf.is_finished())
+
+
+class TestApi(unittest.TestCase):
+    """Working set index and its HTTP API."""
+
+    def setUp(self):
+        self.working_set = api.WorkingSet()
+        self.proxies = [Proxy(protocol, f"10.0.0.{i}", 8000 + i, error="", latency=i / 10)
+                        for i, protocol in enumerate(["http", "socks5", "http", "socks4"], 1)]
+        for proxy in self.proxies:
+            self.working_set.add(proxy)
+
+    def test_working_set(self):
+        working_set = self.working_set
+        self.assertFalse(working_set.add(self.proxies[0]))
+        self.assertEqual(len(working_set), 4)
+        self.assertEqual(working_set.counts(), {"http": 2, "socks5": 1, "socks4": 1})
+        self.assertIs(working_set.fastest(), self.proxies[0])
+        self.assertIs(working_set.discard("http://10.0.0.1:8001"), self.proxies[0])
+        self.assertIsNone(working_set.discard(self.proxies[0]))
+        self.assertIs(working_set.fastest(), self.proxies[1])
+        self.assertEqual(working_set.ranked("http"), (self.proxies[2],))
+        # a refresh moves only its own key
+        self.proxies[1]["latency"] = 0.9
+        self.assertFalse(working_set.add(self.proxies[1]))
+        self.assertEqual(working_set.ranked(count=2), (self.proxies[2], self.proxies[3]))
+        self.assertIs(working_set.fastest("socks5"), self.proxies[1])
+        for _ in range(20):
+            self.assertIs(working_set.random("http"), self.proxies[2])
+            self.assertIn(working_set.random(), self.proxies[1:])
+        self.assertIsNone(working_set.random("https"))
+        self.assertIs(working_set.get("socks4://10.0.0.4:8004"), self.proxies[3])
+
+    def test_server(self):
+        reported = []
+        server = api.ApiServer(self.working_set, port=0, on_bad=reported.append)
+        server.start()
+        try:
+            with requests.Session() as s:
+                proxies = s.get(server.address + "/proxies", timeout=5).json()
+                self.assertEqual([proxy["port"] for proxy in proxies], [8001, 8002, 8003, 8004])
+                self.assertEqual(s.get(server.address + "/proxies?protocol=http&count=1&format=text",
+                                       timeout=5).text, "http://10.0.0.1:8001")
+                self.assertEqual(s.get(server.address + "/proxies/fastest?protocol=socks4",
+                                       timeout=5).json()["url"], "socks4://10.0.0.4:8004")
+                self.assertEqual(s.get(server.address + "/proxies/random?protocol=socks5",
+                                       timeout=5).json()["latency"], 0.2)
+                self.assertEqual(s.get(server.address + "/proxies/random?protocol=https",
+                                       timeout=5).status_code, 404)
+                reply = s.post(server.address + "/proxies/bad",
+                               json={"proxy": "socks4://10.0.0.4:8004"}, timeout=5)
+                self.assertEqual(reply.json(), {"ok": True, "removed": True})
+                self.assertEqual(s.post(server.address + "/proxies/bad", json={},
+                                        timeout=5).status_code, 400)
+                self.assertEqual(s.get(server.address + "/status", timeout=5).json(),
+                                 {"working": 3, "protocols": {"http": 2, "socks5": 1}})
+        finally:
+            server.stop()
+        self.assertEqual(reported, [self.proxies[3]])
+
+    def test_daemon_recheck(self):
+        pool = daemon.ProxyPool(min_interval=10, jitter=0)
+        working_set = api.WorkingSet()
+        pool.subscribe(working_set.update)
+        proxy = Proxy("http", "10.0.0.1", 8001)
+        pool.add(proxy, now=0)
+        pool.pop_due(now=0)
+        proxy["error"] = ""
+        pool.update(proxy, now=0)
+        self.assertIn(proxy, working_set)
+        self.assertTrue(pool.recheck(proxy, now=1))
+        self.assertNotIn(proxy, working_set)
+        # due again right away, back in the working set once it works
+        self.assertIs(pool.pop_due(now=1)[0], proxy)
+        proxy["latency"] = 0.5
+        pool.update(proxy, now=1)
+        self.assertIn(proxy, working_set)
+
+        # a recheck updating the latency in place changes the order
+        other = Proxy("http", "10.0.0.2", 8002)
+        pool.add(other, now=1)
+        pool.pop_due(now=1)
+        other["error"], other["latency"] = "", 0.2
+        pool.update(other, now=1)
+        self.assertIs(working_set.fastest(), other)
+        self.assertEqual({pool.pop_due(now=11)[0].port, pool.pop_due(now=11)[0].port},
+                         {8001, 8002})
+        other["latency"] = 0.9
+        pool.update(other, now=11)
+        self.assertIs(working_set.fastest(), proxy)